@@ -1,28 +1,147 @@
 """
 Module d'analyse IA - Détection de durabilité
 """
+import numpy as np
 import pandas as pd
 import re
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+from artifact_store import read_table
+from profiling import record_rows, timed_section
 
 OUTPUTS_DIR = Path("data/outputs")
+MATCH_BATCH_SIZE = 100000  # textes concaténés par passe du détecteur
+
+# Mots-clés de durabilité
+SUSTAINABILITY_KEYWORDS = [
+    'sustainable', 'sustainability', 'green', 'eco-friendly',
+    'environmental', 'renewable', 'recycle', 'circular',
+    'carbon', 'emission', 'ESG', 'ethical', 'organic',
+    'fair trade', 'responsibility', 'clean', 'energy'
+]
+# Champs textuels analysés, s'ils sont présents
+TEXT_FIELDS = ['company_name', 'original_name']
 
 def setup_module_logging():
     return logging.getLogger(__name__)
 
+class KeywordMatcher:
+    """
+    Détection multi-motifs de mots-clés, en une passe sur un lot de textes
+    
+    Même sémantique qu'un `re.search(rf'\b{mot}\b')` par mot-clé sur le texte
+    en minuscules. Les mots-clés sont répartis en groupes sans préfixe commun
+    (aucun mot d'un groupe n'est préfixe d'un autre): chaque groupe est compilé
+    en un motif en arbre de préfixes dans une assertion avant, qui trouve en
+    chaque position l'unique mot du groupe qui y commence. Le coût par
+    caractère dépend de la profondeur de l'arbre, pas du nombre de mots-clés.
+    """
+    
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(keywords)
+        
+        # Mot-clé en minuscules -> positions dans la liste (doublons éventuels)
+        self.terms: List[str] = []
+        self.term_positions: List[List[int]] = []
+        term_ids: Dict[str, int] = {}
+        for position, keyword in enumerate(self.keywords):
+            term = keyword.lower()
+            if term not in term_ids:
+                term_ids[term] = len(self.terms)
+                self.terms.append(term)
+                self.term_positions.append([])
+            self.term_positions[term_ids[term]].append(position)
+        self.term_ids = term_ids
+        
+        self.patterns = [
+            re.compile(rf'(?=\b({_trie_pattern(group)})\b)')
+            for group in _prefix_free_groups(self.terms)
+        ]
+    
+    def match_positions(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions de début et identifiants (dans self.terms) de toutes les occurrences"""
+        starts, ids = [], []
+        term_ids = self.term_ids
+        for pattern in self.patterns:
+            for match in pattern.finditer(text):
+                starts.append(match.start())
+                ids.append(term_ids[match.group(1)])
+        return np.array(starts, dtype=np.int64), np.array(ids, dtype=np.int64)
+    
+    def find(self, texts: pd.Series, batch_size: int = MATCH_BATCH_SIZE) -> List[List[str]]:
+        """
+        Mots-clés trouvés dans chaque texte, dans l'ordre de la liste de mots-clés
+        
+        Les textes sont mis en minuscules et concaténés par lots (séparés par un
+        saut de ligne, qui est une frontière de mot comme une fin de texte);
+        chaque occurrence est rattachée à son texte par recherche dichotomique.
+        """
+        found: List[List[str]] = [[] for _ in range(len(texts))]
+        # str.lower de Python, comme les mots-clés (la version Arrow diffère, ex. 'İ')
+        values = [str(text).lower() if pd.notna(text) else '' for text in texts]
+        
+        for batch_start in range(0, len(values), batch_size):
+            batch = values[batch_start:batch_start + batch_size]
+            lengths = np.fromiter((len(text) + 1 for text in batch), dtype=np.int64, count=len(batch))
+            offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            
+            starts, ids = self.match_positions('\n'.join(batch))
+            if not len(starts):
+                continue
+            rows = np.searchsorted(offsets, starts, side='right') - 1
+            
+            # Un mot-clé compte une fois par texte; ordre de la liste de mots-clés
+            pairs = np.unique(np.stack([rows, ids], axis=1), axis=0)
+            expanded = [(row, position) for row, term in pairs for position in self.term_positions[term]]
+            for row, position in sorted(expanded):
+                found[batch_start + row].append(self.keywords[position])
+        
+        return found
+
+def _prefix_free_groups(terms: List[str]) -> List[List[str]]:
+    # Niveau d'un mot = 1 + niveau maximal de ses préfixes présents: deux mots de
+    # même niveau ne peuvent pas être préfixes l'un de l'autre
+    term_set = set(terms)
+    levels: Dict[str, int] = {}
+    for term in sorted(terms, key=len):
+        prefix_levels = [levels[term[:i]] for i in range(1, len(term)) if term[:i] in term_set]
+        levels[term] = max(prefix_levels, default=-1) + 1
+    
+    groups: List[List[str]] = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for term in terms:
+        groups[levels[term]].append(term)
+    return groups
+
+def _trie_pattern(terms: List[str]) -> str:
+    # Arbre de préfixes d'un groupe sans préfixe commun: aucun mot ne s'arrête
+    # sur un nœud interne, chaque feuille termine exactement un mot
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+    
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items())]
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+    
+    return build(trie) if trie else '(?!)'
+
+@lru_cache(maxsize=8)
+def _cached_matcher(keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(list(keywords))
+
 def detect_sustainability_keywords(text: str, keywords: List[str]) -> Dict:
     """Détecte les mots-clés de durabilité dans un texte"""
     if pd.isna(text):
         return {'has_sustainability': False, 'keywords_found': [], 'count': 0}
     
-    text = str(text).lower()
-    found_keywords = []
-    
-    for keyword in keywords:
-        if re.search(rf'\b{re.escape(keyword.lower())}\b', text):
-            found_keywords.append(keyword)
+    found_keywords = _cached_matcher(tuple(keywords)).find(pd.Series([str(text)]))[0]
     
     return {
         'has_sustainability': len(found_keywords) > 0,
@@ -30,52 +149,55 @@ def detect_sustainability_keywords(text: str, keywords: List[str]) -> Dict:
         'count': len(found_keywords)
     }
 
-def run_ai_analysis(companies_path: Path) -> Path:
-    """Exécute l'analyse IA sur les données entreprises"""
+def load_keywords(path: Path) -> List[str]:
+    """Lit une liste de mots-clés (un par ligne, lignes vides et # ignorées)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+def run_ai_analysis(companies_path: Path, keywords: Optional[List[str]] = None) -> Path:
+    """
+    Exécute l'analyse IA sur les données entreprises
+    
+    Args:
+        companies_path: Table des entreprises
+        keywords: Mots-clés de durabilité (SUSTAINABILITY_KEYWORDS par défaut)
+    """
     logger = setup_module_logging()
     logger.info("Démarrage de l'analyse IA")
     
     OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
     
     # Lecture des données
-    companies = pd.read_csv(companies_path)
-    
-    # Mots-clés de durabilité
-    sustainability_keywords = [
-        'sustainable', 'sustainability', 'green', 'eco-friendly',
-        'environmental', 'renewable', 'recycle', 'circular',
-        'carbon', 'emission', 'ESG', 'ethical', 'organic',
-        'fair trade', 'responsibility', 'clean', 'energy'
-    ]
-    
-    # Analyse de chaque entreprise
-    results = []
-    
-    for _, company in companies.iterrows():
-        # Concaténation des champs textuels potentiels
-        text_fields = []
-        
-        for field in ['company_name', 'original_name']:
-            if field in company and pd.notna(company[field]):
-                text_fields.append(str(company[field]))
-        
-        full_text = ' '.join(text_fields)
-        
-        # Détection des mots-clés
-        detection = detect_sustainability_keywords(full_text, sustainability_keywords)
-        
-        result = {
-            'company_id': company['company_id'],
-            'company_name': company['company_name'],
-            'has_sustainability': detection['has_sustainability'],
-            'keywords_found': ', '.join(detection['keywords_found']),
-            'keyword_count': detection['count']
-        }
-        
-        results.append(result)
+    companies = read_table(companies_path, columns=['company_id', 'company_name'])
+    record_rows(rows_in=len(companies))
+    
+    matcher = KeywordMatcher(keywords or SUSTAINABILITY_KEYWORDS)
+    logger.info(f"{len(matcher.keywords)} mots-clés, {len(matcher.patterns)} motif(s) compilé(s)")
+    
+    # Concaténation des champs textuels disponibles (non manquants, séparés par une espace)
+    text = pd.Series('', index=companies.index, dtype=object)
+    has_text = pd.Series(False, index=companies.index)
+    for field in TEXT_FIELDS:
+        if field not in companies.columns:
+            continue
+        present = companies[field].notna()
+        value = companies[field].astype(object).where(present, '').astype(str)
+        text = text.where(~present, (text + ' ' + value).where(has_text, value))
+        has_text |= present
+    
+    # Détection des mots-clés, en une passe sur toutes les entreprises
+    with timed_section('keyword_matching'):
+        keywords_found = matcher.find(text)
     
     # Création du DataFrame de résultats
-    results_df = pd.DataFrame(results)
+    results_df = pd.DataFrame({
+        'company_id': companies['company_id'],
+        'company_name': companies['company_name'],
+        'has_sustainability': [len(found) > 0 for found in keywords_found],
+        'keywords_found': [', '.join(found) for found in keywords_found],
+        'keyword_count': [len(found) for found in keywords_found]
+    })
     
     # Statistiques
     sustainability_rate = results_df['has_sustainability'].mean() * 100
@@ -84,6 +206,7 @@ def run_ai_analysis(companies_path: Path) -> Path:
     # Sauvegarde
     output_path = OUTPUTS_DIR / "sustainability_analysis.csv"
     results_df.to_csv(output_path, index=False)
+    record_rows(rows_out=len(results_df))
     
     logger.info(f"Analyse IA sauvegardée: {output_path}")
     
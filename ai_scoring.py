@@ -0,0 +1,325 @@
+"""
+Module de score de durabilité des établissements
+
+Modèle linéaire (régression logistique) sur des n-grammes d'octets hachés,
+calculés sur tous les champs textuels d'un établissement: nom, entreprise,
+secteur, activité et contributeur. Les n-grammes sont hachés par champ dans
+un espace de taille fixe, sans vocabulaire: l'extraction, l'entraînement et
+le score sont entièrement vectorisés avec NumPy, par blocs de lignes.
+
+Le modèle s'entraîne localement à partir d'un CSV étiqueté
+(`python ai_scoring.py train labels.csv`) et s'enregistre en .npz (poids non
+nuls uniquement).
+"""
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pyarrow est optionnel: extraction des octets via des str Python
+    pc = None
+
+from artifact_store import TableWriter, iter_batches, read_table
+from profiling import record_rows, timed_section
+from relational_builder import FACILITIES_RELATIONAL_SCHEMA
+
+MODEL_PATH = Path("models/sustainability_model.npz")
+OUTPUTS_DIR = Path("data/outputs")
+
+# Champs textuels utilisés, dans l'ordre (l'indice du champ sale le hachage)
+TEXT_FIELDS = ['facility_name', 'company_name', 'sector', 'processing_activity', 'contributor']
+LABEL_COLUMN = 'label'
+
+HASH_BITS = 18  # 2^18 poids (32 au plus)
+NGRAM_SIZES = (3, 4, 5)
+SCORE_BATCH_SIZE = 200000
+SCORE_THRESHOLD = 0.5
+
+# Constantes de hachage 32 bits (FNV-1a et hachage multiplicatif de Fibonacci)
+FNV_PRIME = np.uint32(0x01000193)
+FNV_OFFSET = np.uint32(0x811C9DC5)
+FIBONACCI = np.uint32(0x9E3779B1)
+
+SCORES_SCHEMA = {
+    'facility_id': 'string',
+    'company_id': 'string',
+    'sustainability_score': 'float64',
+    'is_sustainable': 'boolean'
+}
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def _lower_texts(values: pd.Series) -> List[str]:
+    # str.lower de Python dans les deux chemins (utf8_lower d'Arrow diffère, ex. 'İ'), octets nuls retirés
+    return [str(text).lower().replace('\x00', '') if pd.notna(text) else '' for text in values]
+
+def _text_segments(columns: List[pd.Series]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Octets UTF-8 de tous les textes (en minuscules, bornés par des espaces),
+    colonne par colonne, et décalage de début de chaque texte
+    
+    Avec pyarrow, les octets sont lus directement dans les buffers Arrow après
+    la mise en minuscules. Les deux chemins produisent les mêmes octets: même
+    mise en minuscules (`_lower_texts`), octets nuls retirés.
+    """
+    if pc is not None:
+        arrays = []
+        space, empty = pa.scalar(' ', pa.large_string()), pa.scalar('', pa.large_string())
+        for values in columns:
+            array = pa.array(_lower_texts(values), type=pa.large_string())
+            arrays.append(pc.binary_join_element_wise(space, array, space, empty))
+        array = pa.concat_arrays(arrays)
+        offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+        data = np.frombuffer(array.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]]
+        return data, offsets - offsets[0]
+    
+    # Sans pyarrow: concaténation avec un octet nul comme séparateur, puis retrait des séparateurs
+    texts = [f" {text} " for values in columns for text in _lower_texts(values)]
+    buffer = np.frombuffer('\x00'.join(texts).encode('utf-8'), dtype=np.uint8)
+    separators = np.flatnonzero(buffer == 0)
+    data = buffer[buffer != 0]
+    offsets = np.concatenate(([0], separators - np.arange(len(separators)), [len(data)]))
+    return data, offsets
+
+def hash_features(df: pd.DataFrame, fields: List[str] = TEXT_FIELDS, hash_bits: int = HASH_BITS,
+                  ngram_sizes: Tuple[int, ...] = NGRAM_SIZES) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Représentation creuse d'un bloc de lignes
+    
+    Les n-grammes d'octets de chaque champ sont hachés (FNV-1a 32 bits, salé
+    par champ et par taille) en une seule passe roulante sur les octets de
+    tous les champs.
+    
+    Returns:
+        Tuple: ligne et indice de chaque occurrence de n-gramme, et facteur de
+        normalisation par ligne (1/racine du nombre d'occurrences)
+    """
+    present = [field for field in fields if field in df.columns]
+    n_rows = len(df)
+    if not present or not n_rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.ones(n_rows)
+    
+    data, offsets = _text_segments([df[field] for field in present])
+    n_windows = len(data)
+    lengths = np.diff(offsets)
+    # Texte (champ, ligne), ligne et sel de champ de chaque octet; bourrage final hors de tout texte
+    max_size = max(ngram_sizes)
+    padding = max_size - 1
+    segments = np.concatenate((np.repeat(np.arange(len(lengths), dtype=np.int32), lengths),
+                               np.full(padding, -1, dtype=np.int32)))
+    byte_rows = np.repeat(np.tile(np.arange(n_rows, dtype=np.int32), len(present)), lengths)
+    field_bytes = lengths.reshape(len(present), n_rows).sum(axis=1)
+    field_salts = np.array([fields.index(field) << 8 for field in present], dtype=np.uint32)
+    byte_salts = np.repeat(field_salts, field_bytes)
+    data = np.concatenate((data, np.zeros(padding, dtype=np.uint8))).astype(np.uint32)
+    
+    rows, features = [], []
+    hashes = np.full(n_windows, FNV_OFFSET, dtype=np.uint32)
+    for k in range(max_size):
+        hashes ^= data[k:k + n_windows]
+        hashes *= FNV_PRIME
+        size = k + 1
+        if size not in ngram_sizes:
+            continue
+        
+        # Fenêtres entièrement contenues dans un texte
+        valid = segments[:n_windows] == segments[k:k + n_windows]
+        salted = (hashes[valid] ^ (byte_salts[valid] | np.uint32(size))) * FIBONACCI
+        rows.append(byte_rows[valid])
+        features.append((salted >> np.uint32(32 - hash_bits)).astype(np.int64))
+    
+    rows = np.concatenate(rows)
+    features = np.concatenate(features)
+    norms = 1.0 / np.sqrt(np.maximum(np.bincount(rows, minlength=n_rows), 1))
+    return rows, features, norms
+
+class SustainabilityModel:
+    """Régression logistique sur n-grammes hachés"""
+    
+    def __init__(self, weights: np.ndarray, bias: float = 0.0, fields: List[str] = TEXT_FIELDS,
+                 ngram_sizes: Tuple[int, ...] = NGRAM_SIZES):
+        self.weights = weights.astype(np.float32)
+        self.bias = float(bias)
+        self.fields = list(fields)
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.hash_bits = int(np.log2(len(weights)))
+    
+    def decision_function(self, df: pd.DataFrame) -> np.ndarray:
+        rows, features, norms = hash_features(df, self.fields, self.hash_bits, self.ngram_sizes)
+        return self.bias + np.bincount(rows, weights=self.weights[features], minlength=len(df)) * norms
+    
+    def predict_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """Probabilité de durabilité de chaque ligne"""
+        return 1.0 / (1.0 + np.exp(-self.decision_function(df)))
+    
+    @classmethod
+    def train(cls, df: pd.DataFrame, labels: np.ndarray, fields: List[str] = TEXT_FIELDS,
+              hash_bits: int = HASH_BITS, ngram_sizes: Tuple[int, ...] = NGRAM_SIZES,
+              epochs: int = 100, learning_rate: float = 0.05, l2: float = 1e-6) -> 'SustainabilityModel':
+        """
+        Entraîne le modèle par descente de gradient (Adam) sur l'ensemble du lot
+        
+        Args:
+            df: Lignes d'entraînement (champs textuels)
+            labels: Étiquettes 0/1
+        """
+        logger = setup_module_logging()
+        rows, features, norms = hash_features(df, fields, hash_bits, ngram_sizes)
+        values = norms[rows]
+        labels = np.asarray(labels, dtype=np.float64)
+        n_rows, n_features = len(df), 1 << hash_bits
+        
+        # Adam: pas adapté par poids, utile avec des n-grammes de fréquences très inégales
+        weights = np.zeros(n_features)
+        bias = 0.0
+        moment, velocity = np.zeros(n_features), np.zeros(n_features)
+        bias_moment, bias_velocity = 0.0, 0.0
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+        for epoch in range(1, epochs + 1):
+            logits = bias + np.bincount(rows, weights=weights[features] * values, minlength=n_rows)
+            errors = 1.0 / (1.0 + np.exp(-logits)) - labels
+            gradient = np.bincount(features, weights=errors[rows] * values, minlength=n_features) / n_rows
+            gradient += l2 * weights
+            
+            moment = beta1 * moment + (1 - beta1) * gradient
+            velocity = beta2 * velocity + (1 - beta2) * gradient ** 2
+            step = learning_rate * np.sqrt(1 - beta2 ** epoch) / (1 - beta1 ** epoch)
+            weights -= step * moment / (np.sqrt(velocity) + eps)
+            
+            bias_moment = beta1 * bias_moment + (1 - beta1) * errors.mean()
+            bias_velocity = beta2 * bias_velocity + (1 - beta2) * errors.mean() ** 2
+            bias -= step * bias_moment / (np.sqrt(bias_velocity) + eps)
+            
+            if epoch % 20 == 0 or epoch == epochs:
+                probabilities = np.clip(1.0 / (1.0 + np.exp(-logits)), 1e-12, 1 - 1e-12)
+                loss = -np.mean(labels * np.log(probabilities) + (1 - labels) * np.log(1 - probabilities))
+                logger.info(f"Époque {epoch}: perte logistique {loss:.4f}")
+        
+        return cls(weights, bias, fields, ngram_sizes)
+    
+    def save(self, path: Path = MODEL_PATH) -> Path:
+        """Enregistre les seuls poids non nuls"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        indices = np.flatnonzero(self.weights)
+        np.savez_compressed(
+            path,
+            indices=indices.astype(np.int32),
+            values=self.weights[indices],
+            bias=np.array(self.bias),
+            hash_bits=np.array(self.hash_bits),
+            ngram_sizes=np.array(self.ngram_sizes),
+            fields=np.array(self.fields)
+        )
+        return path
+    
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> 'SustainabilityModel':
+        with np.load(path) as data:
+            weights = np.zeros(1 << int(data['hash_bits']), dtype=np.float32)
+            weights[data['indices']] = data['values']
+            return cls(weights, float(data['bias']), data['fields'].tolist(),
+                       tuple(int(n) for n in data['ngram_sizes']))
+
+def iter_facility_texts(relational_paths: Dict[str, Path],
+                        batch_size: int = SCORE_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+    """Établissements par blocs, avec l'entreprise liée (première si plusieurs)"""
+    companies = read_table(relational_paths['companies'], columns=['company_id', 'company_name'])
+    companies = companies.drop_duplicates(subset=['company_id'])
+    links = read_table(relational_paths['links']).drop_duplicates(subset=['facility_id'])
+    facility_company = links.merge(companies, on='company_id', how='left').set_index('facility_id')
+    del companies, links
+    
+    columns = ['facility_id'] + [f for f in TEXT_FIELDS if f in FACILITIES_RELATIONAL_SCHEMA]
+    for batch in iter_batches(relational_paths['facilities'], columns=columns,
+                              schema=FACILITIES_RELATIONAL_SCHEMA, batch_size=batch_size):
+        company = facility_company.reindex(batch['facility_id'])
+        batch['company_id'] = company['company_id'].to_numpy()
+        batch['company_name'] = company['company_name'].to_numpy()
+        yield batch
+
+def score_facilities(relational_paths: Dict[str, Path], model_path: Path = MODEL_PATH,
+                     threshold: float = SCORE_THRESHOLD) -> Optional[Path]:
+    """
+    Calcule le score de durabilité de chaque établissement, par blocs
+    
+    Returns:
+        Optional[Path]: Table des scores, None si aucun modèle n'a été entraîné
+    """
+    logger = setup_module_logging()
+    if not Path(model_path).exists():
+        logger.warning(f"Aucun modèle de score ({model_path}), étape ignorée: "
+                       f"voir `python ai_scoring.py train <labels.csv>`")
+        return None
+    
+    model = SustainabilityModel.load(model_path)
+    logger.info(f"Score de durabilité des établissements (modèle {model_path})")
+    
+    n_scored, n_sustainable = 0, 0
+    with TableWriter(OUTPUTS_DIR, "sustainability_scores", SCORES_SCHEMA) as writer:
+        for batch in iter_facility_texts(relational_paths):
+            with timed_section('scoring'):
+                scores = model.predict_proba(batch)
+            writer.write(pd.DataFrame({
+                'facility_id': batch['facility_id'],
+                'company_id': batch['company_id'],
+                'sustainability_score': scores,
+                'is_sustainable': scores >= threshold
+            }))
+            n_scored += len(batch)
+            n_sustainable += int((scores >= threshold).sum())
+    
+    record_rows(rows_in=n_scored, rows_out=n_scored)
+    logger.info(f"Scores sauvegardés: {writer.path} ({n_sustainable}/{n_scored} au-dessus de {threshold})")
+    return writer.path
+
+def train_from_csv(labels_path: Path, model_path: Path = MODEL_PATH, **train_options) -> Path:
+    """Entraîne le modèle à partir d'un CSV étiqueté (champs textuels + colonne label)"""
+    logger = setup_module_logging()
+    df = pd.read_csv(labels_path, dtype={field: 'string' for field in TEXT_FIELDS})
+    if LABEL_COLUMN not in df.columns:
+        raise ValueError(f"Colonne '{LABEL_COLUMN}' absente de {labels_path}")
+    
+    fields = [field for field in TEXT_FIELDS if field in df.columns]
+    logger.info(f"Entraînement sur {len(df)} lignes, champs: {fields}")
+    model = SustainabilityModel.train(df, df[LABEL_COLUMN].to_numpy(), fields=fields, **train_options)
+    
+    accuracy = ((model.predict_proba(df) >= SCORE_THRESHOLD) == df[LABEL_COLUMN].astype(bool)).mean()
+    logger.info(f"Précision sur les données d'entraînement: {accuracy:.3f}")
+    return model.save(model_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Modèle de score de durabilité")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    train = subparsers.add_parser('train', help="Entraîne le modèle à partir d'un CSV étiqueté")
+    train.add_argument('labels', type=Path)
+    train.add_argument('--model', type=Path, default=MODEL_PATH)
+    train.add_argument('--epochs', type=int, default=100)
+    train.add_argument('--hash-bits', type=int, default=HASH_BITS)
+    
+    score = subparsers.add_parser('score', help="Score les tables relationnelles de data/relational")
+    score.add_argument('--model', type=Path, default=MODEL_PATH)
+    score.add_argument('--relational-dir', type=Path, default=Path("data/relational"))
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'train':
+        path = train_from_csv(args.labels, args.model, epochs=args.epochs, hash_bits=args.hash_bits)
+        print(f"Modèle enregistré: {path}")
+    else:
+        relational_paths = {
+            table: next(args.relational_dir.glob(f"{stem}.*"))
+            for table, stem in [('companies', 'companies_relational'),
+                                ('facilities', 'facilities_relational'),
+                                ('links', 'company_facilities_relational')]
+        }
+        print(f"Scores: {score_facilities(relational_paths, args.model)}")
+
+if __name__ == "__main__":
+    main()
@@ -2,76 +2,82 @@
 Module de génération des tableaux de bord analytiques
 """
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import logging
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
+
+from chart_engine import DEFAULT_DPI, ChartSpec, render_charts
+from density_map import density_spec, select_zoom
+from rollup_cube import load_rollup_cube
 
 OUTPUTS_DIR = Path("data/outputs")
 
 def setup_module_logging():
     return logging.getLogger(__name__)
 
-def generate_analytics(relational_paths: Dict[str, Path]) -> Dict[str, Path]:
-    """Génère les visualisations analytiques"""
+def dashboard_specs(cube: Dict) -> List[ChartSpec]:
+    """Déclare les graphiques du tableau de bord sur les agrégats du cube"""
+    distribution = cube['facilities_per_company']
+    return [
+        # 1. Nombre d'entreprises par pays
+        ChartSpec(
+            name='companies_by_country', kind='bar',
+            data={
+                'labels': list(cube['companies_by_country']),
+                'values': list(cube['companies_by_country'].values())
+            },
+            title='Nombre d\'entreprises par pays',
+            xlabel='Pays',
+            ylabel='Nombre d\'entreprises',
+            figsize=(10, 6)
+        ),
+        # 2. Nombre d'établissements par entreprise (histogramme et box plot)
+        ChartSpec(
+            name='facilities_per_company', kind='distribution',
+            data={'values': distribution['values'], 'counts': distribution['counts']},
+            title=('Distribution des établissements par entreprise',
+                   'Box Plot - Établissements par entreprise'),
+            xlabel='Nombre d\'établissements',
+            ylabel='Nombre d\'entreprises',
+            figsize=(12, 6)
+        )
+    ]
+
+def generate_analytics(cube_path: Path, density_path: Optional[Path] = None, chart_format: str = 'png',
+                       dpi: int = DEFAULT_DPI, n_workers: Optional[int] = None) -> Dict[str, Path]:
+    """
+    Génère les visualisations analytiques à partir du cube de synthèse
+    
+    Args:
+        cube_path: Cube de synthèse (`build_rollup_cube`)
+        density_path: Grille de densité des établissements (`build_density_grid`), carte omise si None
+        chart_format: Format des graphiques ('png' ou 'svg')
+        dpi: Résolution des graphiques PNG
+        n_workers: Processus de rendu (None ou 1 pour rester dans le processus courant)
+    """
     logger = setup_module_logging()
     logger.info("Génération des tableaux de bord")
     
     OUTPUTS_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Lecture des données
-    companies = pd.read_csv(relational_paths['companies'])
-    links = pd.read_csv(relational_paths['links'])
-    
-    # 1. Nombre d'entreprises par pays
-    logger.info("Création du graphique: Entreprises par pays")
-    companies_by_country = companies['country'].value_counts().reset_index()
-    companies_by_country.columns = ['country', 'count']
-    
-    plt.figure(figsize=(10, 6))
-    sns.barplot(data=companies_by_country, x='country', y='count', palette='viridis')
-    plt.title('Nombre d\'entreprises par pays', fontsize=16)
-    plt.xlabel('Pays', fontsize=12)
-    plt.ylabel('Nombre d\'entreprises', fontsize=12)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    companies_chart_path = OUTPUTS_DIR / "companies_by_country.png"
-    plt.savefig(companies_chart_path, dpi=300)
-    plt.close()
+    # Lecture du cube (taille indépendante du nombre de lignes)
+    cube = load_rollup_cube(cube_path)
+    distribution = cube['facilities_per_company']
     
-    # 2. Nombre d'établissements par entreprise
-    logger.info("Création du graphique: Établissements par entreprise")
-    facilities_per_company = links.groupby('company_id').size().reset_index(name='facility_count')
-    
-    plt.figure(figsize=(12, 6))
-    
-    # Histogramme
-    plt.subplot(1, 2, 1)
-    plt.hist(facilities_per_company['facility_count'], bins=30, edgecolor='black', alpha=0.7)
-    plt.title('Distribution des établissements par entreprise', fontsize=14)
-    plt.xlabel('Nombre d\'établissements', fontsize=12)
-    plt.ylabel('Nombre d\'entreprises', fontsize=12)
-    
-    # Box plot
-    plt.subplot(1, 2, 2)
-    plt.boxplot(facilities_per_company['facility_count'], vert=False)
-    plt.title('Box Plot - Établissements par entreprise', fontsize=14)
-    plt.xlabel('Nombre d\'établissements', fontsize=12)
-    
-    plt.tight_layout()
-    facilities_chart_path = OUTPUTS_DIR / "facilities_per_company.png"
-    plt.savefig(facilities_chart_path, dpi=300)
-    plt.close()
+    # Graphiques rendus en parallèle, repris du cache si leurs données n'ont pas changé
+    specs = dashboard_specs(cube)
+    if density_path:
+        # Carte de densité au niveau de zoom le plus fin de taille bornée
+        specs.append(density_spec(select_zoom(density_path)))
+    charts = render_charts(specs, OUTPUTS_DIR, chart_format, dpi, n_workers)
     
     # 3. Statistiques supplémentaires
     stats = {
-        'total_companies': len(companies),
-        'total_facilities': len(pd.read_csv(relational_paths['facilities'])),
-        'avg_facilities_per_company': facilities_per_company['facility_count'].mean(),
-        'median_facilities_per_company': facilities_per_company['facility_count'].median(),
-        'max_facilities_per_company': facilities_per_company['facility_count'].max()
+        'total_companies': cube['totals']['companies'],
+        'total_facilities': cube['totals']['facilities'],
+        'avg_facilities_per_company': distribution['mean'],
+        'median_facilities_per_company': distribution['median'],
+        'max_facilities_per_company': distribution['max']
     }
     
     stats_df = pd.DataFrame([stats])
@@ -80,8 +86,12 @@ def generate_analytics(relational_paths: Dict[str, Path]) -> Dict[str, Path]:
     
     logger.info(f"Tableaux de bord sauvegardés dans: {OUTPUTS_DIR}")
     
-    return {
-        'companies_chart': companies_chart_path,
-        'facilities_chart': facilities_chart_path,
+    analytics_paths = {
+        'companies_chart': charts['companies_by_country'],
+        'facilities_chart': charts['facilities_per_company'],
         'statistics': stats_path
-    }
\ No newline at end of file
+    }
+    if density_path:
+        analytics_paths['density_chart'] = charts['facility_density']
+        analytics_paths['density_grid'] = density_path
+    return analytics_paths
@@ -0,0 +1,266 @@
+"""
+Module de stockage des artefacts intermédiaires du pipeline
+
+Les tables échangées entre étapes (data/raw, data/cleaned, data/relational)
+sont écrites dans un format colonnaire (Parquet ou Feather) avec un schéma
+déclaré, ou en CSV. Le format de lecture est déduit de l'extension du
+fichier, ce qui permet de relire indifféremment les anciens artefacts CSV.
+"""
+import logging
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow est optionnel: repli sur CSV
+    pa = None
+
+# Format par défaut, surchargeable par variable d'environnement (hérité par les sous-processus)
+FORMAT_ENV = "OAR_ARTIFACT_FORMAT"
+DEFAULT_FORMAT = "parquet"
+FORMAT_EXTENSIONS = {
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'csv': '.csv'
+}
+
+Schema = Dict[str, str]
+
+TRUE_VALUES = {'true', 't', '1', 'yes'}
+FALSE_VALUES = {'false', 'f', '0', 'no'}
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def get_format() -> str:
+    """Format d'écriture courant, avec repli sur CSV si pyarrow est absent"""
+    fmt = os.environ.get(FORMAT_ENV, DEFAULT_FORMAT).lower()
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Format d'artefact inconnu: {fmt}")
+    
+    if fmt != 'csv' and pa is None:
+        setup_module_logging().warning(f"pyarrow non installé, écriture en CSV au lieu de {fmt}")
+        return 'csv'
+    return fmt
+
+def set_format(fmt: str):
+    """Définit le format d'écriture pour ce processus et ses sous-processus"""
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Format d'artefact inconnu: {fmt}")
+    os.environ[FORMAT_ENV] = fmt
+
+def artifact_path(directory: Path, name: str, fmt: Optional[str] = None) -> Path:
+    """Chemin d'un artefact dans le format demandé (ou courant)"""
+    return Path(directory) / f"{name}{FORMAT_EXTENSIONS[fmt or get_format()]}"
+
+def _format_of(path: Path) -> str:
+    suffix = Path(path).suffix.lower()
+    for fmt, extension in FORMAT_EXTENSIONS.items():
+        if suffix == extension:
+            return fmt
+    raise ValueError(f"Extension d'artefact inconnue: {path}")
+
+def _to_string(series: pd.Series) -> pd.Series:
+    # Les IDs entiers passés par un float (valeurs manquantes) ne doivent pas devenir "123.0"
+    if pd.api.types.is_float_dtype(series):
+        values = series.dropna()
+        if (values == np.floor(values)).all():
+            series = series.astype('Int64')
+    return series.astype('string')
+
+def _to_boolean(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype('boolean')
+    
+    lowered = series.astype('string').str.strip().str.lower()
+    result = pd.Series(pd.NA, index=series.index, dtype='boolean')
+    result[lowered.isin(TRUE_VALUES).fillna(False)] = True
+    result[lowered.isin(FALSE_VALUES).fillna(False)] = False
+    return result
+
+def apply_schema(df: pd.DataFrame, schema: Schema) -> pd.DataFrame:
+    """Ordonne les colonnes selon le schéma et applique les types déclarés"""
+    df = df.reindex(columns=list(schema))
+    
+    for column, dtype in schema.items():
+        if dtype == 'string':
+            df[column] = _to_string(df[column])
+        elif dtype == 'boolean':
+            df[column] = _to_boolean(df[column])
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+    
+    return df
+
+def _arrow_schema(schema: Schema):
+    empty = apply_schema(pd.DataFrame(), schema)
+    return pa.Schema.from_pandas(empty, preserve_index=False)
+
+def write_table(df: pd.DataFrame, directory: Path, name: str,
+                schema: Optional[Schema] = None, fmt: Optional[str] = None) -> Path:
+    """
+    Écrit une table intermédiaire
+    
+    Args:
+        df: Table à écrire
+        directory: Dossier de l'étape (data/raw, data/cleaned...)
+        name: Nom de l'artefact, sans extension
+        schema: Types déclarés des colonnes (colonnes du DataFrame conservées sinon)
+        fmt: Format (parquet, feather, csv), format courant par défaut
+    
+    Returns:
+        Path: Chemin de l'artefact écrit
+    """
+    fmt = fmt or get_format()
+    path = artifact_path(directory, name, fmt)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    
+    if schema is not None:
+        df = apply_schema(df, schema)
+    
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False, encoding='utf-8')
+    
+    return path
+
+def read_table(path: Path, columns: Optional[List[str]] = None,
+               schema: Optional[Schema] = None) -> pd.DataFrame:
+    """
+    Lit une table intermédiaire, en ne chargeant que les colonnes demandées
+    
+    Args:
+        path: Chemin de l'artefact (format déduit de l'extension)
+        columns: Projection de colonnes (toutes si None)
+        schema: Types à appliquer à la lecture d'un CSV
+    """
+    fmt = _format_of(path)
+    
+    if fmt == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if fmt == 'feather':
+        # read_feather renvoie les colonnes dans l'ordre du fichier
+        df = pd.read_feather(path, columns=columns)
+        return df[columns] if columns is not None else df
+    
+    dtype = None
+    if schema is not None:
+        dtype = {c: t for c, t in schema.items() if columns is None or c in columns}
+        # Les booléens CSV sont convertis après lecture (valeurs hétérogènes)
+        dtype = {c: t for c, t in dtype.items() if t != 'boolean'}
+    df = pd.read_csv(path, usecols=columns, dtype=dtype)
+    
+    if schema is not None:
+        for column, dtype in schema.items():
+            if dtype == 'boolean' and column in df.columns:
+                df[column] = _to_boolean(df[column])
+    if columns is not None:
+        df = df[columns]
+    return df
+
+def iter_batches(path: Path, columns: Optional[List[str]] = None,
+                 schema: Optional[Schema] = None, batch_size: int = 100000) -> Iterator[pd.DataFrame]:
+    """
+    Lit une table intermédiaire par blocs de lignes, sans la charger entièrement
+    
+    Args:
+        path: Chemin de l'artefact (format déduit de l'extension)
+        columns: Projection de colonnes (toutes si None)
+        schema: Types à appliquer à la lecture d'un CSV
+        batch_size: Nombre de lignes maximal par bloc
+    """
+    fmt = _format_of(path)
+    
+    if fmt == 'parquet':
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            # Table reconstruite avec le schéma du fichier pour conserver les types pandas
+            yield pa.Table.from_batches([batch], schema=batch.schema.with_metadata(
+                parquet_file.schema_arrow.metadata)).to_pandas()
+    elif fmt == 'feather':
+        with pa.memory_map(str(path)) as source:
+            reader = ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(i)])
+                if columns is not None:
+                    table = table.select(columns)
+                for offset in range(0, table.num_rows, batch_size):
+                    yield table.slice(offset, batch_size).to_pandas()
+    else:
+        dtype = None
+        if schema is not None:
+            dtype = {c: t for c, t in schema.items() if (columns is None or c in columns) and t != 'boolean'}
+        for chunk in pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=batch_size):
+            if schema is not None:
+                for column, column_type in schema.items():
+                    if column_type == 'boolean' and column in chunk.columns:
+                        chunk[column] = _to_boolean(chunk[column])
+            yield chunk[columns] if columns is not None else chunk
+
+def count_rows(path: Path) -> int:
+    """Nombre de lignes d'une table, lu dans les métadonnées quand le format le permet"""
+    fmt = _format_of(path)
+    
+    if fmt == 'parquet':
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt == 'feather':
+        with pa.memory_map(str(path)) as source:
+            reader = ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return sum(len(chunk) for chunk in pd.read_csv(path, usecols=[0], chunksize=1000000))
+
+class TableWriter:
+    """Écriture incrémentale d'une table par blocs, à schéma fixe"""
+    
+    def __init__(self, directory: Path, name: str, schema: Schema, fmt: Optional[str] = None):
+        self.fmt = fmt or get_format()
+        self.schema = schema
+        self.path = artifact_path(directory, name, self.fmt)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        
+        self._writer = None
+        if self.fmt == 'parquet':
+            self._arrow_schema = _arrow_schema(schema)
+            self._writer = pq.ParquetWriter(self.path, self._arrow_schema)
+        elif self.fmt == 'feather':
+            # Feather V2 = format fichier Arrow IPC, écrit par record batches
+            self._arrow_schema = _arrow_schema(schema)
+            self._writer = ipc.new_file(str(self.path), self._arrow_schema)
+        else:
+            # En-tête écrit même si aucune ligne n'est ajoutée
+            apply_schema(pd.DataFrame(), schema).to_csv(self.path, index=False, encoding='utf-8')
+    
+    def write(self, df: pd.DataFrame):
+        """Ajoute un bloc de lignes"""
+        df = apply_schema(df, self.schema)
+        
+        if self.fmt == 'csv':
+            df.to_csv(self.path, mode='a', header=False, index=False, encoding='utf-8')
+        else:
+            table = pa.Table.from_pandas(df, schema=self._arrow_schema, preserve_index=False)
+            self._writer.write_table(table)
+    
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def export_csv(path: Path, output_path: Path) -> Path:
+    """Exporte un artefact en CSV (export final optionnel)"""
+    read_table(path).to_csv(output_path, index=False, encoding='utf-8')
+    return output_path
@@ -0,0 +1,218 @@
+"""
+Benchmarks de performance du pipeline OAR
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from clean_companies import clean_company_names, normalize_countries
+from profiling import profile_call
+from scheduler import resolve_inputs, topological_order
+from synthetic_oar import generate_synthetic_oar
+
+SCALES = [10000, 100000, 1000000, 10000000]
+# Étapes mesurées par défaut (l'extraction est remplacée par le générateur synthétique)
+SCALING_STAGES = ['cleaned_companies', 'resolved_companies', 'facilities', 'deduplicated_facilities',
+                  'relational', 'rollup', 'density', 'colocation', 'analytics',
+                  'ai_results']
+NONLINEAR_SLOPE = 1.15  # exposant log-log au-delà duquel une étape est signalée
+
+def _reference_clean_company_name(name: str) -> str:
+    """Implémentation ligne à ligne d'origine, conservée comme référence"""
+    if pd.isna(name):
+        return "Unknown"
+    
+    name = str(name).strip()
+    suffixes = [
+        r'\s+Inc\.?$', r'\s+LLC$', r'\s+Ltd\.?$', r'\s+GmbH$',
+        r'\s+SA$', r'\s+NV$', r'\s+PLC$', r'\s+Corp\.?$',
+        r'\s+Company$', r'\s+Co\.?$', r'\s+& Co\.?$'
+    ]
+    for suffix in suffixes:
+        name = re.sub(suffix, '', name, flags=re.IGNORECASE)
+    name = re.sub(r'[^\w\s&-]', ' ', name)
+    name = re.sub(r'\s+', ' ', name)
+    
+    return name.title().strip()
+
+def _reference_normalize_country(country: str) -> str:
+    """Implémentation ligne à ligne d'origine, conservée comme référence"""
+    if pd.isna(country):
+        return "Unknown"
+    
+    country = str(country).strip()
+    country_map = {
+        'Morocco': ['Morocco', 'MAR', 'Moroccan'],
+        'Spain': ['Spain', 'ESP', 'Spanish'],
+        'Portugal': ['Portugal', 'PRT', 'Portuguese'],
+        'Italy': ['Italy', 'ITA', 'Italian'],
+        'France': ['France', 'FRA', 'French'],
+        'Greece': ['Greece', 'GRC', 'Greek'],
+        'Malta': ['Malta', 'MLT', 'Maltese']
+    }
+    for standard_name, variations in country_map.items():
+        if country in variations or country.lower() in [v.lower() for v in variations]:
+            return standard_name
+    
+    return country.title()
+
+def sample_company_names(n_rows: int, n_distinct: int, seed: int = 0) -> pd.DataFrame:
+    """Noms d'entreprises répétés avec suffixes légaux et variantes de pays"""
+    rng = np.random.default_rng(seed)
+    stems = ['Atlas Textiles', 'green cotton', 'EURO-KNIT', 'Medina Garments',
+             'Tessuti Rossi', "L'Atelier du Fil", 'Hellas Apparel', 'Fab & Co']
+    suffixes = ['', ' SA', ' Inc.', ' Ltd', ' & Co.', ' Co', ' S.A.R.L.', ' LLC', ' Corp. Inc']
+    countries = ['Morocco', 'MAR', 'moroccan', 'Spain', 'ESP', 'Portugal', 'Italy',
+                 'France', 'FRA', 'Greece', 'Malta', 'Tunisia', None]
+    
+    distinct = [f"{rng.choice(stems)} {i}{rng.choice(suffixes)}" for i in range(n_distinct)]
+    names = pd.Series(np.array(distinct, dtype=object)[rng.integers(0, n_distinct, n_rows)])
+    names[rng.random(n_rows) < 0.01] = None
+    
+    return pd.DataFrame({
+        'company_name': names,
+        'country': np.array(countries, dtype=object)[rng.integers(0, len(countries), n_rows)]
+    })
+
+def bench_name_cleaning(n_rows: int = 200000, n_distinct: int = 20000) -> Dict[str, float]:
+    """Compare le nettoyage ligne à ligne et le nettoyage par lot, et vérifie l'égalité"""
+    df = sample_company_names(n_rows, n_distinct)
+    
+    start = time.perf_counter()
+    expected_names = df['company_name'].apply(_reference_clean_company_name)
+    expected_countries = df['country'].apply(_reference_normalize_country)
+    row_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    names = clean_company_names(df['company_name'])
+    countries = normalize_countries(df['country'])
+    batch_time = time.perf_counter() - start
+    
+    assert names.tolist() == expected_names.tolist(), "Noms nettoyés différents"
+    assert countries.tolist() == expected_countries.tolist(), "Pays normalisés différents"
+    
+    return {
+        'rows': n_rows,
+        'row_by_row_s': row_time,
+        'batch_s': batch_time,
+        'speedup': row_time / batch_time
+    }
+
+def _pipeline_stages():
+    # Mêmes étapes et dépendances que main.py
+    from chart_engine import DEFAULT_DPI
+    from main import build_stages
+    return build_stages(argparse.Namespace(incremental=False, csv_export=False, export_format='json',
+                                           gzip_export=False, sqlite_export=False, max_workers=1,
+                                           chunk_size=None, chart_format='png', chart_dpi=DEFAULT_DPI))
+
+def _run_isolated(workdir: str, func: Callable, kwargs: Dict[str, Any],
+                  trace_memory: bool) -> Tuple[Any, Dict[str, Any]]:
+    # Exécuté dans un processus neuf: le RSS maximal est celui de l'étape seule
+    os.chdir(workdir)
+    return profile_call(func, kwargs, trace_memory)
+
+def bench_scaling(scales: List[int], stage_names: Optional[List[str]] = None,
+                  trace_memory: bool = False, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Mesure chaque étape du pipeline sur des données synthétiques de taille croissante
+    
+    Chaque taille est traitée dans un dossier temporaire; chaque étape s'exécute
+    dans un processus dédié, pour que le pic de mémoire mesuré lui soit propre.
+    
+    Returns:
+        List[Dict[str, Any]]: Une mesure par (taille, étape)
+    """
+    stage_names = stage_names or SCALING_STAGES
+    stages = [s for s in topological_order(_pipeline_stages()) if s.name != 'raw_data']
+    measurements = []
+    
+    for n_rows in scales:
+        with tempfile.TemporaryDirectory(prefix=f"oar_bench_{n_rows}_") as workdir:
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                raw_path = Path(workdir) / generate_synthetic_oar(n_rows, seed)
+            finally:
+                os.chdir(cwd)
+            
+            results = {'raw_data': raw_path}
+            for stage in stages:
+                if all(name in results for name in stage_names):
+                    break
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    result, metrics = executor.submit(
+                        _run_isolated, workdir, stage.func, resolve_inputs(stage, results), trace_memory
+                    ).result()
+                # Chemins relatifs au dossier temporaire, où s'exécutent les étapes suivantes
+                results[stage.name] = result
+                if stage.name in stage_names:
+                    measurements.append({'rows': n_rows, 'stage': stage.name, **metrics})
+    
+    return measurements
+
+def scaling_slopes(measurements: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Exposant de la durée en fonction de la taille (pente log-log) par étape"""
+    df = pd.DataFrame(measurements)
+    slopes = {}
+    for stage, group in df.groupby('stage', sort=False):
+        group = group[group['wall_s'] > 0]
+        if group['rows'].nunique() >= 2:
+            slopes[stage] = float(np.polyfit(np.log(group['rows']), np.log(group['wall_s']), 1)[0])
+    return slopes
+
+def print_scaling_report(measurements: List[Dict[str, Any]]):
+    df = pd.DataFrame(measurements)
+    # Processus dédié par étape: à défaut du pic de l'étape, le pic du processus lui est propre
+    memory_column = next(column for column in ('tracemalloc_peak_mb', 'peak_rss_mb', 'process_peak_rss_mb')
+                         if column in df.columns)
+    
+    print(f"{'étape':<20} {'lignes':>10} {'durée (s)':>10} {'CPU (s)':>10} {'mémoire (Mo)':>13} {'lignes/s':>12}")
+    for row in df.itertuples():
+        rows_per_s = getattr(row, 'rows_per_s', float('nan'))
+        print(f"{row.stage:<20} {row.rows:>10} {row.wall_s:>10.2f} {row.cpu_s + row.cpu_children_s:>10.2f} "
+              f"{getattr(row, memory_column):>13.0f} {rows_per_s:>12.0f}")
+    
+    print("Pente log-log durée/taille (1.0 = linéaire):")
+    for stage, slope in scaling_slopes(measurements).items():
+        flag = "  <- non linéaire" if slope > NONLINEAR_SLOPE else ""
+        print(f"  {stage:<20} {slope:5.2f}{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks du pipeline OAR")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--distinct', type=int, default=20000)
+    parser.add_argument(
+        '--scales', type=int, nargs='+',
+        help=f"Mesure les étapes du pipeline à ces tailles (ex: {' '.join(map(str, SCALES))})"
+    )
+    parser.add_argument('--stages', nargs='+', default=SCALING_STAGES)
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Pic d'allocation tracemalloc au lieu du RSS maximal (plus lent)")
+    parser.add_argument('--output', type=Path, help="Écrit les mesures en JSON")
+    args = parser.parse_args()
+    
+    if args.scales:
+        measurements = bench_scaling(args.scales, args.stages, args.trace_memory)
+        print_scaling_report(measurements)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({'measurements': measurements, 'slopes': scaling_slopes(measurements)}, f, indent=2)
+        return
+    
+    result = bench_name_cleaning(args.rows, args.distinct)
+    print(f"Nettoyage des noms ({result['rows']} lignes): "
+          f"ligne à ligne {result['row_by_row_s']:.2f}s, "
+          f"par lot {result['batch_s']:.2f}s, "
+          f"x{result['speedup']:.1f}")
+
+if __name__ == "__main__":
+    main()
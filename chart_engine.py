@@ -0,0 +1,194 @@
+"""
+Module de rendu des graphiques à partir de spécifications déclaratives
+
+Chaque graphique est décrit par une ChartSpec (type, données pré-agrégées,
+libellés). Le rendu se fait sur le backend Agg, dans un pool de processus, et
+n'est refait que si l'empreinte de la spécification (données comprises), du
+format ou de la résolution a changé depuis le dernier rendu.
+"""
+import hashlib
+import json
+import logging
+import matplotlib
+matplotlib.use('Agg')  # rendu sans affichage, utilisable dans les processus du pool
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rollup_cube import histogram_quantile
+
+CHART_FORMATS = ('png', 'svg')
+DEFAULT_DPI = 300
+CACHE_FILE = "chart_cache.json"
+ENGINE_VERSION = 1  # à incrémenter quand le rendu d'un type de graphique change
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+@dataclass
+class ChartSpec:
+    """
+    Graphique déclaré sur des données pré-agrégées
+    
+    Attributes:
+        name: Nom du fichier produit (sans extension)
+        kind: Type de graphique (clé de RENDERERS)
+        data: Données agrégées, sérialisables en JSON
+        title: Titre (un par sous-graphique pour les types composés)
+        xlabel: Libellé de l'axe horizontal
+        ylabel: Libellé de l'axe vertical
+        figsize: Taille de la figure en pouces
+        options: Paramètres propres au type (palette, rotation, bins)
+    """
+    name: str
+    kind: str
+    data: Dict[str, Any]
+    title: Any = ''
+    xlabel: str = ''
+    ylabel: str = ''
+    figsize: Tuple[float, float] = (10, 6)
+    options: Dict[str, Any] = field(default_factory=dict)
+    
+    def fingerprint(self, fmt: str, dpi: int) -> str:
+        """Empreinte du rendu: spécification, données, format, résolution et version du moteur"""
+        payload = json.dumps([asdict(self), fmt, dpi, ENGINE_VERSION], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def box_stats(values: np.ndarray, counts: np.ndarray, whis: float = 1.5) -> Dict[str, Any]:
+    """
+    Statistiques de boîte à moustaches (format Axes.bxp) calculées sur un histogramme
+    
+    Mêmes conventions que plt.boxplot; chaque valeur aberrante distincte n'est
+    tracée qu'une fois.
+    """
+    q1, median, q3 = (histogram_quantile(values, counts, q) for q in (0.25, 0.5, 0.75))
+    low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+    inside = values[(values >= low) & (values <= high)]
+    return {
+        'med': median, 'q1': q1, 'q3': q3,
+        'whislo': inside.min() if len(inside) else q1,
+        'whishi': inside.max() if len(inside) else q3,
+        'fliers': values[(values < low) | (values > high)]
+    }
+
+def _render_bar(spec: ChartSpec) -> plt.Figure:
+    # data: {'labels': [...], 'values': [...]}
+    labels, values = spec.data['labels'], spec.data['values']
+    fig, ax = plt.subplots(figsize=spec.figsize)
+    colors = plt.get_cmap(spec.options.get('palette', 'viridis'))(np.linspace(0, 1, max(len(labels), 1)))
+    ax.bar(labels, values, color=colors[:len(labels)])
+    ax.set_title(spec.title, fontsize=16)
+    ax.set_xlabel(spec.xlabel, fontsize=12)
+    ax.set_ylabel(spec.ylabel, fontsize=12)
+    ax.tick_params(axis='x', labelrotation=spec.options.get('rotation', 45))
+    return fig
+
+def _render_distribution(spec: ChartSpec) -> plt.Figure:
+    # data: histogramme exact {'values': [...], 'counts': [...]}; histogramme et boîte à moustaches
+    values = np.asarray(spec.data['values'], dtype=np.int64)
+    counts = np.asarray(spec.data['counts'], dtype=np.int64)
+    hist_title, box_title = spec.title
+    fig, (hist_ax, box_ax) = plt.subplots(1, 2, figsize=spec.figsize)
+    
+    hist_ax.hist(values, bins=spec.options.get('bins', 30), weights=counts, edgecolor='black', alpha=0.7)
+    hist_ax.set_title(hist_title, fontsize=14)
+    hist_ax.set_xlabel(spec.xlabel, fontsize=12)
+    hist_ax.set_ylabel(spec.ylabel, fontsize=12)
+    
+    if len(values):
+        box_ax.bxp([box_stats(values, counts)], vert=False, showfliers=True)
+    box_ax.set_title(box_title, fontsize=14)
+    box_ax.set_xlabel(spec.xlabel, fontsize=12)
+    return fig
+
+def _render_density(spec: ChartSpec) -> plt.Figure:
+    # data: cellules non vides {'rows', 'cols', 'counts'} d'un raster {'shape'} couvrant {'extent'}
+    fig, ax = plt.subplots(figsize=spec.figsize)
+    
+    if spec.data['counts']:
+        raster = np.zeros(spec.data['shape'], dtype=np.int64)
+        raster[spec.data['rows'], spec.data['cols']] = spec.data['counts']
+        image = ax.imshow(np.ma.masked_equal(raster, 0), origin='lower', extent=spec.data['extent'],
+                          aspect='auto', cmap=spec.options.get('palette', 'viridis'), norm=LogNorm(vmin=1),
+                          interpolation='nearest')
+        fig.colorbar(image, ax=ax, label='Établissements par cellule')
+    ax.set_title(spec.title, fontsize=16)
+    ax.set_xlabel(spec.xlabel, fontsize=12)
+    ax.set_ylabel(spec.ylabel, fontsize=12)
+    return fig
+
+RENDERERS: Dict[str, Callable[[ChartSpec], plt.Figure]] = {
+    'bar': _render_bar,
+    'distribution': _render_distribution,
+    'density': _render_density
+}
+
+def render_chart(spec: ChartSpec, path: Path, dpi: int = DEFAULT_DPI) -> Path:
+    """Rend un graphique dans `path` (format déduit de l'extension)"""
+    fig = RENDERERS[spec.kind](spec)
+    try:
+        fig.tight_layout()
+        fig.savefig(path, dpi=dpi)
+    finally:
+        plt.close(fig)
+    return path
+
+def _load_cache(path: Path) -> Dict[str, str]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def render_charts(specs: List[ChartSpec], output_dir: Path, fmt: str = 'png', dpi: int = DEFAULT_DPI,
+                  n_workers: Optional[int] = None) -> Dict[str, Path]:
+    """
+    Rend les graphiques dont l'empreinte a changé, les autres sont repris tels quels
+    
+    Args:
+        specs: Graphiques à produire
+        output_dir: Dossier de sortie (contient aussi le cache des empreintes)
+        fmt: 'png' ou 'svg'
+        dpi: Résolution (PNG)
+        n_workers: Nombre de processus (None ou 1 pour rester dans le processus courant)
+    
+    Returns:
+        Dict[str, Path]: Chemin de chaque graphique, par nom de spécification
+    """
+    logger = setup_module_logging()
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"Format de graphique inconnu: {fmt} (attendu: {', '.join(CHART_FORMATS)})")
+    
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = output_dir / CACHE_FILE
+    cache = _load_cache(cache_path)
+    
+    paths, pending = {}, []
+    for spec in specs:
+        path = output_dir / f"{spec.name}.{fmt}"
+        fingerprint = spec.fingerprint(fmt, dpi)
+        paths[spec.name] = path
+        if cache.get(path.name) == fingerprint and path.exists():
+            continue
+        pending.append((spec, path, fingerprint))
+    logger.info(f"Graphiques: {len(pending)} à rendre, {len(specs) - len(pending)} repris du cache")
+    
+    if n_workers and n_workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(pending))) as executor:
+            futures = [executor.submit(render_chart, spec, path, dpi) for spec, path, _ in pending]
+            for future in futures:
+                future.result()
+    else:
+        for spec, path, _ in pending:
+            render_chart(spec, path, dpi)
+    
+    if pending:
+        cache.update({path.name: fingerprint for _, path, fingerprint in pending})
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2, sort_keys=True)
+    
+    return paths
@@ -7,10 +7,52 @@ import re
 import hashlib
 import logging
 from pathlib import Path
-from typing import Tuple
+from typing import Tuple, Optional
+
+from artifact_store import TableWriter, iter_batches, read_table, write_table
+from id_generation import SeenKeys, factorize_rows, hash_keys_batch
+from partitioning import PARALLEL_THRESHOLD, map_partitions
+from profiling import record_rows, timed_section
+from scrape_oar import RAW_SCHEMA
 
 DATA_DIR = Path("data/cleaned")
 
+COMPANIES_SCHEMA = {
+    'company_id': 'string',
+    'company_name': 'string',
+    'country': 'string',
+    'original_company_id': 'string',
+    'original_name': 'string'
+}
+
+# Suffixes légaux, retirés dans cet ordre
+LEGAL_SUFFIXES = [
+    r'\s+Inc\.?$', r'\s+LLC$', r'\s+Ltd\.?$', r'\s+GmbH$', 
+    r'\s+SA$', r'\s+NV$', r'\s+PLC$', r'\s+Corp\.?$',
+    r'\s+Company$', r'\s+Co\.?$', r'\s+& Co\.?$'
+]
+SUFFIX_PATTERNS = [re.compile(suffix, re.IGNORECASE) for suffix in LEGAL_SUFFIXES]
+# Motif combiné: détecte en une passe les noms concernés par au moins un suffixe
+ANY_SUFFIX_PATTERN = re.compile('|'.join(LEGAL_SUFFIXES), re.IGNORECASE)
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s&-]')  # Garde & et -
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Mapping des variations de pays
+COUNTRY_VARIANTS = {
+    'Morocco': ['Morocco', 'MAR', 'Moroccan'],
+    'Spain': ['Spain', 'ESP', 'Spanish'],
+    'Portugal': ['Portugal', 'PRT', 'Portuguese'],
+    'Italy': ['Italy', 'ITA', 'Italian'],
+    'France': ['France', 'FRA', 'French'],
+    'Greece': ['Greece', 'GRC', 'Greek'],
+    'Malta': ['Malta', 'MLT', 'Maltese']
+}
+COUNTRY_LOOKUP = {
+    variation.lower(): standard_name
+    for standard_name, variations in COUNTRY_VARIANTS.items()
+    for variation in variations
+}
+
 def setup_module_logging():
     return logging.getLogger(__name__)
 
@@ -23,18 +65,12 @@ def clean_company_name(name: str) -> str:
     name = str(name).strip()
     
     # Suppression des suffixes légaux
-    suffixes = [
-        r'\s+Inc\.?$', r'\s+LLC$', r'\s+Ltd\.?$', r'\s+GmbH$', 
-        r'\s+SA$', r'\s+NV$', r'\s+PLC$', r'\s+Corp\.?$',
-        r'\s+Company$', r'\s+Co\.?$', r'\s+& Co\.?$'
-    ]
-    
-    for suffix in suffixes:
-        name = re.sub(suffix, '', name, flags=re.IGNORECASE)
+    for pattern in SUFFIX_PATTERNS:
+        name = pattern.sub('', name)
     
     # Normalisation de la ponctuation et des espaces
-    name = re.sub(r'[^\w\s&-]', ' ', name)  # Garde & et -
-    name = re.sub(r'\s+', ' ', name)
+    name = PUNCTUATION_PATTERN.sub(' ', name)
+    name = WHITESPACE_PATTERN.sub(' ', name)
     
     # Titrage (première lettre de chaque mot en majuscule)
     name = name.title()
@@ -48,22 +84,48 @@ def normalize_country(country: str) -> str:
     
     country = str(country).strip()
     
-    # Mapping des variations
-    country_map = {
-        'Morocco': ['Morocco', 'MAR', 'Moroccan'],
-        'Spain': ['Spain', 'ESP', 'Spanish'],
-        'Portugal': ['Portugal', 'PRT', 'Portuguese'],
-        'Italy': ['Italy', 'ITA', 'Italian'],
-        'France': ['France', 'FRA', 'French'],
-        'Greece': ['Greece', 'GRC', 'Greek'],
-        'Malta': ['Malta', 'MLT', 'Maltese']
-    }
-    
-    for standard_name, variations in country_map.items():
-        if country in variations or country.lower() in [v.lower() for v in variations]:
-            return standard_name
-    
-    return country.title()
+    return COUNTRY_LOOKUP.get(country.lower(), country.title())
+
+def map_unique(values: pd.Series, transform, missing: str) -> pd.Series:
+    """
+    Applique `transform` aux seules valeurs distinctes puis propage le résultat
+    
+    Args:
+        values: Colonne à transformer
+        transform: Fonction Series -> Series appliquée aux valeurs distinctes non nulles
+        missing: Valeur attribuée aux valeurs manquantes
+    """
+    codes, uniques = pd.factorize(values)
+    transformed = transform(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    
+    # Le code -1 (valeur manquante) pointe sur le dernier élément ajouté
+    result = np.append(transformed, missing)[codes]
+    return pd.Series(result, index=values.index, dtype=object)
+
+def _clean_unique_names(names: pd.Series) -> pd.Series:
+    """Nettoyage vectorisé, équivalent à clean_company_name"""
+    names = pd.Series([str(name).strip() for name in names], dtype=object)
+    
+    # Les suffixes ne sont retirés que des noms qui en portent au moins un
+    has_suffix = names.str.contains(ANY_SUFFIX_PATTERN, regex=True)
+    if has_suffix.any():
+        stripped = names[has_suffix]
+        for pattern in SUFFIX_PATTERNS:
+            stripped = stripped.str.replace(pattern, '', regex=True)
+        names[has_suffix] = stripped
+    
+    names = names.str.replace(PUNCTUATION_PATTERN, ' ', regex=True)
+    names = names.str.replace(WHITESPACE_PATTERN, ' ', regex=True)
+    
+    return names.str.title().str.strip()
+
+def clean_company_names(names: pd.Series) -> pd.Series:
+    """Nettoie une colonne de noms d'entreprises (résultat identique à clean_company_name)"""
+    return map_unique(names, _clean_unique_names, "Unknown")
+
+def normalize_countries(countries: pd.Series) -> pd.Series:
+    """Normalise une colonne de pays (résultat identique à normalize_country)"""
+    return map_unique(countries, lambda uniques: uniques.map(normalize_country), "Unknown")
 
 def generate_company_id(company_name: str, country: str) -> str:
     """Génère un ID déterministe pour une entreprise"""
@@ -75,56 +137,115 @@ def generate_company_id(company_name: str, country: str) -> str:
     
     return f"COMP_{hash_obj.hexdigest()[:12]}"
 
-def clean_companies(input_path: Path) -> Path:
-    """Nettoie et normalise les données entreprises"""
-    logger = setup_module_logging()
-    logger.info(f"Début du nettoyage des entreprises: {input_path}")
-    
-    # Création du dossier de sortie
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # Lecture des données
-    df = pd.read_csv(input_path)
+def generate_company_ids(company_names: pd.Series, countries: pd.Series,
+                         n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Génère les IDs d'entreprises d'une colonne entière (identiques à generate_company_id)
+    
+    Chaque couple (nom, pays) distinct n'est hashé qu'une fois.
+    """
+    first_positions, codes = factorize_rows(company_names, countries)
+    names = np.asarray(company_names, dtype=object)[first_positions]
+    countries = np.asarray(countries, dtype=object)[first_positions]
+    
+    keys = [f"{name}_{country}".lower() for name, country in zip(names, countries)]
+    return hash_keys_batch(keys, "COMP_", n_workers)[codes]
+
+def clean_company_batch(companies_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Nettoie un bloc d'entreprises déjà dédoublonnées sur company_id
     
-    # Création du DataFrame entreprises
-    companies_df = df[['company_id', 'company_name', 'country']].copy()
-    companies_df = companies_df.drop_duplicates(subset=['company_id'])
+    Chaque ligne est transformée indépendamment des autres: le résultat d'un
+    traitement par blocs est identique à celui de la table entière.
+    """
+    logger = setup_module_logging()
+    companies_df = companies_df.copy()
     
     # Nettoyage des noms
     logger.info("Nettoyage des noms d'entreprises")
-    companies_df['company_name_clean'] = companies_df['company_name'].apply(clean_company_name)
+    with timed_section('clean_names'):
+        companies_df['company_name_clean'] = clean_company_names(companies_df['company_name'])
     
     # Normalisation des pays
     logger.info("Normalisation des pays")
-    companies_df['country_normalized'] = companies_df['country'].apply(normalize_country)
+    with timed_section('normalize_countries'):
+        companies_df['country_normalized'] = normalize_countries(companies_df['country'])
     
     # Génération des IDs
     logger.info("Génération des IDs d'entreprises")
-    companies_df['company_id_unified'] = companies_df.apply(
-        lambda row: generate_company_id(row['company_name_clean'], row['country_normalized']),
-        axis=1
-    )
+    with timed_section('generate_ids'):
+        companies_df['company_id_unified'] = generate_company_ids(
+            companies_df['company_name_clean'],
+            companies_df['country_normalized']
+        )
     
     # Sélection des colonnes finales
     final_columns = {
+        'company_id': 'original_company_id',
+        'company_name': 'original_name',
+        'country': 'original_country',
         'company_id_unified': 'company_id',
         'company_name_clean': 'company_name',
-        'country_normalized': 'country',
-        'original_company_id': 'company_id',
-        'original_name': 'company_name'
+        'country_normalized': 'country'
     }
     
     companies_clean = companies_df.rename(columns=final_columns)
-    companies_clean = companies_clean[[
-        'company_id', 'company_name', 'country', 
-        'original_company_id', 'original_name'
-    ]]
+    return companies_clean[list(COMPANIES_SCHEMA)]
+
+def clean_companies(input_path: Path, chunk_size: Optional[int] = None,
+                    n_workers: Optional[int] = None) -> Path:
+    """
+    Nettoie et normalise les données entreprises
+    
+    Args:
+        input_path: Fichier brut
+        chunk_size: Traitement par blocs de lignes (mémoire bornée), table entière si None
+        n_workers: Processus du traitement partitionné par pays (None ou 1: processus courant;
+            ignoré en traitement par blocs)
+    """
+    logger = setup_module_logging()
+    logger.info(f"Début du nettoyage des entreprises: {input_path}")
     
-    # Sauvegarde
-    output_path = DATA_DIR / "companies_cleaned.csv"
-    companies_clean.to_csv(output_path, index=False, encoding='utf-8')
+    # Création du dossier de sortie
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    columns = ['company_id', 'company_name', 'country']
+    
+    if chunk_size:
+        # Seules les empreintes des company_id déjà vus sont conservées d'un bloc à l'autre
+        seen = SeenKeys()
+        n_companies = 0
+        with TableWriter(DATA_DIR, "companies_cleaned", COMPANIES_SCHEMA) as writer:
+            for chunk in iter_batches(input_path, columns=columns, schema=RAW_SCHEMA, batch_size=chunk_size):
+                record_rows(rows_in=len(chunk))
+                chunk = chunk[seen.add(chunk['company_id'])]
+                writer.write(clean_company_batch(chunk))
+                n_companies += len(chunk)
+        output_path = writer.path
+    else:
+        # Lecture des seules colonnes entreprises
+        df = read_table(input_path, columns=columns, schema=RAW_SCHEMA)
+        record_rows(rows_in=len(df))
+        
+        # Création du DataFrame entreprises
+        companies_df = df[columns].copy()
+        companies_df = companies_df.drop_duplicates(subset=['company_id'])
+        
+        if n_workers and n_workers > 1 and len(companies_df) >= PARALLEL_THRESHOLD:
+            # Pas d'interaction entre pays avant la génération des IDs: une partition par pays
+            with timed_section('partitioned_clean'):
+                companies_clean, = map_partitions(
+                    companies_df, normalize_countries(companies_df['country']),
+                    clean_company_batch, n_workers
+                )
+        else:
+            companies_clean = clean_company_batch(companies_df)
+        n_companies = len(companies_clean)
+        
+        # Sauvegarde
+        output_path = write_table(companies_clean, DATA_DIR, "companies_cleaned", COMPANIES_SCHEMA)
     
     logger.info(f"Entreprises nettoyées sauvegardées: {output_path}")
-    logger.info(f"Nombre d'entreprises: {len(companies_clean)}")
+    logger.info(f"Nombre d'entreprises: {n_companies}")
+    record_rows(rows_out=n_companies)
     
-    return output_path
\ No newline at end of file
+    return output_path
@@ -6,11 +6,40 @@ import numpy as np
 import re
 import hashlib
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, Tuple, Optional
+
+from artifact_store import TableWriter, iter_batches, read_table, write_table
+from clean_companies import COMPANIES_SCHEMA, normalize_country, normalize_countries
+from id_generation import factorize_rows, hash_keys_batch
+from partitioning import PARALLEL_THRESHOLD, map_partitions
+from profiling import record_rows, timed_section
+from scrape_oar import RAW_SCHEMA
 
 DATA_DIR = Path("data/cleaned")
 
+FACILITIES_SCHEMA = {
+    'facility_id': 'string',
+    'facility_name': 'string',
+    'address': 'string',
+    'country': 'string',
+    'original_country': 'string',
+    'lat': 'float64',
+    'lon': 'float64',
+    'is_closed': 'boolean',
+    'sector': 'string',
+    'processing_activity': 'string',
+    'contributor': 'string',
+    'created_at': 'string',
+    'updated_at': 'string',
+    'original_id': 'string'
+}
+LINKS_SCHEMA = {
+    'company_id': 'string',
+    'facility_id': 'string'
+}
+
 def setup_module_logging():
     return logging.getLogger(__name__)
 
@@ -37,94 +66,192 @@ def generate_facility_id(facility_name: str, lat: float, lon: float) -> str:
     hash_obj = hashlib.md5(unique_string)
     return f"FAC_{hash_obj.hexdigest()[:12]}"
 
-def process_facilities(cleaned_companies_path: Path) -> Dict[str, Path]:
-    """Traite les données des établissements"""
-    logger = setup_module_logging()
-    logger.info(f"Traitement des établissements pour: {cleaned_companies_path}")
+# Correspondance colonnes brutes -> colonnes établissements
+RAW_TO_FACILITY = {
+    'id': 'original_id',
+    'name': 'original_name',
+    'address': 'address',
+    'country': 'original_country',
+    'lat': 'lat',
+    'lon': 'lon',
+    'is_closed': 'is_closed',
+    'sector': 'sector',
+    'processing_activity': 'processing_activity',
+    'contributor': 'contributor',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'company_id': 'original_company_id',
+    'company_name': 'original_company_name'
+}
+
+def build_company_lookup(companies_df: pd.DataFrame) -> pd.DataFrame:
+    """Construit l'index original_company_id -> entreprise unifiée (première occurrence)"""
+    lookup = companies_df.dropna(subset=['original_company_id'])
+    lookup = lookup.drop_duplicates(subset=['original_company_id'], keep='first')
+    return lookup.set_index('original_company_id')[['company_id', 'company_name']]
+
+def resolve_companies(facilities_df: pd.DataFrame, lookup: pd.DataFrame) -> int:
+    """
+    Associe chaque établissement à son entreprise unifiée en une seule passe
+    
+    Returns:
+        int: Nombre d'établissements sans entreprise correspondante
+    """
+    matched = lookup.reindex(facilities_df['original_company_id'])
+    facilities_df['company_id'] = matched['company_id'].to_numpy()
+    facilities_df['company_name'] = matched['company_name'].to_numpy()
+    
+    return int(facilities_df['company_id'].isna().sum())
+
+def generate_facility_ids(facility_names: pd.Series, lats: pd.Series, lons: pd.Series,
+                          n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Génère les IDs d'établissements d'une colonne entière (identiques à generate_facility_id)
+    
+    Chaque triplet (nom, lat, lon) distinct n'est hashé qu'une fois.
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    first_positions, codes = factorize_rows(facility_names, lats, lons)
+    names = np.asarray(facility_names, dtype=object)[first_positions]
     
-    # Lecture des données originales et des entreprises nettoyées
-    raw_df = pd.read_csv("data/raw/oar_raw_*.csv" if "raw" in cleaned_companies_path.parent.name else cleaned_companies_path)
-    companies_df = pd.read_csv(cleaned_companies_path)
+    keys = [
+        name.lower() if lat != lat or lon != lon else f"{name}_{lat:.4f}_{lon:.4f}".lower()
+        for name, lat, lon in zip(names.tolist(), lats[first_positions].tolist(),
+                                  lons[first_positions].tolist())
+    ]
+    
+    return hash_keys_batch(keys, "FAC_", n_workers)[codes]
+
+def build_facility_batch(raw_df: pd.DataFrame, lookup: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, int]:
+    """
+    Construit les établissements et les liens d'un bloc de lignes brutes
+    
+    Chaque ligne est traitée indépendamment des autres: le résultat d'un
+    traitement par blocs est identique à celui de la table entière.
+    
+    Returns:
+        Tuple: (établissements, liens, nombre d'établissements sans entreprise)
+    """
+    logger = setup_module_logging()
     
     # Préparation des données établissements
-    facilities_data = []
-    
-    for _, row in raw_df.iterrows():
-        facility_record = {
-            'original_id': row.get('id'),
-            'original_name': row.get('name'),
-            'address': row.get('address'),
-            'original_country': row.get('country'),
-            'lat': row.get('lat'),
-            'lon': row.get('lon'),
-            'is_closed': row.get('is_closed', False),
-            'sector': row.get('sector'),
-            'processing_activity': row.get('processing_activity'),
-            'contributor': row.get('contributor'),
-            'created_at': row.get('created_at'),
-            'updated_at': row.get('updated_at'),
-            'original_company_id': row.get('company_id'),
-            'original_company_name': row.get('company_name')
-        }
-        
-        # Recherche de l'entreprise correspondante
-        company_match = companies_df[
-            companies_df['original_company_id'] == row.get('company_id')
-        ]
-        
-        if not company_match.empty:
-            facility_record['company_id'] = company_match.iloc[0]['company_id']
-            facility_record['company_name'] = company_match.iloc[0]['company_name']
-        else:
-            facility_record['company_id'] = None
-            facility_record['company_name'] = None
-        
-        facilities_data.append(facility_record)
+    facilities_df = raw_df.reindex(columns=list(RAW_TO_FACILITY)).rename(columns=RAW_TO_FACILITY)
+    if 'is_closed' not in raw_df.columns:
+        facilities_df['is_closed'] = False
+    facilities_df['country'] = facilities_df['original_country'].apply(normalize_country)
     
-    facilities_df = pd.DataFrame(facilities_data)
+    # Jointure avec les entreprises via l'index construit une seule fois
+    logger.info("Association des établissements aux entreprises")
+    with timed_section('resolve_companies'):
+        unmatched = resolve_companies(facilities_df, lookup)
     
     # Nettoyage des noms d'établissements
     logger.info("Nettoyage des noms d'établissements")
-    facilities_df['facility_name_clean'] = facilities_df['original_name'].apply(clean_facility_name)
+    with timed_section('clean_names'):
+        facilities_df['facility_name_clean'] = facilities_df['original_name'].apply(clean_facility_name)
     
     # Génération des IDs d'établissements
     logger.info("Génération des IDs d'établissements")
-    facilities_df['facility_id'] = facilities_df.apply(
-        lambda row: generate_facility_id(
-            row['facility_name_clean'], 
-            row['lat'], 
-            row['lon']
-        ),
-        axis=1
-    )
+    with timed_section('generate_ids'):
+        facilities_df['facility_id'] = generate_facility_ids(
+            facilities_df['facility_name_clean'],
+            facilities_df['lat'],
+            facilities_df['lon']
+        )
     
     # Table des établissements
-    facilities_table = facilities_df[[
-        'facility_id', 'facility_name_clean', 'address',
-        'original_country', 'lat', 'lon', 'is_closed',
-        'sector', 'processing_activity', 'contributor',
-        'created_at', 'updated_at', 'original_id'
-    ]].rename(columns={'facility_name_clean': 'facility_name'})
+    facilities_df['facility_name'] = facilities_df['facility_name_clean']
+    facilities_table = facilities_df[list(FACILITIES_SCHEMA)]
     
     # Table de liaison entreprises-établissements
     links_table = facilities_df[['company_id', 'facility_id']].dropna()
     
-    # Sauvegarde
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    return facilities_table, links_table, unmatched
+
+def load_company_lookup(cleaned_companies_path: Path) -> pd.DataFrame:
+    """Lit les entreprises nettoyées et construit l'index de rattachement"""
+    companies_df = read_table(
+        cleaned_companies_path,
+        columns=['original_company_id', 'company_id', 'company_name'],
+        schema=COMPANIES_SCHEMA
+    )
+    return build_company_lookup(companies_df)
+
+# Dans un processus du pool, l'index n'est lu qu'une fois pour toutes ses partitions
+_worker_company_lookup = lru_cache(maxsize=1)(load_company_lookup)
+
+def _facility_partition(raw_df: pd.DataFrame, cleaned_companies_path: Path) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # Traitement d'une partition pays dans un processus du pool
+    facilities_table, links_table, _ = build_facility_batch(raw_df, _worker_company_lookup(cleaned_companies_path))
+    return facilities_table, links_table
+
+def process_facilities(cleaned_companies_path: Path, raw_data_path: Path,
+                       chunk_size: Optional[int] = None, n_workers: Optional[int] = None) -> Dict[str, Path]:
+    """
+    Traite les données des établissements
     
-    facilities_path = DATA_DIR / "facilities.csv"
-    links_path = DATA_DIR / "company_facilities_links.csv"
+    Args:
+        cleaned_companies_path: Entreprises nettoyées
+        raw_data_path: Fichier brut
+        chunk_size: Traitement par blocs de lignes brutes (mémoire bornée), table entière si None
+        n_workers: Processus du traitement partitionné par pays (None ou 1: processus courant;
+            ignoré en traitement par blocs)
+    """
+    logger = setup_module_logging()
+    logger.info(f"Traitement des établissements pour: {raw_data_path}")
     
-    facilities_table.to_csv(facilities_path, index=False)
-    links_table.to_csv(links_path, index=False)
+    if chunk_size:
+        # Index des entreprises, seul état partagé entre les blocs
+        lookup = load_company_lookup(cleaned_companies_path)
+        n_facilities = n_links = unmatched = 0
+        with TableWriter(DATA_DIR, "facilities", FACILITIES_SCHEMA) as facilities_writer, \
+                TableWriter(DATA_DIR, "company_facilities_links", LINKS_SCHEMA) as links_writer:
+            for raw_df in iter_batches(raw_data_path, schema=RAW_SCHEMA, batch_size=chunk_size):
+                record_rows(rows_in=len(raw_df))
+                facilities_table, links_table, chunk_unmatched = build_facility_batch(raw_df, lookup)
+                facilities_writer.write(facilities_table)
+                links_writer.write(links_table)
+                n_facilities += len(facilities_table)
+                n_links += len(links_table)
+                unmatched += chunk_unmatched
+        facilities_path = facilities_writer.path
+        links_path = links_writer.path
+    else:
+        # Lecture des données originales
+        raw_df = read_table(raw_data_path, schema=RAW_SCHEMA)
+        record_rows(rows_in=len(raw_df))
+        if n_workers and n_workers > 1 and len(raw_df) >= PARALLEL_THRESHOLD:
+            # Une partition par pays normalisé; l'index des entreprises est relu par chaque processus
+            with timed_section('partitioned_facilities'):
+                facilities_table, links_table = map_partitions(
+                    raw_df, normalize_countries(raw_df['country']), _facility_partition, n_workers,
+                    cleaned_companies_path=cleaned_companies_path
+                )
+            # Les IDs établissement ne sont jamais manquants: seuls les liens sans entreprise sont écartés
+            unmatched = len(facilities_table) - len(links_table)
+        else:
+            facilities_table, links_table, unmatched = build_facility_batch(
+                raw_df, load_company_lookup(cleaned_companies_path)
+            )
+        del raw_df
+        n_facilities = len(facilities_table)
+        n_links = len(links_table)
+        
+        # Sauvegarde
+        facilities_path = write_table(facilities_table, DATA_DIR, "facilities", FACILITIES_SCHEMA)
+        links_path = write_table(links_table, DATA_DIR, "company_facilities_links", LINKS_SCHEMA)
     
+    if unmatched:
+        logger.warning(f"{unmatched} établissements sans entreprise correspondante")
     logger.info(f"Établissements sauvegardés: {facilities_path}")
     logger.info(f"Liens sauvegardés: {links_path}")
-    logger.info(f"Nombre d'établissements: {len(facilities_table)}")
-    logger.info(f"Nombre de liens: {len(links_table)}")
+    logger.info(f"Nombre d'établissements: {n_facilities}")
+    logger.info(f"Nombre de liens: {n_links}")
+    record_rows(rows_out=n_facilities)
     
     return {
         'companies': cleaned_companies_path,
         'facilities': facilities_path,
         'links': links_path
-    }
\ No newline at end of file
+    }
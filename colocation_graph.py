@@ -0,0 +1,220 @@
+"""
+Module du graphe de co-localisation des entreprises
+
+Les liens entreprises-établissements forment un graphe biparti, stocké en
+matrice d'incidence creuse au format CSR (tableaux NumPy indptr / indices,
+une ligne par établissement). Le produit AᵀA hors diagonale donne, pour
+chaque paire d'entreprises, le nombre d'établissements partagés: il est
+calculé par lots d'établissements dont le nombre de paires est borné, sans
+boucle Python sur les lignes. Les grappes de fournisseurs sont les
+composantes connexes du graphe biparti (union-find vectorisé).
+"""
+import json
+import logging
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+from artifact_store import read_table, write_table
+from clean_facilities import LINKS_SCHEMA
+from entity_resolution import UnionFind
+from profiling import record_rows, timed_section
+
+COLOCATION_DIR = Path("data/outputs/colocation")
+PAIR_BATCH_SIZE = 5000000  # paires d'entreprises générées au plus par lot
+MAX_FACILITY_DEGREE = 1000  # au-delà, un établissement n'entre pas dans les comptages de paires
+TOP_K = 20
+
+PAIRS_SCHEMA = {
+    'company_a': 'string',
+    'company_b': 'string',
+    'shared_facilities': 'int64'
+}
+CLUSTERS_SCHEMA = {
+    'company_id': 'string',
+    'cluster_id': 'string',
+    'cluster_size': 'int64'
+}
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+@dataclass
+class IncidenceMatrix:
+    """
+    Matrice d'incidence établissements x entreprises au format CSR
+    
+    Attributes:
+        indptr: Début de la ligne de chaque établissement dans `indices` (n_facilities + 1)
+        indices: Codes entreprise de chaque lien, triés par établissement
+        company_ids: Identifiant de chaque code entreprise
+        facility_ids: Identifiant de chaque ligne
+    """
+    indptr: np.ndarray
+    indices: np.ndarray
+    company_ids: np.ndarray
+    facility_ids: np.ndarray
+    
+    @property
+    def degrees(self) -> np.ndarray:
+        """Nombre d'entreprises de chaque établissement"""
+        return np.diff(self.indptr)
+    
+    @classmethod
+    def from_links(cls, company_ids: pd.Series, facility_ids: pd.Series) -> 'IncidenceMatrix':
+        """Construit la matrice depuis les colonnes de liens (liens incomplets et doublons ignorés)"""
+        company_codes, companies = pd.factorize(company_ids)
+        facility_codes, facilities = pd.factorize(facility_ids)
+        valid = (company_codes >= 0) & (facility_codes >= 0)
+        keys = np.unique(facility_codes[valid].astype(np.int64) * len(companies) + company_codes[valid])
+        rows, indices = keys // max(len(companies), 1), keys % max(len(companies), 1)
+        indptr = np.zeros(len(facilities) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(facilities)), out=indptr[1:])
+        return cls(indptr, indices, np.asarray(companies, dtype=object), np.asarray(facilities, dtype=object))
+
+def _row_pairs(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Toutes les paires (i < j) de codes d'une même ligne, pour les lignes `rows`
+    starts, degrees = indptr[rows], indptr[rows + 1] - indptr[rows]
+    local = np.arange(degrees.sum()) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    positions = np.repeat(starts, degrees) + local
+    partners = np.repeat(degrees, degrees) - local - 1  # éléments suivants dans la ligne
+    left = np.repeat(positions, partners)
+    offsets = np.arange(partners.sum()) - np.repeat(np.cumsum(partners) - partners, partners)
+    right = left + 1 + offsets
+    return indices[left], indices[right]
+
+def _pair_batches(matrix: IncidenceMatrix, max_degree: int,
+                  batch_size: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    # Lots de lignes consécutives dont le nombre total de paires reste sous batch_size
+    degrees = matrix.degrees
+    rows = np.flatnonzero((degrees >= 2) & (degrees <= max_degree))
+    n_pairs = degrees[rows] * (degrees[rows] - 1) // 2
+    batch_of_row = np.cumsum(n_pairs) // batch_size
+    for batch_rows in np.split(rows, np.flatnonzero(np.diff(batch_of_row)) + 1):
+        if len(batch_rows):
+            yield _row_pairs(matrix.indptr, matrix.indices, batch_rows)
+
+def shared_facility_counts(matrix: IncidenceMatrix, max_degree: int = MAX_FACILITY_DEGREE,
+                           batch_size: int = PAIR_BATCH_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Nombre d'établissements partagés par paire d'entreprises (AᵀA hors diagonale)
+    
+    Returns:
+        Tuple: (code a, code b, établissements partagés) avec a < b, paires non nulles uniquement
+    """
+    n_companies = max(len(matrix.company_ids), 1)
+    keys = np.empty(0, dtype=np.int64)
+    counts = np.empty(0, dtype=np.int64)
+    for a, b in _pair_batches(matrix, max_degree, batch_size):
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        batch_keys, batch_counts = np.unique(low * n_companies + high, return_counts=True)
+        # Fusion avec l'accumulateur: mémoire bornée par le lot et le nombre de paires distinctes
+        keys, inverse = np.unique(np.concatenate([keys, batch_keys]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([counts, batch_counts])).astype(np.int64)
+    return keys // n_companies, keys % n_companies, counts
+
+def company_clusters(matrix: IncidenceMatrix) -> np.ndarray:
+    """
+    Grappe de chaque entreprise: composantes connexes du graphe biparti
+    
+    Returns:
+        np.ndarray: Code de la plus petite entreprise de la grappe, pour chaque code entreprise
+    """
+    n_companies = len(matrix.company_ids)
+    union_find = UnionFind(n_companies + len(matrix.facility_ids))
+    rows = np.repeat(np.arange(len(matrix.facility_ids)), matrix.degrees)
+    # Nœuds entreprises en tête: la racine d'une grappe est toujours une entreprise
+    union_find.union(matrix.indices, n_companies + rows)
+    return union_find.find()[:n_companies]
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Positions des k plus grandes valeurs, décroissantes (égalités: plus petite position)"""
+    return np.lexsort((np.arange(len(values)), -values))[:k]
+
+def build_colocation_graph(relational_paths: Dict[str, Path], output_dir: Path = COLOCATION_DIR,
+                           k: int = TOP_K) -> Dict[str, Path]:
+    """
+    Calcule le graphe de co-localisation des entreprises et ses grappes
+    
+    Args:
+        relational_paths: Tables relationnelles (links)
+        output_dir: Dossier des sorties
+        k: Nombre d'entreprises du classement des plus connectées
+    
+    Returns:
+        Dict[str, Path]: pairs (paires et établissements partagés), clusters
+        (grappe de chaque entreprise), summary (JSON: grappes et classement)
+    """
+    logger = setup_module_logging()
+    logger.info("Construction du graphe de co-localisation des entreprises")
+    
+    links = read_table(relational_paths['links'], schema=LINKS_SCHEMA)
+    record_rows(rows_in=len(links))
+    
+    with timed_section('incidence_matrix'):
+        matrix = IncidenceMatrix.from_links(links['company_id'], links['facility_id'])
+    del links
+    n_companies = len(matrix.company_ids)
+    skipped = int((matrix.degrees > MAX_FACILITY_DEGREE).sum())
+    if skipped:
+        logger.warning(f"{skipped} établissements de plus de {MAX_FACILITY_DEGREE} entreprises "
+                       f"exclus des comptages de paires")
+    
+    with timed_section('shared_facilities'):
+        a, b, shared = shared_facility_counts(matrix)
+    with timed_section('clusters'):
+        roots = company_clusters(matrix)
+    
+    # Degré de co-localisation: entreprises distinctes partageant au moins un établissement
+    partners = np.bincount(np.concatenate([a, b]), minlength=n_companies)
+    shared_total = np.bincount(np.concatenate([a, b]), weights=np.concatenate([shared, shared]),
+                               minlength=n_companies).astype(np.int64)
+    cluster_sizes = np.bincount(roots, minlength=n_companies)
+    
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pairs = pd.DataFrame({
+        'company_a': matrix.company_ids[a],
+        'company_b': matrix.company_ids[b],
+        'shared_facilities': shared
+    })
+    pairs_path = write_table(pairs, output_dir, "company_colocation_pairs", PAIRS_SCHEMA)
+    clusters = pd.DataFrame({
+        'company_id': matrix.company_ids,
+        'cluster_id': matrix.company_ids[roots],
+        'cluster_size': cluster_sizes[roots]
+    })
+    clusters_path = write_table(clusters, output_dir, "company_clusters", CLUSTERS_SCHEMA)
+    
+    cluster_roots = np.flatnonzero(cluster_sizes)
+    largest = cluster_roots[top_k(cluster_sizes[cluster_roots], k)]
+    summary = {
+        'companies': n_companies,
+        'facilities': len(matrix.facility_ids),
+        'links': len(matrix.indices),
+        'colocated_pairs': len(shared),
+        'clusters': len(cluster_roots),
+        'singleton_clusters': int((cluster_sizes[cluster_roots] == 1).sum()),
+        'largest_clusters': [
+            {'cluster_id': str(matrix.company_ids[root]), 'companies': int(cluster_sizes[root])}
+            for root in largest
+        ],
+        'most_connected_companies': [
+            {'company_id': str(matrix.company_ids[code]), 'colocated_companies': int(partners[code]),
+             'shared_facilities': int(shared_total[code])}
+            for code in top_k(partners, k) if partners[code]
+        ]
+    }
+    summary_path = output_dir / "colocation_summary.json"
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    
+    logger.info(f"Graphe de co-localisation: {len(shared)} paires, {summary['clusters']} grappes")
+    record_rows(rows_out=len(pairs) + len(clusters))
+    
+    return {
+        'pairs': pairs_path,
+        'clusters': clusters_path,
+        'summary': summary_path
+    }
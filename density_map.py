@@ -0,0 +1,177 @@
+"""
+Module de carte de densité des établissements
+
+Les coordonnées sont regroupées en une passe, par blocs, dans une grille
+carrée en degrés (origine -180, -90). La grille la plus fine (MAX_ZOOM) est
+calculée sur les points; chaque niveau inférieur double la taille des
+cellules et s'obtient en agrégeant le niveau fin, sans relire les points.
+Les comptages de tous les niveaux sont conservés dans un fichier .npz
+compact (cellules non vides uniquement), dont le rendu ne dépend que du
+nombre de cellules et non du nombre d'établissements.
+"""
+import logging
+import numpy as np
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Tuple
+
+from artifact_store import iter_batches
+from chart_engine import ChartSpec
+from profiling import record_rows, timed_section
+
+DENSITY_PATH = Path("data/outputs/facility_density.npz")
+BASE_CELL_DEG = 8.0  # taille des cellules au niveau 0; divisée par 2 à chaque niveau
+MAX_ZOOM = 8  # cellules de 8 / 2^8 = 0.03125° (~3.5 km)
+MAX_RASTER_CELLS = 250000  # étendue maximale (en cellules) de la grille rendue au tableau de bord
+DENSITY_BATCH_SIZE = 500000
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def cell_size(zoom: int) -> float:
+    """Taille des cellules (degrés) d'un niveau de zoom"""
+    return BASE_CELL_DEG / 2 ** zoom
+
+@dataclass
+class DensityGrid:
+    """
+    Comptages des cellules non vides d'un niveau de zoom
+    
+    Attributes:
+        zoom: Niveau de zoom
+        x: Indice de colonne des cellules (longitude)
+        y: Indice de ligne des cellules (latitude)
+        counts: Nombre d'établissements par cellule
+    """
+    zoom: int
+    x: np.ndarray
+    y: np.ndarray
+    counts: np.ndarray
+    
+    @property
+    def cell_deg(self) -> float:
+        return cell_size(self.zoom)
+    
+    def extent(self) -> int:
+        """Nombre de cellules du rectangle englobant les cellules non vides"""
+        if not len(self.counts):
+            return 0
+        return int(np.ptp(self.x) + 1) * int(np.ptp(self.y) + 1)
+    
+    def raster_cells(self) -> Tuple[np.ndarray, np.ndarray, Tuple[int, int], Tuple[float, float, float, float]]:
+        """
+        Position des cellules non vides dans la grille dense du rectangle englobant
+        
+        Returns:
+            Tuple: (lignes, colonnes, forme de la grille, étendue (lon_min, lon_max, lat_min, lat_max))
+        """
+        x0, y0 = int(self.x.min()), int(self.y.min())
+        shape = (int(self.y.max()) - y0 + 1, int(self.x.max()) - x0 + 1)
+        cell = self.cell_deg
+        extent = (-180 + x0 * cell, -180 + (x0 + shape[1]) * cell,
+                  -90 + y0 * cell, -90 + (y0 + shape[0]) * cell)
+        return self.y - y0, self.x - x0, shape, extent
+
+def bin_points(lat: np.ndarray, lon: np.ndarray, zoom: int = MAX_ZOOM) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Regroupe des points dans les cellules d'un niveau de zoom (points sans coordonnées ignorés)
+    
+    Returns:
+        Tuple: (x, y, comptages) des cellules non vides
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    n_cols = int(round(360 / cell_size(zoom)))
+    n_rows = int(round(180 / cell_size(zoom)))
+    x = np.clip(((lon[valid] + 180) / cell_size(zoom)).astype(np.int64), 0, n_cols - 1)
+    y = np.clip(((lat[valid] + 90) / cell_size(zoom)).astype(np.int64), 0, n_rows - 1)
+    keys, counts = np.unique(x * n_rows + y, return_counts=True)
+    return keys // n_rows, keys % n_rows, counts
+
+def coarsen(x: np.ndarray, y: np.ndarray, counts: np.ndarray, levels: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Agrège des cellules sur `levels` niveaux (cellules 2^levels fois plus grandes)"""
+    x, y = x >> levels, y >> levels
+    n_rows = int(y.max()) + 1 if len(y) else 1
+    keys, inverse = np.unique(x * n_rows + y, return_inverse=True)
+    return keys // n_rows, keys % n_rows, np.bincount(inverse, weights=counts).astype(np.int64)
+
+def build_density_grid(relational_paths: Dict[str, Path], output_path: Path = DENSITY_PATH,
+                       batch_size: int = DENSITY_BATCH_SIZE) -> Path:
+    """
+    Calcule les comptages de tous les niveaux de zoom en une passe sur les établissements
+    
+    Args:
+        relational_paths: Tables relationnelles (facilities)
+        output_path: Fichier .npz des comptages
+        batch_size: Nombre de lignes lues par bloc
+    
+    Returns:
+        Path: Chemin du fichier de comptages
+    """
+    logger = setup_module_logging()
+    logger.info("Calcul de la grille de densité des établissements")
+    
+    n_points = 0
+    parts = []
+    with timed_section('bin_points'):
+        for chunk in iter_batches(relational_paths['facilities'], columns=['lat', 'lon'], batch_size=batch_size):
+            n_points += len(chunk)
+            parts.append(bin_points(chunk['lat'].to_numpy(dtype=np.float64, na_value=np.nan),
+                                    chunk['lon'].to_numpy(dtype=np.float64, na_value=np.nan)))
+    record_rows(rows_in=n_points)
+    
+    # Fusion des blocs au niveau fin, puis niveaux inférieurs par agrégation
+    x = np.concatenate([part[0] for part in parts]) if parts else np.empty(0, dtype=np.int64)
+    y = np.concatenate([part[1] for part in parts]) if parts else np.empty(0, dtype=np.int64)
+    counts = np.concatenate([part[2] for part in parts]) if parts else np.empty(0, dtype=np.int64)
+    arrays = {}
+    with timed_section('coarsen'):
+        for zoom in range(MAX_ZOOM, -1, -1):
+            x, y, counts = coarsen(x, y, counts, 0 if zoom == MAX_ZOOM else 1)
+            arrays[f'x{zoom}'] = x.astype(np.int32)
+            arrays[f'y{zoom}'] = y.astype(np.int32)
+            arrays[f'counts{zoom}'] = counts.astype(np.int32)
+    
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(output_path, base_cell_deg=BASE_CELL_DEG, max_zoom=MAX_ZOOM, **arrays)
+    
+    logger.info(f"Grille de densité sauvegardée: {output_path} "
+                f"({len(arrays[f'counts{MAX_ZOOM}'])} cellules au niveau {MAX_ZOOM})")
+    record_rows(rows_out=len(arrays[f'counts{MAX_ZOOM}']))
+    
+    return output_path
+
+def load_density_grid(path: Path, zoom: int) -> DensityGrid:
+    """Relit les comptages d'un niveau de zoom"""
+    with np.load(path) as data:
+        if float(data['base_cell_deg']) != BASE_CELL_DEG or zoom > int(data['max_zoom']):
+            raise ValueError(f"Niveau {zoom} absent de la grille de densité: {path}")
+        return DensityGrid(zoom, data[f'x{zoom}'].astype(np.int64), data[f'y{zoom}'].astype(np.int64),
+                           data[f'counts{zoom}'].astype(np.int64))
+
+def select_zoom(path: Path, max_cells: int = MAX_RASTER_CELLS) -> DensityGrid:
+    """Niveau le plus fin dont la grille rendue ne dépasse pas `max_cells` cellules"""
+    for zoom in range(MAX_ZOOM, 0, -1):
+        grid = load_density_grid(path, zoom)
+        if grid.extent() <= max_cells:
+            return grid
+    return load_density_grid(path, 0)
+
+def density_spec(grid: DensityGrid, name: str = 'facility_density') -> ChartSpec:
+    """Graphique de densité déclaré sur les comptages d'un niveau de zoom, positionnés en raster"""
+    rows, cols, shape, extent = grid.raster_cells() if len(grid.counts) else ([], [], (0, 0), None)
+    return ChartSpec(
+        name=name, kind='density',
+        data={
+            'rows': np.asarray(rows).tolist(),
+            'cols': np.asarray(cols).tolist(),
+            'counts': grid.counts.tolist(),
+            'shape': list(shape),
+            'extent': list(extent) if extent else None
+        },
+        title=f'Densité des établissements (cellules de {grid.cell_deg:g}°)',
+        xlabel='Longitude',
+        ylabel='Latitude',
+        figsize=(10, 8)
+    )
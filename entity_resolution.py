@@ -0,0 +1,249 @@
+"""
+Module de résolution des entités entreprises
+
+`clean_companies` ne regroupe que les noms identiques après nettoyage: une
+même entreprise déclarée "Textiles Atlas Sarl" et "Atlas Textiles S.A.R.L."
+garde deux identifiants. Cette étape rapproche ces quasi-doublons sans
+comparer toutes les paires:
+
+1. Normalisation en ensemble de mots (accents, sigles "S.A.R.L." -> "sarl",
+   formes légales retirées, ordre ignoré)
+2. Blocage par pays et par mot: filtrage par préfixe (mots les plus rares de
+   chaque nom), complet pour un seuil de Jaccard donné
+3. Score de Jaccard des seules paires candidates
+4. Regroupement par union-find; chaque groupe reçoit l'identifiant de son
+   entreprise la plus déclarée
+
+Les pays sont traités indépendamment, en parallèle au-delà d'un seuil.
+"""
+import logging
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from artifact_store import read_table, write_table
+from clean_companies import COMPANIES_SCHEMA, DATA_DIR
+from profiling import record_rows, timed_section
+
+MATCH_THRESHOLD = 0.8  # similarité de Jaccard minimale entre ensembles de mots
+MAX_BLOCK_SIZE = 2000  # blocs plus grands ignorés (mot trop fréquent pour discriminer)
+PARALLEL_THRESHOLD = 100000  # entreprises à partir desquelles les pays sont répartis sur un pool
+
+# Formes légales et mots de liaison, ignorés pour la comparaison
+LEGAL_FORM_TOKENS = frozenset([
+    'sa', 'sas', 'sarl', 'sarlau', 'eurl', 'snc', 'sl', 'slu', 'srl', 'spa', 'lda',
+    'ae', 'ee', 'oe', 'ike', 'ltd', 'limited', 'llc', 'inc', 'corp', 'corporation',
+    'co', 'company', 'gmbh', 'ag', 'nv', 'bv', 'plc', 'group', 'groupe', 'and', 'et', 'y', 'e'
+])
+NON_ALNUM_PATTERN = re.compile(r'[^0-9a-z]+')
+INITIALS_PATTERN = re.compile(r'(?<=\b[0-9a-z]) (?=[0-9a-z]\b)')  # "s a r l" -> "sarl"
+UNKNOWN_NAME = "Unknown"
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+class UnionFind:
+    """
+    Union-find vectorisé sur les entiers 0..n-1
+    
+    Les unions sont appliquées par lots de paires: chaque racine pointe vers
+    une racine plus petite (pas de cycle), et les chemins sont compressés à
+    chaque recherche.
+    """
+    
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int64)
+    
+    def find(self, nodes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Racine de chaque nœud (de tous les nœuds si `nodes` est None)"""
+        parent = self.parent
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        self.parent = parent
+        return parent if nodes is None else parent[nodes]
+    
+    def union(self, a: Sequence[int], b: Sequence[int]):
+        """Réunit les groupes de chaque paire (a[i], b[i])"""
+        a = np.asarray(a, dtype=np.int64)
+        b = np.asarray(b, dtype=np.int64)
+        while len(a):
+            root_a, root_b = self.find(a), self.find(b)
+            differ = root_a != root_b
+            if not differ.any():
+                break
+            # Plusieurs paires peuvent viser la même racine: la plus petite cible l'emporte,
+            # les autres sont reprises au tour suivant
+            high = np.maximum(root_a[differ], root_b[differ])
+            low = np.minimum(root_a[differ], root_b[differ])
+            np.minimum.at(self.parent, high, low)
+            a, b = a[differ], b[differ]
+
+def _strip_accents(name: str) -> str:
+    if name.isascii():
+        return name
+    return ''.join(c for c in unicodedata.normalize('NFKD', name) if not unicodedata.combining(c))
+
+def name_tokens(name: str) -> Tuple[str, ...]:
+    """
+    Ensemble de mots comparable d'un nom d'entreprise (trié, sans doublon)
+    
+    Les formes légales sont retirées, sauf si le nom n'est fait que d'elles.
+    """
+    if pd.isna(name) or name == UNKNOWN_NAME:
+        return ()
+    
+    text = NON_ALNUM_PATTERN.sub(' ', _strip_accents(str(name)).lower()).strip()
+    tokens = set(INITIALS_PATTERN.sub('', text).split())
+    significant = tokens - LEGAL_FORM_TOKENS
+    return tuple(sorted(significant or tokens))
+
+def _jaccard(entities: np.ndarray, tokens: np.ndarray, starts: np.ndarray, lengths: np.ndarray,
+             a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Mots partagés comptés sans boucle: chaque mot de a est cherché dans les couples (b, mot) triés
+    n_tokens = int(tokens.max()) + 1
+    keys = np.sort(entities * n_tokens + tokens)
+    pair_index = np.repeat(np.arange(len(a)), lengths[a])
+    offsets = np.arange(len(pair_index)) - np.repeat(np.cumsum(lengths[a]) - lengths[a], lengths[a])
+    wanted = b[pair_index] * n_tokens + tokens[starts[a][pair_index] + offsets]
+    found = keys[np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)] == wanted
+    shared = np.bincount(pair_index, weights=found, minlength=len(a))
+    union = lengths[a] + lengths[b] - shared
+    return np.divide(shared, union, out=np.zeros(len(a)), where=union > 0)
+
+def jaccard_similarity(token_sets: List[Tuple[str, ...]], a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Similarité de Jaccard des paires (token_sets[a[i]], token_sets[b[i]]), 0 si les deux sont vides"""
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    lengths = np.fromiter(map(len, token_sets), dtype=np.int64, count=len(token_sets))
+    if not lengths.any():
+        return np.zeros(len(a))
+    entities = np.repeat(np.arange(len(token_sets)), lengths)
+    tokens, _ = pd.factorize(pd.Series([word for words in token_sets for word in words], dtype=object))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return _jaccard(entities, tokens, starts, lengths, a, b)
+
+def match_names(token_sets: List[Tuple[str, ...]], threshold: float = MATCH_THRESHOLD,
+                max_block_size: int = MAX_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Paires de noms d'un même pays dont la similarité de Jaccard atteint le seuil
+    
+    Filtrage par préfixe: deux ensembles de similarité >= t partagent au moins
+    un mot parmi les |x| - ceil(t.|x|) + 1 mots les plus rares de chacun, seuls
+    ces mots servent de clés de blocage.
+    
+    Args:
+        token_sets: Ensemble de mots de chaque nom (vide: nom ignoré)
+        threshold: Similarité minimale
+        max_block_size: Taille au-delà de laquelle un bloc est ignoré
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: Positions (a, b) des paires retenues,
+        et nombre de paires candidates évaluées
+    """
+    n = len(token_sets)
+    lengths = np.fromiter(map(len, token_sets), dtype=np.int64, count=n)
+    if n < 2 or not lengths.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), 0
+    
+    entities = np.repeat(np.arange(n), lengths)
+    tokens, _ = pd.factorize(pd.Series([word for words in token_sets for word in words], dtype=object))
+    frequencies = np.bincount(tokens)
+    
+    # Mots de chaque nom du plus rare au plus fréquent; préfixe selon la taille du nom
+    order = np.lexsort((tokens, frequencies[tokens], entities))
+    entities, tokens = entities[order], tokens[order]
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    ranks = np.arange(len(entities)) - starts[entities]
+    prefix_lengths = lengths - np.ceil(threshold * lengths - 1e-9).astype(np.int64) + 1
+    prefix = pd.DataFrame({'entity': entities, 'token': tokens})[ranks < prefix_lengths[entities]]
+    
+    # Blocs: noms partageant un mot de préfixe
+    block_sizes = prefix.groupby('token')['entity'].transform('size')
+    prefix = prefix[(block_sizes > 1) & (block_sizes <= max_block_size)]
+    pairs = prefix.merge(prefix, on='token', suffixes=('_a', '_b'))
+    a = pairs['entity_a'].to_numpy()
+    b = pairs['entity_b'].to_numpy()
+    keep = a < b
+    # Filtre de taille: t.|x| <= |y| <= |x|/t
+    keep &= np.minimum(lengths[a], lengths[b]) >= threshold * np.maximum(lengths[a], lengths[b]) - 1e-9
+    candidates = np.unique(a[keep] * n + b[keep])
+    a, b = candidates // n, candidates % n
+    
+    scores = _jaccard(entities, tokens, starts, lengths, a, b)
+    matched = scores >= threshold - 1e-9
+    return a[matched], b[matched], len(candidates)
+
+def _match_country(names: List[str], threshold: float) -> Tuple[np.ndarray, np.ndarray, int]:
+    return match_names([name_tokens(name) for name in names], threshold)
+
+def resolve_company_entities(cleaned_companies_path: Path, threshold: float = MATCH_THRESHOLD,
+                             n_workers: Optional[int] = None) -> Path:
+    """
+    Regroupe les entreprises quasi-doublons d'un même pays sous un identifiant canonique
+    
+    Args:
+        cleaned_companies_path: Sortie de `clean_companies`
+        threshold: Similarité de Jaccard minimale entre ensembles de mots
+        n_workers: Nombre de processus (None ou 1 pour rester dans le processus courant)
+    
+    Returns:
+        Path: Table entreprises (COMPANIES_SCHEMA) où company_id et company_name
+        sont ceux de l'entreprise canonique de chaque groupe
+    """
+    logger = setup_module_logging()
+    logger.info(f"Résolution des entités entreprises: {cleaned_companies_path}")
+    
+    companies = read_table(cleaned_companies_path, schema=COMPANIES_SCHEMA)
+    record_rows(rows_in=len(companies))
+    
+    # Une entité par identifiant unifié, pondérée par son nombre de déclarations
+    entities = companies.groupby('company_id', sort=True).agg(
+        company_name=('company_name', 'first'),
+        country=('country', 'first'),
+        weight=('company_name', 'size')
+    ).reset_index()
+    
+    with timed_section('match_names'):
+        groups = [positions for positions in entities.groupby('country', sort=True).indices.values()]
+        names = [entities['company_name'].to_numpy(dtype=object)[positions].tolist() for positions in groups]
+        if n_workers and n_workers > 1 and len(entities) >= PARALLEL_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                matches = list(executor.map(_match_country, names, repeat(threshold)))
+        else:
+            matches = [_match_country(country_names, threshold) for country_names in names]
+    
+    with timed_section('cluster'):
+        union_find = UnionFind(len(entities))
+        for positions, (a, b, _) in zip(groups, matches):
+            union_find.union(positions[a], positions[b])
+        entities['root'] = union_find.find()
+        
+        # Entité canonique: la plus déclarée du groupe, puis le plus petit identifiant
+        canonical = entities.sort_values(['weight', 'company_id'], ascending=[False, True])
+        canonical = canonical.drop_duplicates('root').set_index('root')
+        entities['canonical_id'] = canonical['company_id'].reindex(entities['root']).to_numpy()
+        entities['canonical_name'] = canonical['company_name'].reindex(entities['root']).to_numpy()
+    
+    mapping = entities.set_index('company_id')
+    resolved = companies.copy()
+    resolved['company_name'] = mapping['canonical_name'].reindex(companies['company_id']).to_numpy()
+    resolved['company_id'] = mapping['canonical_id'].reindex(companies['company_id']).to_numpy()
+    
+    output_path = write_table(resolved, DATA_DIR, "companies_resolved", COMPANIES_SCHEMA)
+    
+    n_candidates = sum(candidates for _, _, candidates in matches)
+    n_clusters = int(entities['root'].nunique())
+    logger.info(f"Paires candidates évaluées: {n_candidates}")
+    logger.info(f"Entreprises: {len(entities)} -> {n_clusters} après résolution")
+    logger.info(f"Entreprises résolues sauvegardées: {output_path}")
+    record_rows(rows_out=len(resolved))
+    
+    return output_path
@@ -1,12 +1,16 @@
 """
 Module d'export final et de génération de rapports
 """
-import pandas as pd
 import json
 import logging
 from pathlib import Path
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
+
+from artifact_store import export_csv
+from json_export import export_path, write_combined_export
+from profiling import format_metrics_report, load_latest_metrics
+from rollup_cube import load_rollup_cube, rollup
 
 FINAL_DIR = Path("data/final_export")
 
@@ -15,8 +19,29 @@ def setup_module_logging():
 
 def export_final_results(relational_paths: Dict[str, Path],
                          analytics_paths: Dict[str, Path],
-                         ai_results_path: Path) -> Path:
-    """Exporte les résultats finaux et génère un rapport"""
+                         ai_results_path: Path,
+                         cube_path: Path,
+                         ai_scores_path: Optional[Path] = None,
+                         sqlite_path: Optional[Path] = None,
+                         colocation_paths: Optional[Dict[str, Path]] = None,
+                         csv_export: bool = False,
+                         export_format: str = 'json',
+                         compress: bool = False) -> Path:
+    """
+    Exporte les résultats finaux et génère un rapport
+    
+    Args:
+        relational_paths: Tables relationnelles (artefacts colonnaires ou CSV)
+        analytics_paths: Graphiques et statistiques
+        ai_results_path: Résultats de l'analyse IA
+        cube_path: Cube de synthèse des tables relationnelles (`build_rollup_cube`)
+        ai_scores_path: Scores de durabilité des établissements (None si aucun modèle)
+        sqlite_path: Base SQLite des tables relationnelles (None si non demandée)
+        colocation_paths: Graphe de co-localisation des entreprises (paires, grappes, synthèse)
+        csv_export: Exporte aussi les tables relationnelles en CSV
+        export_format: Format du fichier combiné ('json' ou 'ndjson')
+        compress: Compresse le fichier combiné en gzip
+    """
     logger = setup_module_logging()
     logger.info("Export final des résultats")
     
@@ -24,43 +49,51 @@ def export_final_results(relational_paths: Dict[str, Path],
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     
     # 1. Export des données relationnelles
-    companies = pd.read_csv(relational_paths['companies'])
-    facilities = pd.read_csv(relational_paths['facilities'])
-    links = pd.read_csv(relational_paths['links'])
+    # Export CSV optionnel des tables relationnelles
+    csv_paths = {}
+    if csv_export:
+        for table, path in relational_paths.items():
+            csv_paths[table] = export_csv(path, FINAL_DIR / f"{Path(path).stem}_{timestamp}.csv")
     
-    # Fichier combiné
-    combined_data = {
-        'metadata': {
-            'export_date': datetime.now().isoformat(),
-            'total_companies': len(companies),
-            'total_facilities': len(facilities),
-            'total_links': len(links)
-        },
-        'companies': companies.to_dict('records'),
-        'facilities': facilities.to_dict('records'),
-        'links': links.to_dict('records')
+    # Fichier combiné, écrit par blocs (en-tête de métadonnées en première ligne)
+    tables = {
+        'companies': relational_paths['companies'],
+        'facilities': relational_paths['facilities'],
+        'links': relational_paths['links']
     }
+    cube = load_rollup_cube(cube_path)
+    metadata = {
+        'export_date': datetime.now().isoformat(),
+        'total_companies': cube['totals']['companies'],
+        'total_facilities': cube['totals']['facilities'],
+        'total_links': cube['totals']['links']
+    }
+    combined_path = export_path(FINAL_DIR, f"oar_combined_{timestamp}", export_format, compress)
+    write_combined_export(tables, metadata, combined_path, export_format)
     
-    combined_path = FINAL_DIR / f"oar_combined_{timestamp}.json"
-    with open(combined_path, 'w', encoding='utf-8') as f:
-        json.dump(combined_data, f, indent=2, ensure_ascii=False)
-    
-    # 2. Statistiques détaillées
-    facilities_per_company = links.groupby('company_id').size()
-    
+    # 2. Statistiques détaillées, lues dans le cube (sans relecture des tables)
+    distribution = cube['facilities_per_company']
     stats = {
         'summary': {
-            'total_companies': len(companies),
-            'total_facilities': len(facilities),
-            'companies_with_facilities': facilities_per_company.shape[0],
-            'avg_facilities_per_company': facilities_per_company.mean(),
-            'median_facilities_per_company': facilities_per_company.median(),
-            'max_facilities_per_company': facilities_per_company.max()
+            'total_companies': metadata['total_companies'],
+            'total_facilities': metadata['total_facilities'],
+            'companies_with_facilities': cube['totals']['companies_with_facilities'],
+            'avg_facilities_per_company': distribution['mean'],
+            'median_facilities_per_company': distribution['median'],
+            'max_facilities_per_company': distribution['max'],
+            'facilities_per_company_quantiles': distribution['quantiles']
         },
-        'companies_by_country': companies['country'].value_counts().to_dict(),
-        'facilities_by_country': facilities['country'].value_counts().to_dict(),
+        'companies_by_country': cube['companies_by_country'],
+        'facilities_by_country': {str(country): int(count)
+                                  for country, count in rollup(cube, ['country']).items()},
+        'facilities_by_sector': {str(sector): int(count)
+                                 for sector, count in rollup(cube, ['sector']).items()},
+        'closed_facilities': int(rollup(cube, ['is_closed']).get(True, 0)),
         'export_timestamp': timestamp
     }
+    if colocation_paths:
+        with open(colocation_paths['summary'], encoding='utf-8') as f:
+            stats['colocation'] = json.load(f)
     
     stats_path = FINAL_DIR / f"summary_statistics_{timestamp}.json"
     with open(stats_path, 'w', encoding='utf-8') as f:
@@ -89,16 +122,44 @@ def export_final_results(relational_paths: Dict[str, Path],
         for country, count in stats['companies_by_country'].items():
             f.write(f"{country}: {count} entreprises\n")
         
+        if 'colocation' in stats:
+            colocation = stats['colocation']
+            f.write("\nCo-localisation des entreprises\n")
+            f.write(f"Paires d'entreprises partageant un établissement: {colocation['colocated_pairs']}\n")
+            f.write(f"Grappes de fournisseurs: {colocation['clusters']} "
+                    f"(dont {colocation['singleton_clusters']} entreprises isolées)\n")
+            for company in colocation['most_connected_companies'][:5]:
+                f.write(f"{company['company_id']}: {company['colocated_companies']} entreprises co-localisées\n")
+        
         f.write("\n3. FICHIERS GÉNÉRÉS\n")
         f.write("-" * 40 + "\n")
         f.write(f"Données combinées: {combined_path.name}\n")
         f.write(f"Statistiques: {stats_path.name}\n")
         f.write(f"Analyse IA: {ai_results_path.name}\n")
+        if ai_scores_path:
+            f.write(f"Scores de durabilité: {Path(ai_scores_path).name}\n")
+        if sqlite_path:
+            f.write(f"Base SQLite: {sqlite_path}\n")
+        if colocation_paths:
+            f.write(f"Paires co-localisées: {Path(colocation_paths['pairs']).name}\n")
+            f.write(f"Grappes de fournisseurs: {Path(colocation_paths['clusters']).name}\n")
+        for table, path in csv_paths.items():
+            f.write(f"Export CSV {table}: {path.name}\n")
         
         # Ajout des chemins des graphiques
         if analytics_paths:
             f.write(f"Graphique entreprises: {analytics_paths.get('companies_chart', '').name}\n")
             f.write(f"Graphique établissements: {analytics_paths.get('facilities_chart', '').name}\n")
+            if 'density_chart' in analytics_paths:
+                f.write(f"Carte de densité: {analytics_paths['density_chart'].name}\n")
+        
+        # Métriques des étapes amont de l'exécution en cours (écrites par l'ordonnanceur)
+        run_metrics = load_latest_metrics()
+        if run_metrics:
+            f.write("\n4. PERFORMANCES DU PIPELINE\n")
+            f.write("-" * 40 + "\n")
+            for line in format_metrics_report(run_metrics):
+                f.write(line + "\n")
     
     logger.info(f"Export final terminé. Rapport: {report_path}")
     
@@ -0,0 +1,225 @@
+"""
+Serveur local imitant l'API OAR pour tester l'extraction hors ligne
+
+Sert des établissements synthétiques (voir synthetic_oar) en FeatureCollection
+GeoJSON paginées (count, next, features), avec des réponses 429 ou 5xx
+injectées sur les premières tentatives de certaines pages. `download_oar_data`
+est lancé contre ce serveur pour vérifier la pagination, les nouvelles
+tentatives avec backoff et le respect du débit maximal.
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from artifact_store import read_table
+from scrape_oar import COUNTRIES, RAW_SCHEMA, download_oar_data
+from synthetic_oar import FACILITIES_PER_COMPANY, generate_chunk, generate_companies
+
+FAULT_STATUSES = (429, 503)
+DEFAULT_PAGE_SIZE = 500
+RATE_TOLERANCE = 0.02  # secondes d'écart admises entre deux créneaux du limiteur
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def record_to_feature(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Feature GeoJSON dont `feature_to_record` redonne l'enregistrement brut"""
+    record = {key: (None if pd.isna(value) else value) for key, value in record.items()}
+    has_coordinates = record['lat'] is not None and record['lon'] is not None
+    properties = {
+        'os_id': record['id'],
+        'name': record['name'],
+        'address': record['address'],
+        'country': record['country'],
+        'is_closed': bool(record['is_closed']) if record['is_closed'] is not None else None,
+        'created_at': record['created_at'],
+        'updated_at': record['updated_at'],
+        'contributor': record['contributor'],
+        'sector': record['sector'],
+        'processing_activity': record['processing_activity'],
+        'contributors': [{'name': record['company_name'], 'id': record['company_id']}]
+    }
+    return {
+        'type': 'Feature',
+        'id': record['id'],
+        'geometry': {'type': 'Point', 'coordinates': [record['lon'], record['lat']]} if has_coordinates else None,
+        'properties': properties
+    }
+
+class StandInOAR:
+    """
+    Serveur HTTP local servant des pages GeoJSON, dans un thread de fond
+    
+    La première tentative d'une page sur `1 / fault_rate` reçoit tour à tour
+    les statuts de `fault_statuses` (avec Retry-After pour 429). Chaque
+    requête est journalisée (page, statut, instant d'arrivée).
+    
+    Args:
+        facilities: Établissements servis (colonnes de RAW_SCHEMA)
+        fault_rate: Part des pages dont la première tentative échoue
+        fault_statuses: Statuts renvoyés pour les tentatives en échec
+        retry_after: Valeur de l'en-tête Retry-After des réponses 429 (secondes)
+    """
+    
+    def __init__(self, facilities: pd.DataFrame, fault_rate: float = 0.0,
+                 fault_statuses=FAULT_STATUSES, retry_after: int = 1):
+        self.features = [record_to_feature(record) for record in facilities.to_dict('records')]
+        self.fault_every = round(1 / fault_rate) if fault_rate else 0
+        self.fault_statuses = tuple(fault_statuses)
+        self.retry_after = retry_after
+        self.requests: List[Dict[str, Any]] = []
+        self._attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/facilities"
+    
+    def _fault(self, page: int) -> Optional[int]:
+        # Statut d'erreur de cette tentative, None pour une réponse normale
+        with self._lock:
+            attempt = self._attempts.get(page, 0)
+            self._attempts[page] = attempt + 1
+        if self.fault_every and page % self.fault_every == 0 and attempt == 0:
+            return self.fault_statuses[(page // self.fault_every) % len(self.fault_statuses)]
+        return None
+    
+    def page_body(self, page: int, page_size: int) -> bytes:
+        """FeatureCollection d'une page, avec le nombre total et l'URL de la page suivante"""
+        start = (page - 1) * page_size
+        n_pages = max(1, -(-len(self.features) // page_size))
+        next_url = None
+        if page < n_pages:
+            next_url = f"{self.url}?{urlencode({'format': 'json', 'page': page + 1, 'pageSize': page_size})}"
+        body = {
+            'type': 'FeatureCollection',
+            'count': len(self.features),
+            'next': next_url,
+            'features': self.features[start:start + page_size]
+        }
+        return json.dumps(body).encode('utf-8')
+    
+    def _handler(self):
+        stand_in = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # connexions persistantes, comme le pool de la session
+            
+            def do_GET(self):
+                params = parse_qs(urlparse(self.path).query)
+                page = int(params.get('page', ['1'])[0])
+                page_size = int(params.get('pageSize', [str(DEFAULT_PAGE_SIZE)])[0])
+                status = stand_in._fault(page) or 200
+                with stand_in._lock:
+                    stand_in.requests.append({'page': page, 'status': status, 'time': time.monotonic()})
+                
+                body = stand_in.page_body(page, page_size) if status == 200 else b'{}'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if status == 429:
+                    self.send_header('Retry-After', str(stand_in.retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+def check_download(n_facilities: int = 5000, page_size: int = DEFAULT_PAGE_SIZE, fault_rate: float = 0.25,
+                   max_workers: int = 4, rate_limit: Optional[float] = 20.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Lance `download_oar_data` contre le serveur local et compare le fichier brut aux données servies
+    
+    Le téléchargement s'exécute dans un dossier temporaire (data/raw relatif).
+    
+    Returns:
+        Dict[str, Any]: Indicateurs de la vérification (pages, erreurs injectées,
+        débit observé); lève AssertionError si le fichier brut diffère
+    """
+    logger = setup_module_logging()
+    companies = generate_companies(max(n_facilities // FACILITIES_PER_COMPANY, 1), seed)
+    facilities = generate_chunk(companies, 0, n_facilities, seed)
+    expected = facilities[facilities['country'].isin(COUNTRIES)].reset_index(drop=True)
+    
+    with StandInOAR(facilities, fault_rate) as server, \
+            tempfile.TemporaryDirectory(prefix="oar_stand_in_") as workdir:
+        logger.info(f"API OAR locale: {server.url}")
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            raw_path = download_oar_data(server.url, max_workers, page_size, rate_limit)
+            wall = time.perf_counter() - start
+            raw = read_table(raw_path, schema=RAW_SCHEMA)
+        finally:
+            os.chdir(cwd)
+        requests_log = pd.DataFrame(server.requests)
+    
+    # Pages restituées dans l'ordre: même contenu, même ordre que la source filtrée
+    pd.testing.assert_frame_equal(raw, expected.astype(RAW_SCHEMA), check_exact=False)
+    
+    n_pages = max(1, -(-n_facilities // page_size))
+    served = requests_log[requests_log['status'] == 200]
+    assert sorted(served['page']) == list(range(1, n_pages + 1)), "pages manquantes ou servies deux fois"
+    faults = requests_log[requests_log['status'] != 200]
+    retried = set(faults['page']) <= set(served['page'])
+    assert retried, "page en échec sans nouvelle tentative réussie"
+    
+    # Limiteur de débit: deux requêtes jamais plus proches que 1 / rate_limit
+    gaps = requests_log['time'].sort_values().diff().dropna()
+    min_gap = float(gaps.min()) if len(gaps) else float('nan')
+    if rate_limit:
+        assert min_gap >= 1 / rate_limit - RATE_TOLERANCE, f"débit dépassé: écart minimal {min_gap:.3f}s"
+    
+    return {
+        'facilities_served': n_facilities,
+        'facilities_written': len(raw),
+        'pages': n_pages,
+        'requests': len(requests_log),
+        'faults': {str(status): int(count) for status, count in faults['status'].value_counts().items()},
+        'min_gap_s': min_gap,
+        'wall_s': wall
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Extraction OAR contre un serveur local de test")
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument('--fault-rate', type=float, default=0.25,
+                        help="Part des pages dont la première tentative reçoit un 429 ou un 503")
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--rate-limit', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    result = check_download(args.rows, args.page_size, args.fault_rate, args.max_workers,
+                            args.rate_limit, args.seed)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Module de lecture incrémentale des FeatureCollection GeoJSON
+"""
+import codecs
+import gzip
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Union
+
+READ_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+class FeatureStream:
+    """
+    Lecteur incrémental du tableau 'features' d'une FeatureCollection
+    
+    Les features sont décodées une à une depuis un flux de blocs (bytes ou
+    str) sans jamais charger le document complet. Les autres clés de premier
+    niveau (count, next...) sont conservées dans `header`.
+    """
+    
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self.header: Dict = {}
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+    
+    def _fill(self) -> bool:
+        """Lit le bloc suivant dans le tampon; False en fin de flux"""
+        if self._eof:
+            return False
+        
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._decoder.decode(b'', final=True)
+        elif isinstance(chunk, bytes):
+            text = self._decoder.decode(chunk)
+        else:
+            text = chunk
+        
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+    
+    def _peek(self) -> str:
+        """Retourne le prochain caractère significatif sans le consommer"""
+        while True:
+            self._pos = WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError("Fin de flux GeoJSON inattendue")
+    
+    def _expect(self, char: str):
+        found = self._peek()
+        if found != char:
+            raise ValueError(f"GeoJSON invalide: '{char}' attendu, '{found}' trouvé")
+        self._pos += 1
+    
+    def _value(self):
+        """Décode la valeur JSON suivante, en lisant davantage si elle est incomplète"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Un nombre en fin de tampon peut être tronqué
+            if (isinstance(value, (int, float)) and not self._eof
+                    and NUMBER_TAIL.fullmatch(self._buffer, end)):
+                self._fill()
+                continue
+            self._pos = end
+            return value
+    
+    def __iter__(self) -> Iterator[Dict]:
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        
+        while True:
+            key = self._value()
+            self._expect(':')
+            
+            if key == 'features':
+                self._expect('[')
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._peek() == ']':
+                            self._pos += 1
+                            break
+                        self._expect(',')
+            else:
+                self.header[key] = self._value()
+            
+            if self._peek() == '}':
+                self._pos += 1
+                return
+            self._expect(',')
+
+def iter_file_chunks(path: Path, read_size: int = READ_SIZE) -> Iterator[bytes]:
+    """Lit un fichier GeoJSON (éventuellement .gz) par blocs"""
+    opener = gzip.open if Path(path).suffix == '.gz' else open
+    with opener(path, 'rb') as f:
+        while True:
+            chunk = f.read(read_size)
+            if not chunk:
+                return
+            yield chunk
+
+def stream_features(path: Path) -> FeatureStream:
+    """Ouvre un flux de features sur un fichier GeoJSON sauvegardé"""
+    return FeatureStream(iter_file_chunks(path))
@@ -0,0 +1,92 @@
+"""
+Module de génération d'identifiants déterministes par lot
+"""
+import hashlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Optional, Sequence, Tuple
+
+PARALLEL_THRESHOLD = 200000  # clés distinctes à partir desquelles le pool est utilisé
+HASH_CHUNK_SIZE = 50000
+
+def factorize_rows(*columns: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Identifie les combinaisons distinctes de plusieurs colonnes
+    
+    Les colonnes flottantes sont comparées sur leur représentation binaire,
+    pour que 0.0 et -0.0 (formatés différemment) restent distincts.
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Position de la première occurrence de
+        chaque combinaison, et code de combinaison de chaque ligne
+    """
+    n_rows = len(columns[0])
+    keys = np.zeros(n_rows, dtype=np.int64)
+    
+    for column in columns:
+        values = np.asarray(column)
+        if values.dtype == np.float64:
+            values = values.view(np.int64)
+        codes, uniques = pd.factorize(values)
+        keys = pd.factorize(keys * (len(uniques) + 1) + (codes + 1))[0]
+    
+    _, first_positions = np.unique(keys, return_index=True)
+    return first_positions, keys
+
+def hash_keys(keys: List[str], prefix: str) -> List[str]:
+    """Hash MD5 tronqué à 12 caractères, préfixé (ex: COMP_, FAC_)"""
+    md5 = hashlib.md5
+    return [f"{prefix}{md5(key.encode('utf-8')).hexdigest()[:12]}" for key in keys]
+
+def hash_keys_batch(keys: List[str], prefix: str, n_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Hash un lot de clés, réparti sur un pool de processus pour les grands lots
+    
+    Args:
+        keys: Clés distinctes à hasher
+        prefix: Préfixe des identifiants
+        n_workers: Nombre de processus (None ou 1 pour rester dans le processus courant)
+    """
+    if n_workers and n_workers > 1 and len(keys) >= PARALLEL_THRESHOLD:
+        chunks = [keys[i:i + HASH_CHUNK_SIZE] for i in range(0, len(keys), HASH_CHUNK_SIZE)]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            ids = [i for part in executor.map(hash_keys, chunks, repeat(prefix)) for i in part]
+    else:
+        ids = hash_keys(keys, prefix)
+    
+    return np.array(ids, dtype=object)
+
+class SeenKeys:
+    """
+    Ensemble compact des clés déjà rencontrées, pour un traitement par blocs
+    
+    Les clés sont conservées sous forme d'empreintes 64 bits triées (8 octets
+    par clé); une collision d'empreintes, de probabilité négligeable (~n²/2^65),
+    ferait considérer une clé nouvelle comme déjà vue.
+    """
+    
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+    
+    def __len__(self) -> int:
+        return len(self._hashes)
+    
+    def add(self, keys: pd.Series) -> np.ndarray:
+        """
+        Enregistre un bloc de clés
+        
+        Returns:
+            np.ndarray: Masque des premières occurrences des clés jamais vues
+            (même sémantique que drop_duplicates sur la concaténation des blocs,
+            valeurs manquantes comprises)
+        """
+        hashes = pd.util.hash_array(np.asarray(keys, dtype=object))
+        new = ~pd.Series(hashes).duplicated().to_numpy()
+        if len(self._hashes):
+            positions = np.minimum(np.searchsorted(self._hashes, hashes), len(self._hashes) - 1)
+            new &= self._hashes[positions] != hashes
+        # Fusion de deux suites triées: tri stable (timsort) en temps linéaire
+        self._hashes = np.sort(np.concatenate([self._hashes, np.sort(hashes[new])]), kind='stable')
+        return new
@@ -0,0 +1,92 @@
+"""
+Module d'export JSON / NDJSON en flux des tables relationnelles
+
+Les tables sont relues par blocs et écrites au fur et à mesure: la mémoire
+utilisée dépend de la taille des blocs, pas du nombre de lignes. L'en-tête
+de métadonnées est écrit en premier, sur une seule ligne, et peut être relu
+sans charger le corps (`read_export_metadata`).
+
+Formats:
+    json: {"metadata": {...},
+           "companies": [...], "facilities": [...], "links": [...]}
+    ndjson: une ligne {"metadata": {...}} puis un enregistrement par ligne,
+            avec le nom de sa table dans le champ "_table"
+"""
+import gzip
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, TextIO
+
+from artifact_store import iter_batches
+
+EXPORT_FORMATS = ('json', 'ndjson')
+EXPORT_CHUNK_SIZE = 100000
+TABLE_FIELD = '_table'
+DOUBLE_PRECISION = 15  # to_json arrondit à 10 décimales par défaut
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def export_path(directory: Path, stem: str, fmt: str = 'json', compress: bool = False) -> Path:
+    """Chemin du fichier combiné pour un format (et une compression) donné"""
+    return Path(directory) / f"{stem}.{fmt}{'.gz' if compress else ''}"
+
+def _open_text(path: Path, mode: str) -> TextIO:
+    if Path(path).suffix == '.gz':
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _records(chunk) -> str:
+    # Un enregistrement par ligne; les sauts de ligne dans les valeurs sont échappés par to_json
+    return chunk.to_json(orient='records', lines=True, force_ascii=False,
+                         double_precision=DOUBLE_PRECISION).rstrip('\n')
+
+def write_combined_export(tables: Dict[str, Path], metadata: Dict[str, Any], output_path: Path,
+                          fmt: str = 'json', chunk_size: int = EXPORT_CHUNK_SIZE) -> Path:
+    """
+    Écrit les tables et leurs métadonnées dans un fichier combiné, bloc par bloc
+    
+    Args:
+        tables: Nom de la table dans l'export -> artefact relationnel
+        metadata: En-tête du fichier (valeurs sérialisables en JSON)
+        output_path: Fichier de sortie (compressé en gzip si l'extension est .gz)
+        fmt: 'json' (document unique) ou 'ndjson' (un enregistrement par ligne)
+        chunk_size: Nombre de lignes lues et écrites par bloc
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Format d'export inconnu: {fmt}")
+    
+    header = json.dumps(metadata, ensure_ascii=False)
+    with _open_text(output_path, 'w') as f:
+        if fmt == 'ndjson':
+            f.write(f'{{"metadata": {header}}}\n')
+            for table, path in tables.items():
+                for chunk in iter_batches(path, batch_size=chunk_size):
+                    if len(chunk):
+                        chunk.insert(0, TABLE_FIELD, table)
+                        f.write(_records(chunk) + '\n')
+            return output_path
+        
+        f.write(f'{{"metadata": {header},\n')
+        for i, (table, path) in enumerate(tables.items()):
+            f.write(f'"{table}": [')
+            first = True
+            for chunk in iter_batches(path, batch_size=chunk_size):
+                if not len(chunk):
+                    continue
+                f.write(('\n' if first else ',\n') + _records(chunk).replace('\n', ',\n'))
+                first = False
+            f.write('\n]' + (',\n' if i < len(tables) - 1 else '\n'))
+        f.write('}\n')
+    
+    return output_path
+
+def read_export_metadata(path: Path) -> Dict[str, Any]:
+    """Lit l'en-tête de métadonnées d'un export sans en charger le corps"""
+    with _open_text(path, 'r') as f:
+        first_line = f.readline().rstrip('\n')
+    # Format json: la première ligne se termine par la virgule qui précède la première table
+    if first_line.endswith(','):
+        first_line = first_line[:-1] + '}'
+    return json.loads(first_line)['metadata']
@@ -1,19 +1,34 @@
 """
 Main orchestration script for OAR Data Pipeline
 """
+import argparse
 import logging
+import os
 import sys
 from datetime import datetime
 from pathlib import Path
+from typing import List
 
 # Import des modules du pipeline
+from artifact_store import DEFAULT_FORMAT, FORMAT_ENV, FORMAT_EXTENSIONS, set_format
 from scrape_oar import download_oar_data
+from sync_oar import sync_oar_data
 from clean_companies import clean_companies
+from entity_resolution import resolve_company_entities
 from clean_facilities import process_facilities
 from relational_builder import build_relational_tables
+from spatial_index import deduplicate_facilities
+from rollup_cube import build_rollup_cube
+from density_map import build_density_grid
+from colocation_graph import build_colocation_graph
 from analytics_dashboards import generate_analytics
+from chart_engine import CHART_FORMATS, DEFAULT_DPI
 from ai_module import run_ai_analysis
+from ai_scoring import MODEL_PATH, score_facilities
 from export_final import export_final_results
+from sqlite_export import export_sqlite
+from scheduler import Stage, descendants, run_pipeline
+from stage_cache import StageCache
 
 # Configuration du logging
 def setup_logging():
@@ -34,49 +49,218 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+def parse_args():
+    """Analyse les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Pipeline de données OAR")
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Synchronise uniquement les établissements modifiés depuis la dernière exécution"
+    )
+    parser.add_argument(
+        '--artifact-format', choices=sorted(FORMAT_EXTENSIONS), default=None,
+        help=f"Format des tables intermédiaires (data/raw, data/cleaned, data/relational); "
+             f"par défaut ${FORMAT_ENV}, sinon {DEFAULT_FORMAT}"
+    )
+    parser.add_argument(
+        '--csv-export', action='store_true',
+        help="Exporte aussi les tables relationnelles en CSV dans l'export final"
+    )
+    parser.add_argument(
+        '--export-format', choices=['json', 'ndjson'], default='json',
+        help="Format du fichier combiné de l'export final (ndjson: un enregistrement par ligne)"
+    )
+    parser.add_argument(
+        '--gzip-export', action='store_true',
+        help="Compresse le fichier combiné de l'export final en gzip"
+    )
+    parser.add_argument(
+        '--sqlite-export', action='store_true',
+        help="Charge aussi les tables relationnelles dans une base SQLite indexée (mise à jour par upsert)"
+    )
+    parser.add_argument(
+        '--chart-format', choices=list(CHART_FORMATS), default='png',
+        help="Format des graphiques des tableaux de bord"
+    )
+    parser.add_argument(
+        '--chart-dpi', type=int, default=DEFAULT_DPI,
+        help="Résolution des graphiques PNG des tableaux de bord"
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=None, metavar='LIGNES',
+        help="Traite le nettoyage, les établissements et les tables relationnelles par blocs de LIGNES "
+             "lignes (mémoire bornée, résultat identique)"
+    )
+    parser.add_argument(
+        '--max-workers', type=int, default=min(4, os.cpu_count() or 1),
+        help="Nombre maximal d'étapes exécutées en parallèle, et de processus des étapes partitionnées "
+             "par pays (1: séquentiel)"
+    )
+    parser.add_argument(
+        '--force', action='append', default=[], metavar='ETAPE',
+        help="Réexécute l'étape même si sa sortie en cache est à jour (option répétable)"
+    )
+    parser.add_argument(
+        '--from', dest='from_stage', metavar='ETAPE',
+        help="Réexécute l'étape et toutes les étapes qui en dépendent"
+    )
+    parser.add_argument(
+        '--trace-memory', action='store_true',
+        help="Mesure le pic d'allocation de chaque étape avec tracemalloc (plus lent)"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="Exécute toutes les étapes sans consulter ni mettre à jour le manifeste"
+    )
+    return parser.parse_args()
+
+def build_stages(args) -> List[Stage]:
+    """Déclare les étapes du pipeline et leurs dépendances"""
+    final_inputs = {
+        'relational_paths': 'relational',
+        'analytics_paths': 'analytics',
+        'cube_path': 'rollup',
+        'colocation_paths': 'colocation',
+        'ai_results_path': 'ai_results',
+        'ai_scores_path': 'ai_scores'
+    }
+    if args.sqlite_export:
+        final_inputs['sqlite_path'] = 'sqlite'
+    
+    stages = [
+        # Phase 1: Extraction des données
+        # Le téléchargement complet est repris du cache le même jour; la
+        # synchronisation incrémentale est toujours exécutée (son coût suit
+        # le volume de modifications, et un store inchangé laisse l'aval en cache)
+        Stage(
+            'raw_data', sync_oar_data if args.incremental else download_oar_data,
+            label="Phase 1: Extraction des données",
+            cache=not args.incremental,
+            cache_key=datetime.now().strftime('%Y%m%d')
+        ),
+        # Phase 2: Nettoyage des entreprises
+        Stage(
+            'cleaned_companies', clean_companies,
+            inputs={'input_path': 'raw_data'},
+            params={'chunk_size': args.chunk_size, 'n_workers': args.max_workers},
+            label="Phase 2: Nettoyage des entreprises"
+        ),
+        # Regroupement des quasi-doublons (blocage par pays, parallélisé par pays)
+        Stage(
+            'resolved_companies', resolve_company_entities,
+            inputs={'cleaned_companies_path': 'cleaned_companies'},
+            params={'n_workers': args.max_workers},
+            label="Phase 2b: Résolution des entités entreprises"
+        ),
+        # Phase 3: Traitement des établissements
+        Stage(
+            'facilities', process_facilities,
+            inputs={'cleaned_companies_path': 'resolved_companies', 'raw_data_path': 'raw_data'},
+            params={'chunk_size': args.chunk_size, 'n_workers': args.max_workers},
+            label="Phase 3: Traitement des établissements"
+        ),
+        # Fusion des sites déclarés plusieurs fois (coordonnées proches, noms similaires)
+        Stage(
+            'deduplicated_facilities', deduplicate_facilities,
+            inputs={
+                'companies_path': 'facilities.companies',
+                'facilities_path': 'facilities.facilities',
+                'links_path': 'facilities.links'
+            },
+            label="Phase 3b: Dédoublonnage spatial des établissements"
+        ),
+        # Phase 4: Structuration relationnelle
+        Stage(
+            'relational', build_relational_tables,
+            inputs={
+                'companies_path': 'deduplicated_facilities.companies',
+                'facilities_path': 'deduplicated_facilities.facilities',
+                'links_path': 'deduplicated_facilities.links'
+            },
+            params={'chunk_size': args.chunk_size},
+            label="Phase 4: Structuration relationnelle"
+        ),
+        # Cube de synthèse: une passe sur les tables relationnelles, partagée par les phases 5 et 7
+        Stage(
+            'rollup', build_rollup_cube,
+            inputs={'relational_paths': 'relational'},
+            label="Phase 4b: Cube de synthèse"
+        ),
+        # Grille de densité des établissements (comptages de tous les niveaux de zoom)
+        Stage(
+            'density', build_density_grid,
+            inputs={'relational_paths': 'relational'},
+            label="Phase 4c: Grille de densité des établissements"
+        ),
+        # Graphe de co-localisation des entreprises (matrice d'incidence creuse des liens)
+        Stage(
+            'colocation', build_colocation_graph,
+            inputs={'relational_paths': 'relational'},
+            label="Phase 5b: Graphe de co-localisation des entreprises"
+        ),
+        # Phases 5 et 6: indépendantes, exécutées en parallèle
+        Stage(
+            'analytics', generate_analytics,
+            inputs={'cube_path': 'rollup', 'density_path': 'density'},
+            params={'chart_format': args.chart_format, 'dpi': args.chart_dpi, 'n_workers': args.max_workers},
+            label="Phase 5: Génération des tableaux de bord"
+        ),
+        Stage(
+            'ai_results', run_ai_analysis,
+            inputs={'companies_path': 'relational.companies'},
+            label="Phase 6: Analyse IA"
+        ),
+        # Score des établissements (ignoré tant qu'aucun modèle n'est entraîné);
+        # le modèle est un paramètre fichier: son contenu entre dans l'empreinte de l'étape
+        Stage(
+            'ai_scores', score_facilities,
+            inputs={'relational_paths': 'relational'},
+            params={'model_path': MODEL_PATH},
+            label="Phase 6b: Score de durabilité des établissements"
+        ),
+        # Phase 7: Export final
+        Stage(
+            'final_report', export_final_results,
+            inputs=final_inputs,
+            params={
+                'csv_export': args.csv_export,
+                'export_format': args.export_format,
+                'compress': args.gzip_export
+            },
+            label="Phase 7: Export final"
+        ),
+    ]
+    if args.sqlite_export:
+        # Phase 7a: base SQLite, en parallèle des phases 5 et 6
+        stages.insert(-1, Stage(
+            'sqlite', export_sqlite,
+            inputs={'relational_paths': 'relational'},
+            label="Phase 7a: Export SQLite"
+        ))
+    return stages
+
 def main():
     """Exécute le pipeline complet"""
+    args = parse_args()
     logger = setup_logging()
+    if args.artifact_format:
+        set_format(args.artifact_format)
     logger.info("Démarrage du pipeline OAR")
     
     try:
-        # Phase 1: Extraction des données
-        logger.info("Phase 1: Extraction des données")
-        raw_data_path = download_oar_data()
-        
-        # Phase 2: Nettoyage des entreprises
-        logger.info("Phase 2: Nettoyage des entreprises")
-        cleaned_companies_path = clean_companies(raw_data_path)
+        stages = build_stages(args)
+        force = set(args.force)
+        if args.from_stage:
+            force |= descendants(stages, args.from_stage)
         
-        # Phase 3: Traitement des établissements
-        logger.info("Phase 3: Traitement des établissements")
-        facilities_paths = process_facilities(cleaned_companies_path)
-        
-        # Phase 4: Structuration relationnelle
-        logger.info("Phase 4: Structuration relationnelle")
-        relational_paths = build_relational_tables(
-            facilities_paths['companies'],
-            facilities_paths['facilities'],
-            facilities_paths['links']
-        )
-        
-        # Phase 5: Analytics
-        logger.info("Phase 5: Génération des tableaux de bord")
-        analytics_paths = generate_analytics(relational_paths)
-        
-        # Phase 6: Module AI
-        logger.info("Phase 6: Analyse IA")
-        ai_results_path = run_ai_analysis(relational_paths['companies'])
-        
-        # Phase 7: Export final
-        logger.info("Phase 7: Export final")
-        final_report_path = export_final_results(
-            relational_paths,
-            analytics_paths,
-            ai_results_path
+        results = run_pipeline(
+            stages,
+            max_workers=args.max_workers,
+            cache=None if args.no_cache else StageCache(),
+            force=force,
+            trace_memory=args.trace_memory
         )
         
-        logger.info(f"Pipeline terminé avec succès. Rapport: {final_report_path}")
+        logger.info(f"Pipeline terminé avec succès. Rapport: {results['final_report']}")
         
     except Exception as e:
         logger.error(f"Erreur dans le pipeline: {str(e)}", exc_info=True)
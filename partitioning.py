@@ -0,0 +1,107 @@
+"""
+Module d'exécution partitionnée sur un pool de processus
+
+Les lignes d'une table sont réparties par clé de partition (pays normalisé),
+chaque partition est transmise aux processus par fichier Feather plutôt que
+par sérialisation du DataFrame, et les résultats sont réassemblés dans l'ordre
+des lignes d'origine: la sortie est identique à un traitement séquentiel.
+"""
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+PARALLEL_THRESHOLD = 100000  # lignes à partir desquelles les partitions sont réparties sur un pool
+ROW_COLUMN = '__row__'  # position d'origine de chaque ligne, conservée à travers les fichiers
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def partition_positions(keys: pd.Series, n_parts: int) -> List[np.ndarray]:
+    """
+    Regroupe les positions des lignes par valeur de clé
+    
+    Une partition plus grande que len(keys) / n_parts est découpée en tranches
+    contiguës, pour qu'un pays dominant n'occupe pas un seul processus.
+    
+    Returns:
+        List[np.ndarray]: Positions croissantes de chaque tâche, plus grandes tâches en tête
+    """
+    codes, _ = pd.factorize(keys, use_na_sentinel=False)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.flatnonzero(np.diff(codes[order])) + 1
+    max_rows = max(-(-len(keys) // max(n_parts, 1)), 1)
+    
+    tasks = []
+    for positions in np.split(order, bounds):
+        n_slices = -(-len(positions) // max_rows)
+        tasks.extend(np.array_split(positions, n_slices))
+    return sorted(tasks, key=len, reverse=True)
+
+def _run_partition(func: Callable, input_path: Path, output_dir: Path, task: int,
+                   kwargs: dict) -> List[Path]:
+    # Exécuté dans un processus du pool: lecture, traitement et écriture de la partition
+    df = pd.read_feather(input_path).set_index(ROW_COLUMN)
+    df.index.name = None
+    results = func(df, **kwargs)
+    if isinstance(results, pd.DataFrame):
+        results = (results,)
+    
+    paths = []
+    for i, result in enumerate(results):
+        path = output_dir / f"result_{task}_{i}.feather"
+        result.rename_axis(ROW_COLUMN).reset_index().to_feather(path)
+        paths.append(path)
+    return paths
+
+def map_partitions(df: pd.DataFrame, keys: pd.Series, func: Callable, n_workers: int,
+                   **kwargs) -> Tuple[pd.DataFrame, ...]:
+    """
+    Applique `func` à chaque partition de `df` dans un pool de processus
+    
+    `func` (fonction de module, pour être importable par les processus) reçoit
+    une partition et renvoie un DataFrame ou un tuple de DataFrames qui
+    conservent l'index des lignes reçues. Les résultats de toutes les
+    partitions sont concaténés dans l'ordre des lignes de `df`.
+    
+    Args:
+        df: Table à traiter
+        keys: Clé de partition de chaque ligne (alignée sur df)
+        func: Traitement d'une partition, indépendant des autres lignes
+        n_workers: Nombre de processus
+        **kwargs: Arguments supplémentaires de `func`
+    
+    Returns:
+        Tuple[pd.DataFrame, ...]: Un DataFrame par sortie de `func`, indexé par position dans df
+    """
+    logger = setup_module_logging()
+    tasks = partition_positions(keys, n_workers)
+    logger.info(f"{len(df)} lignes réparties en {len(tasks)} partitions sur {n_workers} processus")
+    
+    with tempfile.TemporaryDirectory(prefix="oar_partitions_") as tmp:
+        tmp = Path(tmp)
+        inputs = []
+        for task, positions in enumerate(tasks):
+            path = tmp / f"input_{task}.feather"
+            partition = df.iloc[positions].reset_index(drop=True)
+            partition.insert(0, ROW_COLUMN, positions)
+            partition.to_feather(path)
+            inputs.append(path)
+        
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_run_partition, func, path, tmp, task, kwargs)
+                       for task, path in enumerate(inputs)]
+            outputs = [future.result() for future in futures]
+        
+        # Réassemblage déterministe: ordre des lignes d'origine, quel que soit l'ordre d'achèvement
+        merged = []
+        for paths in zip(*outputs):
+            result = pd.concat([pd.read_feather(path) for path in paths], ignore_index=True)
+            result = result.sort_values(ROW_COLUMN, kind='stable').set_index(ROW_COLUMN)
+            result.index.name = None
+            merged.append(result)
+    
+    return tuple(merged)
@@ -0,0 +1,206 @@
+"""
+Module de mesure des performances des étapes du pipeline
+
+Chaque étape est exécutée sous un collecteur qui mesure la durée réelle, le
+temps CPU (y compris celui des pools de processus lancés par l'étape), la
+mémoire (pic tracemalloc optionnel, pic RSS de l'étape), les lignes en entrée
+et en sortie, et les sections critiques nommées via `timed_section`.
+
+Le pic RSS de l'étape est obtenu sous Linux en remettant à zéro le pic du
+processus (/proc/self/clear_refs) avant l'étape puis en lisant VmHWM après.
+Ailleurs, seul le RSS maximal depuis le début du processus est disponible:
+il est enregistré sous `process_peak_rss_mb` et n'est pas attribué à l'étape.
+Les métriques d'une exécution sont écrites en JSON dans data/metrics.
+"""
+import json
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+METRICS_DIR = Path("data/metrics")
+LATEST_METRICS = "latest.json"
+
+# Pic RSS par étape (Linux): "5" dans clear_refs remet VmHWM au RSS courant
+CLEAR_REFS_PATH = Path("/proc/self/clear_refs")
+STATUS_PATH = Path("/proc/self/status")
+RESET_PEAK_RSS = "5"
+
+# Collecteur de l'étape en cours dans ce processus (None hors étape)
+_current: Optional[Dict[str, Any]] = None
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def _process_peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux, en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _reset_peak_rss() -> bool:
+    """Remet le pic RSS du processus (VmHWM) au RSS courant; False si non supporté"""
+    try:
+        with open(CLEAR_REFS_PATH, 'w') as f:
+            f.write(RESET_PEAK_RSS)
+        return True
+    except OSError:
+        return False
+
+def _peak_rss_mb() -> Optional[float]:
+    """Pic RSS (VmHWM) depuis la dernière remise à zéro, None si illisible"""
+    try:
+        with open(STATUS_PATH, 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _cpu_times() -> Tuple[float, float]:
+    times = os.times()
+    return times.user + times.system, times.children_user + times.children_system
+
+def record_rows(rows_in: Optional[int] = None, rows_out: Optional[int] = None):
+    """Comptabilise les lignes lues et produites par l'étape en cours"""
+    if _current is None:
+        return
+    if rows_in is not None:
+        _current['rows_in'] = _current.get('rows_in', 0) + int(rows_in)
+    if rows_out is not None:
+        _current['rows_out'] = _current.get('rows_out', 0) + int(rows_out)
+
+@contextmanager
+def timed_section(name: str):
+    """Mesure une section nommée de l'étape en cours (cumulée si répétée)"""
+    if _current is None:
+        yield
+        return
+    
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield
+    finally:
+        section = _current['sections'].setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+        section['wall_s'] += time.perf_counter() - started
+        section['cpu_s'] += time.process_time() - cpu_started
+        section['calls'] += 1
+
+def profile_call(func: Callable, kwargs: Dict[str, Any],
+                 trace_memory: bool = False) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Exécute une étape sous le collecteur de métriques
+    
+    Args:
+        func: Fonction de l'étape
+        kwargs: Arguments de l'étape
+        trace_memory: Mesure le pic d'allocation Python avec tracemalloc
+            (précis mais ralentit l'étape)
+    
+    Returns:
+        Tuple[Any, Dict[str, Any]]: Sortie de l'étape et ses métriques
+    """
+    global _current
+    _current = {'sections': {}}
+    
+    if trace_memory:
+        tracemalloc.start()
+    stage_peak = _reset_peak_rss()
+    cpu_self, cpu_children = _cpu_times()
+    started = time.perf_counter()
+    
+    try:
+        result = func(**kwargs)
+        
+        wall = time.perf_counter() - started
+        cpu_self_end, cpu_children_end = _cpu_times()
+        metrics = _current
+        metrics['wall_s'] = wall
+        metrics['cpu_s'] = cpu_self_end - cpu_self
+        metrics['cpu_children_s'] = cpu_children_end - cpu_children
+        peak_rss = _peak_rss_mb() if stage_peak else None
+        if peak_rss is not None:
+            metrics['peak_rss_mb'] = peak_rss
+        else:
+            metrics['process_peak_rss_mb'] = _process_peak_rss_mb()
+        if trace_memory:
+            metrics['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        
+        rows = metrics.get('rows_out', metrics.get('rows_in'))
+        if rows is not None and wall > 0:
+            metrics['rows_per_s'] = rows / wall
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+        _current = None
+    
+    return result, metrics
+
+def write_run_metrics(run_metrics: Dict[str, Any], directory: Path = METRICS_DIR) -> Path:
+    """
+    Écrit les métriques d'une exécution (fichier horodaté et latest.json)
+    
+    Returns:
+        Path: Chemin du fichier horodaté
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"run_{run_metrics['run_id']}.json"
+    
+    for target in (path, directory / LATEST_METRICS):
+        tmp_path = target.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(run_metrics, f, indent=2)
+        tmp_path.replace(target)
+    
+    return path
+
+def new_run_metrics(max_workers: int) -> Dict[str, Any]:
+    """Métriques vides d'une nouvelle exécution"""
+    return {
+        'run_id': datetime.now().strftime("%Y%m%d_%H%M%S"),
+        'started_at': datetime.now().isoformat(),
+        'max_workers': max_workers,
+        'stages': {}
+    }
+
+def load_latest_metrics(directory: Path = METRICS_DIR) -> Optional[Dict[str, Any]]:
+    """Métriques de la dernière exécution, ou None"""
+    path = directory / LATEST_METRICS
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def format_metrics_report(run_metrics: Dict[str, Any]) -> List[str]:
+    """Lignes du rapport texte résumant les métriques par étape"""
+    lines = [f"Exécution: {run_metrics['run_id']} ({run_metrics['max_workers']} étapes en parallèle max.)"]
+    
+    for name, stage in run_metrics['stages'].items():
+        if stage.get('cached'):
+            lines.append(f"{name}: repris du cache")
+            continue
+        
+        line = f"{name}: {stage['wall_s']:.2f}s, CPU {stage['cpu_s'] + stage['cpu_children_s']:.2f}s"
+        if 'peak_rss_mb' in stage:
+            line += f", RSS max {stage['peak_rss_mb']:.0f} Mo"
+        if 'tracemalloc_peak_mb' in stage:
+            line += f", pic Python {stage['tracemalloc_peak_mb']:.0f} Mo"
+        if 'rows_in' in stage or 'rows_out' in stage:
+            line += f", lignes {stage.get('rows_in', '-')} -> {stage.get('rows_out', '-')}"
+        if 'rows_per_s' in stage:
+            line += f" ({stage['rows_per_s']:.0f} lignes/s)"
+        lines.append(line)
+        
+        for section, timing in stage['sections'].items():
+            lines.append(f"    {section}: {timing['wall_s']:.2f}s ({timing['calls']} appel(s))")
+    
+    if 'wall_s' in run_metrics:
+        lines.append(f"Durée totale: {run_metrics['wall_s']:.2f}s")
+    return lines
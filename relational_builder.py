@@ -1,101 +1,234 @@
 """
 Module de construction des tables relationnelles
 """
+import numpy as np
 import pandas as pd
 import logging
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
+
+from artifact_store import TableWriter, iter_batches, read_table, write_table
+from clean_companies import COMPANIES_SCHEMA
+from clean_facilities import FACILITIES_SCHEMA, LINKS_SCHEMA
+from profiling import record_rows, timed_section
 
 RELATIONAL_DIR = Path("data/relational")
+INTEGRITY_SAMPLE_SIZE = 5
+
+COMPANIES_RELATIONAL_SCHEMA = {
+    'company_id': 'string',
+    'company_name': 'string',
+    'country': 'string'
+}
+FACILITIES_RELATIONAL_SCHEMA = {
+    'facility_id': 'string',
+    'facility_name': 'string',
+    'lat': 'float64',
+    'lon': 'float64',
+    'country': 'string',
+    'is_closed': 'boolean',
+    'sector': 'string',
+    'processing_activity': 'string',
+    'contributor': 'string'
+}
 
 def setup_module_logging():
     return logging.getLogger(__name__)
 
+@dataclass
+class IntegrityViolation:
+    """
+    Violation d'une règle d'intégrité
+    
+    Attributes:
+        rule: Identifiant de la règle
+        message: Description journalisée
+        count: Nombre de lignes (ou d'identifiants) en défaut
+        sample: Premiers identifiants en défaut, au plus INTEGRITY_SAMPLE_SIZE
+    """
+    rule: str
+    message: str
+    count: int
+    sample: List[str] = field(default_factory=list)
+
+@dataclass
+class IntegrityReport:
+    """
+    Résultat de la validation relationnelle
+    
+    Attributes:
+        violations: Une entrée par règle en défaut
+        valid_links: Masque des liens dont les deux IDs existent (None avant validation)
+    """
+    violations: List[IntegrityViolation] = field(default_factory=list)
+    valid_links: Optional[np.ndarray] = field(default=None, repr=False)
+    
+    @property
+    def valid(self) -> bool:
+        return not self.violations
+    
+    def check(self, rule: str, message: str, failing: pd.Series, sample_size: int = INTEGRITY_SAMPLE_SIZE):
+        """Ajoute une violation si `failing` (valeurs en défaut) n'est pas vide"""
+        if len(failing):
+            sample = [str(value) for value in failing.drop_duplicates().head(sample_size)]
+            self.violations.append(IntegrityViolation(rule, message, int(len(failing)), sample))
+    
+    def counts(self) -> Dict[str, int]:
+        return {violation.rule: violation.count for violation in self.violations}
+    
+    def log(self, logger: logging.Logger):
+        # Une ligne par règle, quel que soit le nombre de violations
+        for violation in self.violations:
+            logger.error(f"{violation.message}: {violation.count} (ex: {', '.join(violation.sample)})")
+
+def _shared_codes(entity_ids: pd.Series, link_ids: pd.Series) -> Tuple[np.ndarray, np.ndarray, int]:
+    # Codes entiers d'une factorisation commune (-1 pour les valeurs manquantes):
+    # les anti-jointures deviennent des lectures de tableaux booléens
+    codes, uniques = pd.factorize(pd.concat([entity_ids, link_ids], ignore_index=True))
+    return codes[:len(entity_ids)], codes[len(entity_ids):], len(uniques)
+
+def _present(codes: np.ndarray, n_codes: int) -> np.ndarray:
+    # present[code] vrai si le code apparaît; case supplémentaire (fausse) pour le code -1
+    present = np.zeros(n_codes + 1, dtype=bool)
+    present[codes[codes >= 0]] = True
+    return present
+
 def validate_relational_integrity(companies: pd.DataFrame, 
                                   facilities: pd.DataFrame, 
-                                  links: pd.DataFrame) -> bool:
-    """Valide l'intégrité relationnelle des données"""
+                                  links: pd.DataFrame,
+                                  sample_size: int = INTEGRITY_SAMPLE_SIZE) -> IntegrityReport:
+    """
+    Valide l'intégrité relationnelle des données par anti-jointures vectorisées
+    
+    Seules les colonnes d'identifiants sont utilisées. Chaque règle est résumée
+    par un nombre de lignes en défaut et un échantillon borné d'identifiants.
+    
+    Args:
+        companies: Table (ou colonnes) avec company_id
+        facilities: Table (ou colonnes) avec facility_id
+        links: Liens company_id / facility_id
+        sample_size: Nombre maximal d'identifiants d'exemple par règle
+    
+    Returns:
+        IntegrityReport: Violations détectées (vide si les tables sont cohérentes)
+    """
     logger = setup_module_logging()
-    
-    errors = []
-    
-    # Vérification 1: Pas d'entreprise orpheline
-    linked_company_ids = set(links['company_id'].unique())
-    all_company_ids = set(companies['company_id'].unique())
-    
-    orphaned_companies = all_company_ids - linked_company_ids
-    if orphaned_companies:
-        errors.append(f"Entreprises orphelines: {len(orphaned_companies)}")
-    
-    # Vérification 2: Pas d'établissement orphelin
-    linked_facility_ids = set(links['facility_id'].unique())
-    all_facility_ids = set(facilities['facility_id'].unique())
-    
-    orphaned_facilities = all_facility_ids - linked_facility_ids
-    if orphaned_facilities:
-        errors.append(f"Établissements orphelins: {len(orphaned_facilities)}")
-    
-    # Vérification 3: Cohérence des IDs
-    for company_id in links['company_id'].unique():
-        if company_id not in all_company_ids:
-            errors.append(f"ID entreprise inconnu dans les liens: {company_id}")
-    
-    for facility_id in links['facility_id'].unique():
-        if facility_id not in all_facility_ids:
-            errors.append(f"ID établissement inconnu dans les liens: {facility_id}")
-    
-    if errors:
-        for error in errors:
-            logger.error(error)
-        return False
-    
-    logger.info("Validation relationnelle réussie")
-    return True
+    report = IntegrityReport()
+    company_ids = companies['company_id']
+    facility_ids = facilities['facility_id']
+    link_companies = links['company_id']
+    link_facilities = links['facility_id']
+    
+    company_codes, link_company_codes, n_companies = _shared_codes(company_ids, link_companies)
+    facility_codes, link_facility_codes, n_facilities = _shared_codes(facility_ids, link_facilities)
+    
+    # Clés primaires uniques
+    report.check('duplicate_company_ids', "IDs entreprise en double",
+                 company_ids[pd.Series(company_codes).duplicated().to_numpy()], sample_size)
+    report.check('duplicate_facility_ids', "IDs établissement en double",
+                 facility_ids[pd.Series(facility_codes).duplicated().to_numpy()], sample_size)
+    link_codes = link_company_codes.astype(np.int64) * (n_facilities + 1) + link_facility_codes
+    duplicate_links = pd.Series(link_codes).duplicated().to_numpy()
+    report.check('duplicate_links', "Liens en double",
+                 link_companies[duplicate_links] + ' / ' + link_facilities[duplicate_links], sample_size)
+    
+    # Clés étrangères renseignées
+    null_companies = link_company_codes < 0
+    null_facilities = link_facility_codes < 0
+    report.check('null_company_fk', "Liens sans ID entreprise", link_facilities[null_companies], sample_size)
+    report.check('null_facility_fk', "Liens sans ID établissement", link_companies[null_facilities], sample_size)
+    
+    # Pas d'entreprise ni d'établissement orphelin (anti-jointures entités -> liens)
+    report.check('orphaned_companies', "Entreprises orphelines",
+                 company_ids[~_present(link_company_codes, n_companies)[company_codes]], sample_size)
+    report.check('orphaned_facilities', "Établissements orphelins",
+                 facility_ids[~_present(link_facility_codes, n_facilities)[facility_codes]], sample_size)
+    
+    # Cohérence des IDs (anti-jointures liens -> entités)
+    unknown_companies = ~null_companies & ~_present(company_codes, n_companies)[link_company_codes]
+    unknown_facilities = ~null_facilities & ~_present(facility_codes, n_facilities)[link_facility_codes]
+    report.check('unknown_company_ids', "ID entreprise inconnu dans les liens",
+                 link_companies[unknown_companies], sample_size)
+    report.check('unknown_facility_ids', "ID établissement inconnu dans les liens",
+                 link_facilities[unknown_facilities], sample_size)
+    report.valid_links = ~(null_companies | null_facilities | unknown_companies | unknown_facilities)
+    
+    if report.valid:
+        logger.info("Validation relationnelle réussie")
+    else:
+        report.log(logger)
+    return report
+
+def _write_projection(source: Path, source_schema: Dict[str, str], directory: Path, name: str,
+                      schema: Dict[str, str], chunk_size: Optional[int]) -> Tuple[Path, int]:
+    # Projection d'une table sur les colonnes relationnelles, par blocs si chunk_size
+    if not chunk_size:
+        table = read_table(source, columns=list(schema), schema=source_schema)
+        return write_table(table, directory, name, schema), len(table)
+    
+    n_rows = 0
+    with TableWriter(directory, name, schema) as writer:
+        for chunk in iter_batches(source, columns=list(schema), schema=source_schema, batch_size=chunk_size):
+            writer.write(chunk)
+            n_rows += len(chunk)
+    return writer.path, n_rows
 
 def build_relational_tables(companies_path: Path, 
                             facilities_path: Path, 
-                            links_path: Path) -> Dict[str, Path]:
-    """Construit et valide les tables relationnelles"""
+                            links_path: Path,
+                            chunk_size: Optional[int] = None) -> Dict[str, Path]:
+    """
+    Construit et valide les tables relationnelles
+    
+    Args:
+        companies_path: Entreprises nettoyées
+        facilities_path: Établissements
+        links_path: Liens entreprises-établissements
+        chunk_size: Recopie des entités par blocs de lignes; seules les colonnes
+            d'identifiants sont alors chargées entièrement (validation)
+    """
     logger = setup_module_logging()
     logger.info("Construction des tables relationnelles")
     
     # Création du dossier
     RELATIONAL_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Lecture des données
-    companies = pd.read_csv(companies_path)
-    facilities = pd.read_csv(facilities_path)
-    links = pd.read_csv(links_path)
+    # Lecture des seules colonnes utilisées par la validation
+    companies = read_table(companies_path, columns=['company_id'], schema=COMPANIES_SCHEMA)
+    facilities = read_table(facilities_path, columns=['facility_id'], schema=FACILITIES_SCHEMA)
+    links = read_table(links_path, schema=LINKS_SCHEMA)
+    record_rows(rows_in=len(companies) + len(facilities) + len(links))
     
     # Validation
-    if not validate_relational_integrity(companies, facilities, links):
-        logger.warning("Problèmes d'intégrité détectés")
+    with timed_section('validate_integrity'):
+        report = validate_relational_integrity(companies, facilities, links)
+    if not report.valid:
+        logger.warning(f"Problèmes d'intégrité détectés: {report.counts()}")
+    del companies, facilities
     
     # Nettoyage des liens (suppression des références manquantes)
-    valid_links = links[
-        links['company_id'].isin(companies['company_id']) & 
-        links['facility_id'].isin(facilities['facility_id'])
-    ]
+    valid_links = links[report.valid_links]
     
     # Sauvegarde des tables relationnelles
-    companies_relational = companies[['company_id', 'company_name', 'country']].copy()
-    facilities_relational = facilities[['facility_id', 'facility_name', 'lat', 'lon', 'country']].copy()
-    
-    companies_output = RELATIONAL_DIR / "companies_relational.csv"
-    facilities_output = RELATIONAL_DIR / "facilities_relational.csv"
-    links_output = RELATIONAL_DIR / "company_facilities_relational.csv"
-    
-    companies_relational.to_csv(companies_output, index=False)
-    facilities_relational.to_csv(facilities_output, index=False)
-    valid_links.to_csv(links_output, index=False)
+    companies_output, n_companies = _write_projection(
+        companies_path, COMPANIES_SCHEMA, RELATIONAL_DIR, "companies_relational",
+        COMPANIES_RELATIONAL_SCHEMA, chunk_size
+    )
+    facilities_output, n_facilities = _write_projection(
+        facilities_path, FACILITIES_SCHEMA, RELATIONAL_DIR, "facilities_relational",
+        FACILITIES_RELATIONAL_SCHEMA, chunk_size
+    )
+    links_output = write_table(valid_links, RELATIONAL_DIR, "company_facilities_relational", LINKS_SCHEMA)
     
     logger.info(f"Tables relationnelles sauvegardées dans: {RELATIONAL_DIR}")
-    logger.info(f"- Companies: {len(companies_relational)} lignes")
-    logger.info(f"- Facilities: {len(facilities_relational)} lignes")
+    logger.info(f"- Companies: {n_companies} lignes")
+    logger.info(f"- Facilities: {n_facilities} lignes")
     logger.info(f"- Links: {len(valid_links)} lignes")
+    record_rows(rows_out=n_companies + n_facilities + len(valid_links))
     
     return {
         'companies': companies_output,
         'facilities': facilities_output,
         'links': links_output
-    }
\ No newline at end of file
+    }
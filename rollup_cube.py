@@ -0,0 +1,161 @@
+"""
+Module d'agrégation des tables relationnelles en un cube de synthèse
+
+Une seule lecture par blocs de chaque table relationnelle produit un petit
+artefact JSON consommé par les tableaux de bord et le rapport final:
+    totals: nombre d'entreprises, d'établissements, de liens
+    companies_by_country: entreprises par pays
+    facility_cells: établissements par (pays, secteur, contributeur, fermé)
+    facilities_per_company: histogramme exact du nombre d'établissements par
+        entreprise, avec moyenne et quantiles calculés sur l'histogramme
+"""
+import json
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from artifact_store import iter_batches
+from profiling import record_rows, timed_section
+
+CUBE_PATH = Path("data/relational/rollup_cube.json")
+CUBE_BATCH_SIZE = 500000
+FACILITY_DIMENSIONS = ['country', 'sector', 'contributor', 'is_closed']
+QUANTILES = [0.25, 0.5, 0.75, 0.9, 0.99]
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def _to_python(value: Any) -> Any:
+    # Scalaires NumPy et valeurs manquantes -> types sérialisables en JSON
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+def _sum_counts(parts: List[pd.Series]) -> pd.Series:
+    # Fusion des comptages partiels des blocs (clés manquantes conservées)
+    if not parts:
+        return pd.Series(dtype=np.int64)
+    counts = pd.concat(parts)
+    levels = list(range(counts.index.nlevels))
+    return counts.groupby(level=levels, dropna=False, sort=False).sum()
+
+def histogram_quantile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+    """
+    Quantile d'une distribution donnée par histogramme exact
+    
+    Identique à np.quantile (interpolation linéaire) sur les valeurs répétées
+    selon leurs effectifs, sans les matérialiser.
+    
+    Args:
+        values: Valeurs distinctes, croissantes
+        counts: Effectif de chaque valeur
+        q: Quantile dans [0, 1]
+    """
+    n = int(counts.sum())
+    if n == 0:
+        return float('nan')
+    position = (n - 1) * q
+    lower, upper = int(np.floor(position)), int(np.ceil(position))
+    # Valeur au rang r: première valeur dont l'effectif cumulé dépasse r
+    cumulative = np.cumsum(counts)
+    lower_value = values[np.searchsorted(cumulative, lower, side='right')]
+    upper_value = values[np.searchsorted(cumulative, upper, side='right')]
+    return float(lower_value + (upper_value - lower_value) * (position - lower))
+
+def build_rollup_cube(relational_paths: Dict[str, Path], output_path: Path = CUBE_PATH,
+                      batch_size: int = CUBE_BATCH_SIZE) -> Path:
+    """
+    Calcule le cube de synthèse en une passe sur les tables relationnelles
+    
+    Args:
+        relational_paths: Tables relationnelles (companies, facilities, links)
+        output_path: Fichier JSON du cube
+        batch_size: Nombre de lignes lues par bloc
+    
+    Returns:
+        Path: Chemin du cube
+    """
+    logger = setup_module_logging()
+    logger.info("Calcul du cube de synthèse")
+    
+    n_companies = n_facilities = n_links = 0
+    country_parts, cell_parts, link_parts = [], [], []
+    
+    with timed_section('scan_companies'):
+        for chunk in iter_batches(relational_paths['companies'], columns=['country'], batch_size=batch_size):
+            n_companies += len(chunk)
+            country_parts.append(chunk['country'].value_counts(dropna=False))
+    
+    with timed_section('scan_facilities'):
+        for chunk in iter_batches(relational_paths['facilities'], columns=FACILITY_DIMENSIONS,
+                                  batch_size=batch_size):
+            n_facilities += len(chunk)
+            cell_parts.append(chunk.groupby(FACILITY_DIMENSIONS, dropna=False, observed=True, sort=False).size())
+    
+    with timed_section('scan_links'):
+        for chunk in iter_batches(relational_paths['links'], columns=['company_id'], batch_size=batch_size):
+            n_links += len(chunk)
+            link_parts.append(chunk['company_id'].value_counts())
+    record_rows(rows_in=n_companies + n_facilities + n_links)
+    
+    # Entreprises par pays: effectifs décroissants, puis ordre alphabétique
+    companies_by_country = _sum_counts(country_parts)
+    companies_by_country = sorted(companies_by_country.items(), key=lambda item: (-item[1], str(item[0])))
+    
+    cells = _sum_counts(cell_parts)
+    facility_cells = [[_to_python(v) for v in key] + [int(count)] for key, count in cells.items()]
+    facility_cells.sort(key=lambda cell: [str(v) for v in cell[:-1]])
+    
+    # Histogramme exact: l'état ne dépend que du nombre d'entreprises liées
+    facilities_per_company = _sum_counts(link_parts)
+    histogram = facilities_per_company.value_counts().sort_index()
+    values = histogram.index.to_numpy(dtype=np.int64)
+    counts = histogram.to_numpy(dtype=np.int64)
+    n_linked = int(counts.sum())
+    
+    cube = {
+        'totals': {
+            'companies': n_companies,
+            'facilities': n_facilities,
+            'links': n_links,
+            'companies_with_facilities': n_linked
+        },
+        'companies_by_country': {str(_to_python(country)): int(count) for country, count in companies_by_country},
+        'facility_dimensions': FACILITY_DIMENSIONS,
+        'facility_cells': facility_cells,
+        'facilities_per_company': {
+            'values': values.tolist(),
+            'counts': counts.tolist(),
+            'mean': float((values * counts).sum() / n_linked) if n_linked else float('nan'),
+            'median': histogram_quantile(values, counts, 0.5),
+            'max': int(values[-1]) if n_linked else 0,
+            'quantiles': {str(q): histogram_quantile(values, counts, q) for q in QUANTILES}
+        }
+    }
+    
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(cube, f, ensure_ascii=False)
+    
+    logger.info(f"Cube sauvegardé: {output_path} ({len(facility_cells)} cellules)")
+    record_rows(rows_out=len(facility_cells))
+    
+    return output_path
+
+def load_rollup_cube(path: Path) -> Dict[str, Any]:
+    """Relit le cube de synthèse"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def rollup(cube: Dict[str, Any], dimensions: Sequence[str]) -> pd.Series:
+    """
+    Agrège les cellules établissements sur un sous-ensemble de dimensions
+    
+    Returns:
+        pd.Series: Nombre d'établissements par combinaison, décroissant
+    """
+    cells = pd.DataFrame(cube['facility_cells'], columns=cube['facility_dimensions'] + ['facilities'])
+    counts = cells.groupby(list(dimensions), dropna=False)['facilities'].sum()
+    return counts.sort_values(ascending=False, kind='stable')
@@ -0,0 +1,243 @@
+"""
+Module d'ordonnancement du pipeline en graphe de dépendances
+
+Chaque étape déclare les sorties d'autres étapes dont elle dépend; les
+étapes indépendantes s'exécutent en parallèle dans un pool de processus.
+"""
+import logging
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from profiling import new_run_metrics, profile_call, write_run_metrics
+from stage_cache import StageCache
+
+@dataclass
+class Stage:
+    """
+    Étape du pipeline
+    
+    Attributes:
+        name: Nom de l'étape, qui est aussi le nom de sa sortie
+        func: Fonction de niveau module (sérialisable pour le pool de processus)
+        inputs: Argument de `func` -> sortie amont ("etape" ou "etape.cle" pour un dict)
+        params: Arguments constants de `func`
+        label: Message journalisé au démarrage de l'étape
+        cache: Réutiliser la sortie précédente si l'empreinte de l'étape est inchangée
+        cache_key: Composante supplémentaire de l'empreinte (ex: date d'un téléchargement)
+    """
+    name: str
+    func: Callable
+    inputs: Dict[str, str] = field(default_factory=dict)
+    params: Dict[str, Any] = field(default_factory=dict)
+    label: str = ""
+    cache: bool = True
+    cache_key: Optional[str] = None
+    
+    @property
+    def dependencies(self) -> List[str]:
+        return sorted({ref.split('.', 1)[0] for ref in self.inputs.values()})
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def _init_worker_logging():
+    """Configure le logging des processus démarrés sans l'état du parent (spawn)"""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(levelname)s - %(message)s',
+            handlers=[logging.StreamHandler(sys.stdout)]
+        )
+
+def _run_stage(func: Callable, kwargs: Dict[str, Any],
+               trace_memory: bool = False) -> Tuple[Any, float, float, Dict[str, Any]]:
+    """Exécute une étape et mesure ses instants de début et de fin et ses métriques"""
+    started = time.time()
+    result, metrics = profile_call(func, kwargs, trace_memory)
+    return result, started, time.time(), metrics
+
+def resolve_inputs(stage: Stage, results: Dict[str, Any]) -> Dict[str, Any]:
+    """Construit les arguments d'une étape à partir des sorties amont"""
+    kwargs = dict(stage.params)
+    for argument, ref in stage.inputs.items():
+        upstream, _, key = ref.partition('.')
+        value = results[upstream]
+        kwargs[argument] = value[key] if key else value
+    return kwargs
+
+def topological_order(stages: List[Stage]) -> List[Stage]:
+    """Ordonne les étapes en respectant les dépendances (erreur si cycle ou dépendance inconnue)"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Noms d'étapes dupliqués")
+    
+    for stage in stages:
+        missing = [dep for dep in stage.dependencies if dep not in by_name]
+        if missing:
+            raise ValueError(f"Étape {stage.name}: dépendances inconnues {missing}")
+    
+    ordered, done = [], set()
+    remaining = list(stages)
+    while remaining:
+        ready = [s for s in remaining if all(dep in done for dep in s.dependencies)]
+        if not ready:
+            raise ValueError(f"Cycle de dépendances entre: {[s.name for s in remaining]}")
+        for stage in ready:
+            ordered.append(stage)
+            done.add(stage.name)
+            remaining.remove(stage)
+    
+    return ordered
+
+def descendants(stages: List[Stage], name: str) -> Set[str]:
+    """Étape donnée et toutes les étapes qui en dépendent, directement ou non"""
+    selected = {name}
+    for stage in topological_order(stages):
+        if any(dep in selected for dep in stage.dependencies):
+            selected.add(stage.name)
+    return selected
+
+def critical_path(stages: List[Stage], durations: Dict[str, float]) -> Tuple[List[str], float]:
+    """Chaîne de dépendances la plus longue en durée cumulée"""
+    finish: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    
+    for stage in topological_order(stages):
+        slowest = max(stage.dependencies, key=lambda dep: finish[dep], default=None)
+        previous[stage.name] = slowest
+        finish[stage.name] = durations.get(stage.name, 0.0) + (finish[slowest] if slowest else 0.0)
+    
+    if not finish:
+        return [], 0.0
+    
+    node = max(finish, key=finish.get)
+    total = finish[node]
+    path = []
+    while node:
+        path.append(node)
+        node = previous[node]
+    return path[::-1], total
+
+def log_timing_summary(stages: List[Stage], timings: Dict[str, Tuple[float, float]], wall_time: float,
+                       cached: Iterable[str] = ()):
+    """Journalise les durées par étape, les étapes reprises du cache et le chemin critique"""
+    logger = setup_module_logging()
+    durations = {name: end - start for name, (start, end) in timings.items()}
+    path, path_time = critical_path(stages, durations)
+    
+    logger.info("Résumé des durées par étape:")
+    for stage in topological_order(stages):
+        if stage.name in durations:
+            marker = '*' if stage.name in path else ' '
+            logger.info(f" {marker} {stage.name:<24} {durations[stage.name]:8.2f}s")
+        elif stage.name in cached:
+            logger.info(f"   {stage.name:<24}    cache")
+    logger.info(f"Chemin critique: {' -> '.join(path)} ({path_time:.2f}s)")
+    logger.info(f"Durée totale: {wall_time:.2f}s (somme des étapes: {sum(durations.values()):.2f}s)")
+
+def run_pipeline(stages: List[Stage], max_workers: int = 1,
+                 cache: Optional[StageCache] = None, force: Iterable[str] = (),
+                 trace_memory: bool = False) -> Dict[str, Any]:
+    """
+    Exécute les étapes dès que leurs dépendances sont disponibles
+    
+    Args:
+        stages: Étapes du pipeline
+        max_workers: Nombre maximal d'étapes simultanées (1: exécution séquentielle
+            dans le processus courant)
+        cache: Manifeste des exécutions précédentes (None: toutes les étapes sont exécutées)
+        force: Étapes à exécuter même si leur sortie en cache est à jour
+        trace_memory: Mesure le pic d'allocation de chaque étape avec tracemalloc
+    
+    Returns:
+        Dict[str, Any]: Sortie de chaque étape, par nom d'étape
+    """
+    logger = setup_module_logging()
+    ordered = topological_order(stages)
+    force = set(force)
+    unknown = force - {stage.name for stage in stages}
+    if unknown:
+        raise ValueError(f"Étapes inconnues: {sorted(unknown)}")
+    
+    results: Dict[str, Any] = {}
+    timings: Dict[str, Tuple[float, float]] = {}
+    fingerprints: Dict[str, str] = {}
+    cached: List[str] = []
+    run_metrics = new_run_metrics(max_workers)
+    run_started = time.time()
+    
+    def start(stage: Stage) -> Optional[Dict[str, Any]]:
+        """Arguments de l'étape à exécuter, ou None si sa sortie en cache est reprise"""
+        kwargs = resolve_inputs(stage, results)
+        if cache is None or not stage.cache:
+            return kwargs
+        
+        fingerprints[stage.name] = cache.fingerprint(stage.name, stage.func, kwargs, stage.cache_key)
+        if stage.name not in force:
+            outputs = cache.lookup(stage.name, fingerprints[stage.name])
+            if outputs is not None:
+                logger.info(f"Étape {stage.name} à jour, sortie précédente réutilisée")
+                results[stage.name] = outputs
+                cached.append(stage.name)
+                run_metrics['stages'][stage.name] = {'cached': True}
+                return None
+        return kwargs
+    
+    def finish(stage: Stage, result: Any, started: float, finished: float, metrics: Dict[str, Any]):
+        results[stage.name] = result
+        timings[stage.name] = (started, finished)
+        if stage.name in fingerprints:
+            cache.record(stage.name, fingerprints[stage.name], result, finished - started)
+        # Écrites après chaque étape: l'export final lit les métriques des étapes amont
+        run_metrics['stages'][stage.name] = metrics
+        write_run_metrics(run_metrics)
+    
+    if max_workers <= 1:
+        for stage in ordered:
+            kwargs = start(stage)
+            if kwargs is None:
+                continue
+            if stage.label:
+                logger.info(stage.label)
+            finish(stage, *_run_stage(stage.func, kwargs, trace_memory))
+    else:
+        pending = list(ordered)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker_logging) as executor:
+            running = {}
+            while pending or running:
+                # Soumission de toutes les étapes dont les dépendances sont prêtes
+                for stage in [s for s in pending if all(dep in results for dep in s.dependencies)]:
+                    pending.remove(stage)
+                    kwargs = start(stage)
+                    if kwargs is None:
+                        continue
+                    if stage.label:
+                        logger.info(stage.label)
+                    running[executor.submit(_run_stage, stage.func, kwargs, trace_memory)] = stage
+                
+                if not running:
+                    # Étapes reprises du cache: leurs dépendantes sont peut-être prêtes
+                    continue
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception:
+                        logger.error(f"Échec de l'étape {stage.name}")
+                        for other in running:
+                            other.cancel()
+                        raise
+                    finish(stage, *result)
+    
+    wall_time = time.time() - run_started
+    run_metrics['wall_s'] = wall_time
+    metrics_path = write_run_metrics(run_metrics)
+    logger.info(f"Métriques d'exécution: {metrics_path}")
+    
+    log_timing_summary(stages, timings, wall_time, cached)
+    return results
@@ -4,23 +4,279 @@ Module d'extraction des données OAR
 import requests
 import pandas as pd
 import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Dict, List, Iterable, Iterator, Tuple
+from requests.adapters import HTTPAdapter
 import time
 
+from artifact_store import TableWriter
+from geojson_stream import FeatureStream, READ_SIZE, stream_features
+from profiling import record_rows
+
 # Configuration
 COUNTRIES = ['Morocco', 'Spain', 'Portugal', 'Italy', 'France', 'Greece', 'Malta']
 MIN_COMPANIES = 10000
 OAR_API_URL = "https://openapparel.org/api/facilities"
 DATA_DIR = Path("data/raw")
 
+# Pagination et concurrence
+PAGE_SIZE = 500
+MAX_WORKERS = 8
+RATE_LIMIT = 10.0  # requêtes par seconde, tous workers confondus
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # secondes, doublé à chaque tentative
+REQUEST_TIMEOUT = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BATCH_SIZE = 1000  # enregistrements conservés en mémoire avant écriture
+
+# Export CSV bulk
+BULK_URL = "https://openapparel.org/api/facilities.csv"
+BULK_CHUNK_SIZE = 50000
+
+# Schéma du fichier brut (ordre fixe pour l'écriture incrémentale)
+RAW_SCHEMA = {
+    'id': 'string',
+    'name': 'string',
+    'address': 'string',
+    'country': 'string',
+    'lat': 'float64',
+    'lon': 'float64',
+    'is_closed': 'boolean',
+    'created_at': 'string',
+    'updated_at': 'string',
+    'contributor': 'string',
+    'sector': 'string',
+    'processing_activity': 'string',
+    'company_name': 'string',
+    'company_id': 'string'
+}
+RAW_COLUMNS = list(RAW_SCHEMA)
+
+# Types explicites pour la lecture par blocs du CSV bulk
+BULK_DTYPES = {column: 'string' for column in RAW_COLUMNS}
+BULK_DTYPES.update({'lat': 'float64', 'lon': 'float64'})
+
 def setup_module_logging():
     """Configuration du logging pour ce module"""
     return logging.getLogger(__name__)
 
-def download_oar_data() -> Path:
+class RateLimiter:
+    """Limiteur de débit côté client partagé entre les threads"""
+    
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def wait(self):
+        """Bloque jusqu'au prochain créneau de requête disponible"""
+        with self._lock:
+            slot = max(time.monotonic(), self._next_slot)
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+def create_session(max_workers: int) -> requests.Session:
+    """Crée une session HTTP avec un pool de connexions dimensionné pour les workers"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def fetch_page(session: requests.Session, api_url: str, page: int, page_size: int,
+               rate_limiter: RateLimiter, query: Optional[Dict] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Télécharge une page de l'API avec retry et backoff exponentiel
+    
+    Le corps de la réponse est lu en flux: seules les features des pays
+    cibles sont conservées, aplaties.
+    
+    Returns:
+        Tuple[Dict, List[Dict]]: En-tête de la page (count, next...) et enregistrements filtrés
+    """
+    logger = setup_module_logging()
+    params = {"format": "json", "page": page, "pageSize": page_size, **(query or {})}
+    
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.wait()
+        retry_after = None
+        try:
+            with session.get(api_url, params=params, timeout=REQUEST_TIMEOUT, stream=True) as response:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    stream = FeatureStream(response.iter_content(READ_SIZE))
+                    records = [record for batch in iter_record_batches(stream) for record in batch]
+                    return stream.header, records
+                retry_after = response.headers.get('Retry-After')
+                error = f"HTTP {response.status_code}"
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            error = str(e)
+        
+        if attempt == MAX_RETRIES:
+            raise RuntimeError(f"Page {page} en échec après {MAX_RETRIES} tentatives: {error}")
+        
+        delay = BACKOFF_BASE * (2 ** attempt)
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        logger.warning(f"Page {page}: {error}, nouvelle tentative dans {delay:.1f}s")
+        time.sleep(delay)
+
+def feature_to_record(feature: Dict) -> Dict:
+    """Aplatit une feature GeoJSON en enregistrement brut"""
+    props = feature.get('properties', {})
+    geometry = feature.get('geometry') or {}
+    coordinates = geometry.get('coordinates') or [None, None]
+    
+    record = {
+        'id': props.get('os_id'),
+        'name': props.get('name'),
+        'address': props.get('address'),
+        'country': props.get('country'),
+        'lat': coordinates[1],
+        'lon': coordinates[0],
+        'is_closed': props.get('is_closed', False),
+        'created_at': props.get('created_at'),
+        'updated_at': props.get('updated_at'),
+        'contributor': props.get('contributor'),
+        'sector': props.get('sector'),
+        'processing_activity': props.get('processing_activity')
+    }
+    
+    # Extraction des infos entreprise
+    contributors = props.get('contributors', [])
+    if contributors:
+        record['company_name'] = contributors[0].get('name')
+        record['company_id'] = contributors[0].get('id')
+    
+    return record
+
+def iter_record_batches(features: Iterable[Dict], batch_size: int = BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Aplatit les features au fil de l'eau et ne garde que les pays cibles, par lots bornés"""
+    batch = []
+    for feature in features:
+        record = feature_to_record(feature)
+        if record['country'] not in COUNTRIES:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class RawFileWriter:
+    """Écriture incrémentale du fichier brut avec suivi des statistiques"""
+    
+    def __init__(self, name: str):
+        self._writer = TableWriter(DATA_DIR, name, RAW_SCHEMA)
+        self.output_path = self._writer.path
+        self.n_facilities = 0
+        self.company_ids = set()
+    
+    def write(self, records: List[Dict]):
+        """Ajoute des enregistrements au fichier brut"""
+        self.write_frame(pd.DataFrame(records, columns=RAW_COLUMNS))
+    
+    def write_frame(self, df: pd.DataFrame):
+        """Ajoute un bloc de lignes au fichier brut, dans l'ordre de RAW_COLUMNS"""
+        df = df.reindex(columns=RAW_COLUMNS)
+        self._writer.write(df)
+        self.n_facilities += len(df)
+        self.company_ids.update(df['company_id'].dropna().astype(str).unique())
+    
+    def close(self):
+        self._writer.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def log_summary(self):
+        """Vérifie le nombre minimum d'entreprises et journalise les statistiques"""
+        logger = setup_module_logging()
+        if len(self.company_ids) < MIN_COMPANIES:
+            logger.warning(f"Seulement {len(self.company_ids)} entreprises trouvées")
+            # On pourrait ici ajouter une logique pour télécharger plus de données
+        
+        logger.info(f"Données sauvegardées: {self.output_path}")
+        logger.info(f"Statistiques: {self.n_facilities} établissements, {len(self.company_ids)} entreprises")
+        record_rows(rows_out=self.n_facilities)
+
+def iter_pages(api_url: str = OAR_API_URL,
+               query: Optional[Dict] = None,
+               max_workers: int = MAX_WORKERS,
+               page_size: int = PAGE_SIZE,
+               rate_limit: Optional[float] = RATE_LIMIT) -> Iterator[List[Dict]]:
+    """
+    Parcourt toutes les pages d'une requête API et produit leurs enregistrements filtrés
+    
+    Les pages sont récupérées en parallèle sur une session partagée, avec
+    une fenêtre bornée de pages en vol, puis restituées dans l'ordre.
+    
+    Args:
+        api_url: URL de l'API (remplaçable par un serveur local de test)
+        query: Paramètres de filtrage supplémentaires
+        max_workers: Nombre de téléchargements simultanés
+        page_size: Nombre de features par page
+        rate_limit: Requêtes par seconde maximum (None pour désactiver)
+    """
+    logger = setup_module_logging()
+    session = create_session(max_workers)
+    rate_limiter = RateLimiter(rate_limit)
+    
+    try:
+        # Première page: nombre total de features
+        header, first_records = fetch_page(session, api_url, 1, page_size, rate_limiter, query)
+        total = header.get('count', page_size)
+        n_pages = max(1, math.ceil(total / page_size))
+        logger.info(f"{total} établissements sur {n_pages} pages, {max_workers} workers")
+        
+        pending = {1: first_records}
+        del first_records
+        
+        next_page = 1
+        next_to_submit = 2
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = {}
+            while next_page <= n_pages:
+                # Fenêtre bornée de pages en vol pour limiter la mémoire
+                while next_to_submit <= n_pages and len(in_flight) + len(pending) < 2 * max_workers:
+                    future = executor.submit(fetch_page, session, api_url, next_to_submit,
+                                             page_size, rate_limiter, query)
+                    in_flight[future] = next_to_submit
+                    next_to_submit += 1
+                
+                # Restitution des pages dans l'ordre
+                while next_page in pending:
+                    yield pending.pop(next_page)
+                    next_page += 1
+                
+                if not in_flight:
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = in_flight.pop(future)
+                    pending[page] = future.result()[1]
+    finally:
+        session.close()
+
+def download_oar_data(api_url: str = OAR_API_URL,
+                      max_workers: int = MAX_WORKERS,
+                      page_size: int = PAGE_SIZE,
+                      rate_limit: Optional[float] = RATE_LIMIT) -> Path:
     """
-    Télécharge les données OAR et les filtre par pays
+    Télécharge les données OAR page par page et les filtre par pays
+    
+    Les pages sont écrites dans le fichier brut au fur et à mesure de leur
+    arrivée (voir `iter_pages`).
     
     Returns:
         Path: Chemin vers le fichier brut sauvegardé
@@ -32,86 +288,88 @@ def download_oar_data() -> Path:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     
     try:
-        # Téléchargement via API
         logger.info("Téléchargement des données depuis l'API OAR...")
-        response = requests.get(OAR_API_URL, params={"format": "json"})
-        response.raise_for_status()
-        
-        data = response.json()
-        df = pd.DataFrame(data['features'])
-        
-        # Extraction des colonnes pertinentes
-        records = []
-        for feature in data['features']:
-            props = feature.get('properties', {})
-            geometry = feature.get('geometry', {})
-            
-            record = {
-                'id': props.get('os_id'),
-                'name': props.get('name'),
-                'address': props.get('address'),
-                'country': props.get('country'),
-                'lat': geometry.get('coordinates', [None, None])[1],
-                'lon': geometry.get('coordinates', [None, None])[0],
-                'is_closed': props.get('is_closed', False),
-                'created_at': props.get('created_at'),
-                'updated_at': props.get('updated_at'),
-                'contributor': props.get('contributor'),
-                'sector': props.get('sector'),
-                'processing_activity': props.get('processing_activity')
-            }
-            
-            # Extraction des infos entreprise
-            contributors = props.get('contributors', [])
-            if contributors:
-                record['company_name'] = contributors[0].get('name')
-                record['company_id'] = contributors[0].get('id')
-            
-            records.append(record)
-        
-        df = pd.DataFrame(records)
-        
-        # Filtrage par pays
         logger.info(f"Filtrage des données pour {len(COUNTRIES)} pays")
-        df_filtered = df[df['country'].isin(COUNTRIES)].copy()
+        with RawFileWriter(f"oar_raw_{pd.Timestamp.now().strftime('%Y%m%d')}") as writer:
+            for records in iter_pages(api_url, None, max_workers, page_size, rate_limit):
+                writer.write(records)
         
-        # Vérification du nombre minimum d'entreprises
-        if df_filtered['company_id'].nunique() < MIN_COMPANIES:
-            logger.warning(f"Seulement {df_filtered['company_id'].nunique()} entreprises trouvées")
-            # On pourrait ici ajouter une logique pour télécharger plus de données
+        writer.log_summary()
         
-        # Sauvegarde
-        output_path = DATA_DIR / f"oar_raw_{pd.Timestamp.now().strftime('%Y%m%d')}.csv"
-        df_filtered.to_csv(output_path, index=False, encoding='utf-8')
+        return writer.output_path
         
-        logger.info(f"Données sauvegardées: {output_path}")
-        logger.info(f"Statistiques: {len(df_filtered)} établissements, {df_filtered['company_id'].nunique()} entreprises")
+    except Exception as e:
+        logger.error(f"Erreur lors du téléchargement: {str(e)}")
+        raise
+
+def extract_from_geojson(source_path: Path, batch_size: int = BATCH_SIZE) -> Path:
+    """
+    Extrait un export GeoJSON sauvegardé (éventuellement .gz) en flux
+    
+    Seul un lot de `batch_size` enregistrements est gardé en mémoire.
+    
+    Returns:
+        Path: Chemin vers le fichier brut sauvegardé
+    """
+    logger = setup_module_logging()
+    logger.info(f"Extraction en flux depuis: {source_path}")
+    
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    
+    try:
+        with RawFileWriter(f"oar_raw_{pd.Timestamp.now().strftime('%Y%m%d')}") as writer:
+            for batch in iter_record_batches(stream_features(source_path), batch_size):
+                writer.write(batch)
         
-        return output_path
+        writer.log_summary()
+        return writer.output_path
         
     except Exception as e:
-        logger.error(f"Erreur lors du téléchargement: {str(e)}")
+        logger.error(f"Erreur lors de l'extraction GeoJSON: {str(e)}")
         raise
 
 # Alternative: Téléchargement depuis CSV bulk
-def download_from_bulk() -> Path:
-    """Alternative: Téléchargement depuis l'export CSV bulk"""
+def download_from_bulk(source: str = BULK_URL, chunk_size: int = BULK_CHUNK_SIZE) -> Path:
+    """
+    Alternative: Téléchargement depuis l'export CSV bulk
+    
+    Le CSV est lu par blocs de `chunk_size` lignes, limité aux colonnes
+    utiles avec des types explicites, et filtré par pays bloc par bloc:
+    la mémoire reste bornée quelle que soit la taille de l'export.
+    
+    Args:
+        source: URL ou fichier local de l'export (compression .gz détectée)
+        chunk_size: Nombre de lignes par bloc
+    
+    Returns:
+        Path: Chemin vers le fichier brut sauvegardé
+    """
     logger = setup_module_logging()
     
-    bulk_url = "https://openapparel.org/api/facilities.csv"
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
     
     try:
-        logger.info("Téléchargement du CSV bulk...")
-        df = pd.read_csv(bulk_url, low_memory=False)
+        logger.info(f"Téléchargement du CSV bulk: {source}")
+        reader = pd.read_csv(
+            source,
+            usecols=lambda column: column in BULK_DTYPES,
+            dtype=BULK_DTYPES,
+            chunksize=chunk_size,
+            compression='infer'
+        )
         
-        # Filtrage par pays
-        df_filtered = df[df['country'].isin(COUNTRIES)].copy()
+        n_read = 0
+        with reader, RawFileWriter(f"oar_bulk_{pd.Timestamp.now().strftime('%Y%m%d')}") as writer:
+            for chunk in reader:
+                n_read += len(chunk)
+                # Filtrage par pays
+                writer.write_frame(chunk[chunk['country'].isin(COUNTRIES)])
         
-        output_path = DATA_DIR / f"oar_bulk_{pd.Timestamp.now().strftime('%Y%m%d')}.csv"
-        df_filtered.to_csv(output_path, index=False)
+        logger.info(f"{n_read} lignes lues dans l'export bulk")
+        writer.log_summary()
         
-        return output_path
+        return writer.output_path
         
     except Exception as e:
         logger.error(f"Erreur avec le bulk CSV: {str(e)}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,296 @@
+"""
+Module d'index spatial des établissements
+
+Index en grille régulière (cellules de même taille en degrés, triées par clé
+de cellule) construit avec NumPy: requêtes par rayon et k plus proches
+voisins, et recherche de toutes les paires de points à moins d'une distance
+donnée, qui ne compare que les cellules voisines (coût proportionnel au
+nombre de points et à leur densité locale, pas au carré du nombre de points).
+
+Le dédoublonnage fusionne les établissements déclarés par plusieurs
+contributeurs avec des coordonnées ou des noms légèrement différents: paires
+proches (haversine), noms similaires (Jaccard sur les mots), union-find.
+"""
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from artifact_store import artifact_path, read_table, write_table
+from clean_facilities import DATA_DIR, FACILITIES_SCHEMA, LINKS_SCHEMA
+from entity_resolution import UnionFind, jaccard_similarity, name_tokens
+from profiling import record_rows, timed_section
+from relational_builder import RELATIONAL_DIR
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+DEFAULT_CELL_KM = 1.0
+PAIR_BATCH_SIZE = 5000000  # paires candidates évaluées par lot (mémoire bornée)
+
+DEDUP_RADIUS_KM = 0.15  # écart de coordonnées toléré entre deux déclarations d'un même site
+DEDUP_NAME_THRESHOLD = 0.7  # similarité de Jaccard minimale entre noms d'établissements proches
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Distance orthodromique en km (vectorisée)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class GridIndex:
+    """
+    Index en grille de points (lat, lon)
+    
+    Les positions renvoyées sont celles des tableaux d'origine; les points
+    sans coordonnées ne sont pas indexés. L'antiméridien n'est pas raccordé
+    (zone couverte: bassin méditerranéen).
+    """
+    
+    def __init__(self, lat, lon, cell_km: float = DEFAULT_CELL_KM):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.n_cols = int(np.ceil(360 / self.cell_deg)) + 3
+        
+        valid = np.flatnonzero(~np.isnan(self.lat) & ~np.isnan(self.lon))
+        keys = self._keys(*self._cells(self.lat[valid], self.lon[valid]))
+        order = np.argsort(keys, kind='stable')
+        self.points = valid[order]
+        self.cell_keys, self.cell_starts, self.cell_counts = np.unique(
+            keys[order], return_index=True, return_counts=True)
+        self.max_abs_lat = float(np.abs(self.lat[valid]).max()) if len(valid) else 0.0
+    
+    def __len__(self) -> int:
+        return len(self.points)
+    
+    def _cells(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        rows = np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lon) + 180) / self.cell_deg).astype(np.int64) + 1
+        return rows, cols
+    
+    def _keys(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        return rows * self.n_cols + cols
+    
+    def _span(self, radius_km: float, abs_lat: float) -> Tuple[int, int]:
+        # Cellules à parcourir de part et d'autre: les degrés de longitude rétrécissent avec la latitude
+        rows = int(np.ceil(radius_km / self.cell_km))
+        widest = min(abs_lat + radius_km / KM_PER_DEGREE, 89.0)
+        cols = int(np.ceil(radius_km / (self.cell_km * np.cos(np.radians(widest)))))
+        return rows, cols
+    
+    def _cell_points(self, keys: np.ndarray) -> np.ndarray:
+        # Positions des points des cellules demandées (cellules vides ignorées)
+        if not len(self.cell_keys):
+            return np.empty(0, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        found = found[self.cell_keys[found] == keys]
+        if not len(found):
+            return np.empty(0, dtype=np.int64)
+        starts, counts = self.cell_starts[found], self.cell_counts[found]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.points[np.repeat(starts, counts) + offsets]
+    
+    def query_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Points à moins de `radius_km` d'un point
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Positions et distances (km), par distance croissante
+        """
+        row_span, col_span = self._span(radius_km, abs(lat))
+        row, col = self._cells(lat, lon)
+        rows, cols = np.meshgrid(np.arange(row - row_span, row + row_span + 1),
+                                 np.arange(col - col_span, col + col_span + 1), indexing='ij')
+        candidates = self._cell_points(self._keys(rows.ravel(), cols.ravel()))
+        distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+        within = distances <= radius_km
+        order = np.argsort(distances[within], kind='stable')
+        return candidates[within][order], distances[within][order]
+    
+    def query_knn(self, lat: float, lon: float, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Les k points les plus proches d'un point
+        
+        Le rayon de recherche double jusqu'à contenir k points: tous les points
+        plus proches que le k-ième sont alors dans le rayon.
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Positions et distances (km), par distance croissante
+        """
+        radius_km = self.cell_km
+        while True:
+            positions, distances = self.query_radius(lat, lon, radius_km)
+            if len(positions) >= k or len(positions) == len(self) or radius_km > np.pi * EARTH_RADIUS_KM:
+                return positions[:k], distances[:k]
+            radius_km *= 2
+    
+    def _neighbour_cells(self, radius_km: float) -> Iterator[Tuple[np.ndarray, np.ndarray, bool]]:
+        # Couples de cellules non vides (c1, c2) à comparer, chaque couple une seule fois
+        row_span, col_span = self._span(radius_km, self.max_abs_lat)
+        for d_row in range(row_span + 1):
+            for d_col in range(-col_span, col_span + 1):
+                if d_row == 0 and d_col < 0:
+                    continue
+                targets = self.cell_keys + d_row * self.n_cols + d_col
+                found = np.minimum(np.searchsorted(self.cell_keys, targets), len(self.cell_keys) - 1)
+                matched = self.cell_keys[found] == targets
+                yield np.flatnonzero(matched), found[matched], d_row == 0 and d_col == 0
+    
+    def pairs_within(self, radius_km: float,
+                     batch_size: int = PAIR_BATCH_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Toutes les paires de points à moins de `radius_km`, sans comparer toutes les paires
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: Positions a, b (chaque paire
+            une fois) et distance (km)
+        """
+        results = []
+        if not len(self.cell_keys):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        for first, second, same_cell in self._neighbour_cells(radius_km):
+            sizes = self.cell_counts[first] * self.cell_counts[second]
+            # Lots de couples de cellules d'environ `batch_size` paires
+            splits = np.flatnonzero(np.diff(np.cumsum(sizes) // batch_size)) + 1
+            for batch in np.split(np.arange(len(sizes)), splits):
+                c1, c2, n_pairs = first[batch], second[batch], sizes[batch]
+                if not n_pairs.sum():
+                    continue
+                pair = np.repeat(np.arange(len(c1)), n_pairs)
+                within = np.arange(n_pairs.sum()) - np.repeat(np.cumsum(n_pairs) - n_pairs, n_pairs)
+                counts2 = self.cell_counts[c2][pair]
+                i = self.cell_starts[c1][pair] + within // counts2
+                j = self.cell_starts[c2][pair] + within % counts2
+                if same_cell:
+                    keep = i < j
+                    i, j = i[keep], j[keep]
+                a, b = self.points[i], self.points[j]
+                distances = haversine_km(self.lat[a], self.lon[a], self.lat[b], self.lon[b])
+                close = distances <= radius_km
+                results.append((a[close], b[close], distances[close]))
+        
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+def find_duplicate_sites(names: pd.Series, lat, lon, radius_km: float = DEDUP_RADIUS_KM,
+                         name_threshold: float = DEDUP_NAME_THRESHOLD) -> Tuple[np.ndarray, int]:
+    """
+    Regroupe les sites proches et de noms similaires
+    
+    Returns:
+        Tuple[np.ndarray, int]: Racine du groupe de chaque site, nombre de paires proches évaluées
+    """
+    index = GridIndex(lat, lon, cell_km=radius_km)
+    a, b, _ = index.pairs_within(radius_km)
+    
+    # Noms découpés en mots pour les seuls sites d'une paire, une fois par nom distinct
+    involved, local = np.unique(np.concatenate([a, b]), return_inverse=True)
+    codes, uniques = pd.factorize(np.asarray(names, dtype=object)[involved])
+    unique_tokens = [name_tokens(name) for name in uniques]
+    tokens = [unique_tokens[code] if code >= 0 else () for code in codes]
+    similar = jaccard_similarity(tokens, local[:len(a)], local[len(a):]) >= name_threshold
+    union_find = UnionFind(len(names))
+    union_find.union(a[similar], b[similar])
+    return union_find.find(), len(a)
+
+def deduplicate_facilities(companies_path: Path, facilities_path: Path, links_path: Path,
+                           radius_km: float = DEDUP_RADIUS_KM,
+                           name_threshold: float = DEDUP_NAME_THRESHOLD) -> Dict[str, Path]:
+    """
+    Fusionne les établissements déclarés plusieurs fois avec des coordonnées ou noms proches
+    
+    Chaque groupe reçoit l'identifiant et le nom de son établissement le plus
+    déclaré; les liens sont réécrits en conséquence et dédoublonnés.
+    
+    Args:
+        companies_path: Entreprises (transmises telles quelles)
+        facilities_path: Établissements de `process_facilities`
+        links_path: Liens entreprises-établissements
+        radius_km: Distance maximale entre deux déclarations d'un même site
+        name_threshold: Similarité de Jaccard minimale entre leurs noms
+    """
+    logger = setup_module_logging()
+    logger.info(f"Dédoublonnage spatial des établissements: {facilities_path}")
+    
+    facilities = read_table(facilities_path, schema=FACILITIES_SCHEMA)
+    links = read_table(links_path, schema=LINKS_SCHEMA)
+    record_rows(rows_in=len(facilities))
+    
+    # Un site par identifiant, pondéré par son nombre de déclarations
+    sites = facilities.groupby('facility_id', sort=True).agg(
+        facility_name=('facility_name', 'first'),
+        lat=('lat', 'first'),
+        lon=('lon', 'first'),
+        weight=('facility_name', 'size')
+    ).reset_index()
+    
+    with timed_section('match_sites'):
+        sites['root'], n_candidates = find_duplicate_sites(
+            sites['facility_name'], sites['lat'], sites['lon'], radius_km, name_threshold)
+    
+    # Site canonique: le plus déclaré du groupe, puis le plus petit identifiant
+    canonical = sites.sort_values(['weight', 'facility_id'], ascending=[False, True])
+    canonical = canonical.drop_duplicates('root').set_index('root')
+    mapping = pd.DataFrame({
+        'canonical_id': canonical['facility_id'].reindex(sites['root']).to_numpy(),
+        'canonical_name': canonical['facility_name'].reindex(sites['root']).to_numpy()
+    }, index=sites['facility_id'])
+    
+    facilities['facility_name'] = mapping['canonical_name'].reindex(facilities['facility_id']).to_numpy()
+    facilities['facility_id'] = mapping['canonical_id'].reindex(facilities['facility_id']).to_numpy()
+    links['facility_id'] = mapping['canonical_id'].reindex(links['facility_id']).to_numpy()
+    links = links.drop_duplicates()
+    
+    facilities_output = write_table(facilities, DATA_DIR, "facilities_dedup", FACILITIES_SCHEMA)
+    links_output = write_table(links, DATA_DIR, "company_facilities_links_dedup", LINKS_SCHEMA)
+    
+    n_merged = len(sites) - int(sites['root'].nunique())
+    logger.info(f"Paires de sites proches évaluées: {n_candidates}")
+    logger.info(f"Établissements: {len(sites)} -> {len(sites) - n_merged} après dédoublonnage")
+    logger.info(f"Établissements dédoublonnés sauvegardés: {facilities_output}")
+    record_rows(rows_out=len(facilities))
+    
+    return {
+        'companies': companies_path,
+        'facilities': facilities_output,
+        'links': links_output
+    }
+
+def facilities_near(facilities: pd.DataFrame, lat: float, lon: float, radius_km: float,
+                    index: Optional[GridIndex] = None) -> pd.DataFrame:
+    """Établissements à moins de `radius_km` d'un point, avec leur distance (distance_km)"""
+    index = index or GridIndex(facilities['lat'], facilities['lon'])
+    positions, distances = index.query_radius(lat, lon, radius_km)
+    return facilities.iloc[positions].assign(distance_km=distances)
+
+def nearest_facilities(facilities: pd.DataFrame, lat: float, lon: float, k: int,
+                       index: Optional[GridIndex] = None) -> pd.DataFrame:
+    """Les k établissements les plus proches d'un point, avec leur distance (distance_km)"""
+    index = index or GridIndex(facilities['lat'], facilities['lon'])
+    positions, distances = index.query_knn(lat, lon, k)
+    return facilities.iloc[positions].assign(distance_km=distances)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche d'établissements autour d'un point")
+    parser.add_argument('lat', type=float)
+    parser.add_argument('lon', type=float)
+    parser.add_argument('--radius', type=float, help="Rayon de recherche en km")
+    parser.add_argument('--k', type=int, default=10, help="Nombre de voisins (sans --radius)")
+    parser.add_argument('--facilities', type=Path,
+                        help="Table des établissements (par défaut celle du pipeline, au format courant)")
+    args = parser.parse_args()
+    
+    path = args.facilities or artifact_path(RELATIONAL_DIR, "facilities_relational")
+    facilities = read_table(path, columns=['facility_id', 'facility_name', 'lat', 'lon', 'country'])
+    if args.radius is not None:
+        result = facilities_near(facilities, args.lat, args.lon, args.radius)
+    else:
+        result = nearest_facilities(facilities, args.lat, args.lon, args.k)
+    print(result.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
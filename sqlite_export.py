@@ -0,0 +1,206 @@
+"""
+Module d'export des tables relationnelles vers une base SQLite indexée
+
+Les tables companies, facilities et company_facilities sont chargées avec
+clés primaires, clés étrangères et index (company_id, facility_id, country),
+par insertions groupées dans des transactions par bloc puis fusion ensembliste.
+Une réexécution met la base à jour par upsert: les lignes modifiées sont
+réécrites, les nouvelles ajoutées, et les lignes absentes des tables sources
+supprimées.
+"""
+import logging
+import sqlite3
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from artifact_store import iter_batches
+from profiling import record_rows, timed_section
+
+DB_PATH = Path("data/relational/oar.sqlite")
+INSERT_BATCH_SIZE = 50000
+CACHE_SIZE_KB = 262144  # cache de pages de la fusion (clés insérées hors ordre)
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS companies (
+    company_id TEXT PRIMARY KEY,
+    company_name TEXT,
+    country TEXT
+);
+CREATE TABLE IF NOT EXISTS facilities (
+    facility_id TEXT PRIMARY KEY,
+    facility_name TEXT,
+    lat REAL,
+    lon REAL,
+    country TEXT,
+    is_closed INTEGER,
+    sector TEXT,
+    processing_activity TEXT,
+    contributor TEXT
+);
+CREATE TABLE IF NOT EXISTS company_facilities (
+    company_id TEXT NOT NULL REFERENCES companies (company_id) ON DELETE CASCADE,
+    facility_id TEXT NOT NULL REFERENCES facilities (facility_id) ON DELETE CASCADE,
+    PRIMARY KEY (company_id, facility_id)
+) WITHOUT ROWID;
+"""
+# Créés après le premier chargement (plus rapide que de les maintenir pendant l'insertion)
+INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_companies_country ON companies (country);
+CREATE INDEX IF NOT EXISTS idx_facilities_country ON facilities (country);
+CREATE INDEX IF NOT EXISTS idx_company_facilities_facility ON company_facilities (facility_id);
+"""
+
+# Table -> (artefact relationnel, colonnes, clé primaire); la clé est en tête des colonnes
+TABLES: Dict[str, Tuple[str, List[str], List[str]]] = {
+    'companies': ('companies', ['company_id', 'company_name', 'country'], ['company_id']),
+    'facilities': ('facilities', ['facility_id', 'facility_name', 'lat', 'lon', 'country', 'is_closed',
+                                  'sector', 'processing_activity', 'contributor'], ['facility_id']),
+    'company_facilities': ('links', ['company_id', 'facility_id'], ['company_id', 'facility_id'])
+}
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def connect(db_path: Path = DB_PATH) -> sqlite3.Connection:
+    """Ouvre la base avec les clés étrangères actives"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def _merge_sql(table: str, columns: List[str], key: List[str]) -> str:
+    # Upsert ensembliste depuis la table de chargement ("WHERE true" lève l'ambiguïté ON CONFLICT / jointure)
+    names = ', '.join(columns)
+    statement = (f"INSERT INTO main.{table} ({names}) SELECT {names} FROM temp.staging_{table} WHERE true "
+                 f"ON CONFLICT ({', '.join(key)}) DO ")
+    values = [c for c in columns if c not in key]
+    if not values:
+        return statement + "NOTHING"
+    # Réécriture uniquement si une valeur a changé
+    assignments = ', '.join(f"{c} = excluded.{c}" for c in values)
+    changed = ' OR '.join(f"{c} IS NOT excluded.{c}" for c in values)
+    return statement + f"UPDATE SET {assignments} WHERE {changed}"
+
+def _rows(chunk: pd.DataFrame, key: List[str]) -> Iterator[tuple]:
+    # Lignes sans clé ignorées; valeurs manquantes -> NULL, booléens -> 0/1
+    chunk = chunk.dropna(subset=key).astype(object)
+    return chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+def load_table(conn: sqlite3.Connection, table: str, path: Path, columns: List[str], key: List[str],
+               batch_size: int = INSERT_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    Charge une table par blocs, une transaction par bloc, puis la fusionne
+    
+    Les blocs sont insérés dans une table temporaire sans index (temp.staging_<table>),
+    fusionnée ensuite en une seule requête d'upsert dans la table principale. La
+    table temporaire sert aussi à supprimer les lignes absentes de la source.
+    
+    Returns:
+        Tuple[int, int]: Nombre de lignes lues, nombre de lignes insérées ou modifiées
+    """
+    names = ', '.join(columns)
+    conn.execute(f"DROP TABLE IF EXISTS temp.staging_{table}")
+    conn.execute(f"CREATE TEMP TABLE staging_{table} AS SELECT {names} FROM main.{table} WHERE 0")
+    insert = f"INSERT INTO temp.staging_{table} ({names}) VALUES ({', '.join('?' for _ in columns)})"
+    
+    n_rows = 0
+    for chunk in iter_batches(path, columns=columns, batch_size=batch_size):
+        with conn:
+            conn.executemany(insert, _rows(chunk, key))
+        n_rows += len(chunk)
+    
+    with conn:
+        n_changed = conn.execute(_merge_sql(table, columns, key)).rowcount
+    return n_rows, n_changed
+
+def _prune(conn: sqlite3.Connection, table: str, key: List[str]) -> int:
+    # Suppression des lignes absentes de la source (les liens suivent par ON DELETE CASCADE);
+    # index sur la table de chargement: NOT EXISTS indexé plutôt que NOT IN sur clé composite
+    conn.execute(f"CREATE INDEX IF NOT EXISTS temp.staging_{table}_key ON staging_{table} ({', '.join(key)})")
+    matches = ' AND '.join(f"s.{k} = {table}.{k}" for k in key)
+    with conn:
+        cursor = conn.execute(
+            f"DELETE FROM main.{table} WHERE NOT EXISTS (SELECT 1 FROM temp.staging_{table} s WHERE {matches})"
+        )
+    return cursor.rowcount
+
+def export_sqlite(relational_paths: Dict[str, Path], db_path: Path = DB_PATH, prune: bool = True) -> Path:
+    """
+    Exporte les tables relationnelles vers SQLite (création ou mise à jour)
+    
+    Args:
+        relational_paths: Artefacts relationnels (companies, facilities, links)
+        db_path: Base SQLite
+        prune: Supprime les lignes absentes des tables sources
+    
+    Returns:
+        Path: Chemin de la base
+    """
+    logger = setup_module_logging()
+    logger.info(f"Export SQLite: {db_path}")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    conn = connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        conn.executescript(SCHEMA_SQL)
+        
+        # Clés étrangères vérifiées en une passe après le chargement plutôt qu'à chaque ligne
+        conn.execute("PRAGMA foreign_keys = OFF")
+        n_rows = 0
+        loaded_tables = []
+        for table, (source, columns, key) in TABLES.items():
+            # Premier chargement d'une table: rien à supprimer ensuite
+            if conn.execute(f"SELECT 1 FROM main.{table} LIMIT 1").fetchone():
+                loaded_tables.append(table)
+            with timed_section(f'load_{table}'):
+                loaded, changed = load_table(conn, table, relational_paths[source], columns, key)
+            n_rows += loaded
+            logger.info(f"- {table}: {loaded} lignes lues, {changed} insérées ou modifiées")
+        
+        conn.execute("PRAGMA foreign_keys = ON")
+        with timed_section('foreign_key_check'):
+            violations = conn.execute('SELECT "table", COUNT(*) FROM pragma_foreign_key_check GROUP BY 1').fetchall()
+        if violations:
+            raise ValueError("Liens vers des entités absentes: " + ', '.join(f"{t} ({n})" for t, n in violations))
+        
+        if prune:
+            # Liens d'abord, puis entités (cascade pour les liens restants)
+            for table in reversed(loaded_tables):
+                deleted = _prune(conn, table, TABLES[table][2])
+                if deleted:
+                    logger.info(f"- {table}: {deleted} lignes supprimées")
+        
+        with timed_section('create_indexes'):
+            conn.executescript(INDEX_SQL)
+        conn.execute("PRAGMA optimize")
+        
+        record_rows(rows_in=n_rows)
+        logger.info(f"Base SQLite à jour: {n_rows} lignes sources")
+    except Exception as e:
+        logger.error(f"Erreur lors de l'export SQLite: {str(e)}")
+        raise
+    finally:
+        conn.close()
+    
+    return db_path
+
+def facilities_of_company(conn: sqlite3.Connection, company_id: str) -> pd.DataFrame:
+    """Établissements d'une entreprise"""
+    return pd.read_sql_query(
+        "SELECT f.* FROM company_facilities cf JOIN facilities f ON f.facility_id = cf.facility_id "
+        "WHERE cf.company_id = ?", conn, params=(company_id,)
+    )
+
+def companies_of_facility(conn: sqlite3.Connection, facility_id: str) -> pd.DataFrame:
+    """Entreprises liées à un établissement"""
+    return pd.read_sql_query(
+        "SELECT c.* FROM company_facilities cf JOIN companies c ON c.company_id = cf.company_id "
+        "WHERE cf.facility_id = ?", conn, params=(facility_id,)
+    )
+
+def facilities_in_country(conn: sqlite3.Connection, country: str) -> pd.DataFrame:
+    """Établissements d'un pays"""
+    return pd.read_sql_query("SELECT * FROM facilities WHERE country = ?", conn, params=(country,))
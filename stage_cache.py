@@ -0,0 +1,161 @@
+"""
+Module de cache des étapes du pipeline par empreinte de contenu
+
+L'empreinte d'une étape combine le contenu de ses fichiers d'entrée, ses
+paramètres et la version de son code. Les sorties de chaque étape terminée
+sont consignées dans un manifeste: une étape dont l'empreinte n'a pas changé
+et dont les sorties existent toujours est sautée à l'exécution suivante.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from artifact_store import get_format
+
+MANIFEST_PATH = Path("data/run_manifest.json")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def encode_value(value: Any) -> Any:
+    """Sérialise une sortie d'étape (chemins, dicts, listes, scalaires) en JSON"""
+    if isinstance(value, Path):
+        return {'__path__': str(value)}
+    if isinstance(value, dict):
+        return {str(k): encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(v) for v in value]
+    return value
+
+def decode_value(value: Any) -> Any:
+    """Inverse de encode_value"""
+    if isinstance(value, dict):
+        if set(value) == {'__path__'}:
+            return Path(value['__path__'])
+        return {k: decode_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode_value(v) for v in value]
+    return value
+
+def iter_paths(value: Any):
+    """Parcourt les chemins contenus dans une valeur"""
+    if isinstance(value, Path):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from iter_paths(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from iter_paths(v)
+
+def code_version(func: Callable) -> str:
+    """
+    Empreinte du code d'une étape
+    
+    Couvre le module de la fonction et les modules du projet qu'il importe
+    directement (même dossier).
+    """
+    module = sys.modules[func.__module__]
+    module_file = Path(inspect.getsourcefile(module)).resolve()
+    project_dir = module_file.parent
+    
+    files = {module_file}
+    for value in vars(module).values():
+        dependency = sys.modules.get(getattr(value, '__module__', None) or getattr(value, '__name__', ''))
+        dependency_file = getattr(dependency, '__file__', None)
+        if dependency_file and Path(dependency_file).resolve().parent == project_dir:
+            files.add(Path(dependency_file).resolve())
+    
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(path.name.encode('utf-8'))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+class StageCache:
+    """Manifeste des exécutions d'étapes et calcul des empreintes"""
+    
+    def __init__(self, manifest_path: Path = MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self.manifest = {'stages': {}, 'file_hashes': {}}
+        if manifest_path.exists():
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+    
+    def file_hash(self, path: Path) -> str:
+        """Hash du contenu d'un fichier, mémorisé par (taille, date de modification)"""
+        stat = path.stat()
+        key = str(path.resolve())
+        cached = self.manifest['file_hashes'].get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+        
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        
+        self.manifest['file_hashes'][key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest.hexdigest()
+        }
+        return digest.hexdigest()
+    
+    def _hash_inputs(self, value: Any) -> Any:
+        if isinstance(value, Path):
+            return {'path': str(value), 'sha256': self.file_hash(value) if value.is_file() else None}
+        if isinstance(value, dict):
+            return {str(k): self._hash_inputs(v) for k, v in sorted(value.items())}
+        if isinstance(value, (list, tuple)):
+            return [self._hash_inputs(v) for v in value]
+        return repr(value)
+    
+    def fingerprint(self, name: str, func: Callable, kwargs: Dict[str, Any],
+                    cache_key: Optional[str] = None) -> str:
+        """Empreinte d'une étape: entrées (contenu), paramètres, version du code"""
+        payload = {
+            'stage': name,
+            'function': f"{func.__module__}.{func.__qualname__}",
+            'code': code_version(func),
+            'inputs': self._hash_inputs(kwargs),
+            'artifact_format': get_format(),
+            'cache_key': cache_key
+        }
+        encoded = json.dumps(payload, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+    
+    def lookup(self, name: str, fingerprint: str) -> Optional[Any]:
+        """Sorties d'une exécution précédente à jour, ou None"""
+        entry = self.manifest['stages'].get(name)
+        if not entry or entry['fingerprint'] != fingerprint:
+            return None
+        
+        outputs = decode_value(entry['outputs'])
+        if not all(path.exists() for path in iter_paths(outputs)):
+            return None
+        return outputs
+    
+    def record(self, name: str, fingerprint: str, outputs: Any, duration: float):
+        """Consigne les sorties d'une étape terminée et sauvegarde le manifeste"""
+        self.manifest['stages'][name] = {
+            'fingerprint': fingerprint,
+            'outputs': encode_value(outputs),
+            'completed_at': datetime.now().isoformat(),
+            'duration': duration
+        }
+        self.save()
+    
+    def save(self):
+        """Sauvegarde atomique du manifeste"""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        tmp_path.replace(self.manifest_path)
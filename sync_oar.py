@@ -0,0 +1,170 @@
+"""
+Module de synchronisation incrémentale des données OAR
+"""
+import json
+import logging
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from artifact_store import apply_schema, artifact_path, read_table, write_table
+from scrape_oar import (
+    COUNTRIES, DATA_DIR, OAR_API_URL, MAX_WORKERS, PAGE_SIZE, RATE_LIMIT,
+    RAW_COLUMNS, RAW_SCHEMA, iter_pages
+)
+
+# Stockage persistant
+STORE_NAME = "oar_store"
+STATE_PATH = DATA_DIR / "sync_state.json"
+
+# Filtres API
+COUNTRY_CODES = {
+    'Morocco': 'MA',
+    'Spain': 'ES',
+    'Portugal': 'PT',
+    'Italy': 'IT',
+    'France': 'FR',
+    'Greece': 'GR',
+    'Malta': 'MT'
+}
+UPDATED_SINCE_PARAM = "updated_since"
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def load_sync_state(store_path: Path) -> Dict[str, str]:
+    """
+    Charge les high-water marks `updated_at` par pays
+    
+    Les marques ne valent que pour le stock avec lequel elles ont été
+    enregistrées: si ce stock est absent ou si son chemin (donc son format)
+    diffère, aucune marque n'est renvoyée et la synchronisation est complète.
+    """
+    logger = setup_module_logging()
+    if not STATE_PATH.exists():
+        return {}
+    with open(STATE_PATH, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    
+    if state.get('store') != store_path.name:
+        logger.warning(f"État de synchronisation enregistré pour un autre stock "
+                       f"({state.get('store')}), synchronisation complète")
+        return {}
+    if not store_path.exists():
+        logger.warning(f"Stock brut absent ({store_path}), synchronisation complète")
+        return {}
+    return state.get('high_water_marks', {})
+
+def save_sync_state(state: Dict[str, str], store_path: Path):
+    """Sauvegarde atomique des high-water marks, avec le stock auquel elles se rapportent"""
+    tmp_path = STATE_PATH.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'store': store_path.name, 'high_water_marks': state}, f, indent=2, sort_keys=True)
+    tmp_path.replace(STATE_PATH)
+
+def fetch_country_changes(country: str, since: Optional[str], **fetch_options) -> pd.DataFrame:
+    """
+    Récupère les établissements d'un pays modifiés depuis `since`
+    
+    Sans high-water mark, l'historique complet du pays est récupéré.
+    """
+    query = {"countries": COUNTRY_CODES[country]}
+    if since:
+        query[UPDATED_SINCE_PARAM] = since
+    
+    records: List[Dict] = []
+    for page_records in iter_pages(query=query, **fetch_options):
+        records.extend(page_records)
+    
+    changes = apply_schema(pd.DataFrame(records, columns=RAW_COLUMNS), RAW_SCHEMA)
+    changes = changes[changes['country'] == country]
+    
+    # Filtre côté client au cas où l'API ignore les paramètres
+    if since and not changes.empty:
+        updated = pd.to_datetime(changes['updated_at'], utc=True, errors='coerce')
+        changes = changes[updated > pd.Timestamp(since)]
+    
+    return changes
+
+def upsert_store(store: pd.DataFrame, changes: pd.DataFrame, drop_closed: bool) -> pd.DataFrame:
+    """Applique les changements au stock brut, clé `id` (os_id)"""
+    merged = pd.concat([store, changes], ignore_index=True)
+    merged = merged.drop_duplicates(subset=['id'], keep='last')
+    
+    if drop_closed:
+        merged = merged[~merged['is_closed'].fillna(False)]
+    
+    return merged.reset_index(drop=True)
+
+def sync_oar_data(api_url: str = OAR_API_URL,
+                  max_workers: int = MAX_WORKERS,
+                  page_size: int = PAGE_SIZE,
+                  rate_limit: Optional[float] = RATE_LIMIT,
+                  drop_closed: bool = False) -> Path:
+    """
+    Synchronise le stock brut OAR avec les changements depuis la dernière exécution
+    
+    Seuls les établissements dont `updated_at` dépasse le high-water mark du
+    pays sont téléchargés, puis fusionnés par `os_id` dans le stock persistant.
+    Les établissements fermés sont mis à jour (`is_closed`) ou retirés du stock
+    si `drop_closed` est activé.
+    
+    Returns:
+        Path: Chemin vers le stock brut synchronisé
+    """
+    logger = setup_module_logging()
+    logger.info("Début de la synchronisation incrémentale OAR")
+    
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    store_path = artifact_path(DATA_DIR, STORE_NAME)
+    state = load_sync_state(store_path)
+    fetch_options = {
+        'api_url': api_url,
+        'max_workers': max_workers,
+        'page_size': page_size,
+        'rate_limit': rate_limit
+    }
+    
+    try:
+        if store_path.exists():
+            store = read_table(store_path, schema=RAW_SCHEMA)
+        else:
+            store = apply_schema(pd.DataFrame(), RAW_SCHEMA)
+        
+        all_changes = []
+        for country in COUNTRIES:
+            since = state.get(country)
+            changes = fetch_country_changes(country, since, **fetch_options)
+            logger.info(f"{country}: {len(changes)} établissements modifiés depuis {since or 'le début'}")
+            
+            if not changes.empty:
+                updated = pd.to_datetime(changes['updated_at'], utc=True, errors='coerce')
+                if updated.notna().any():
+                    state[country] = updated.max().isoformat()
+                all_changes.append(changes)
+        
+        if all_changes:
+            changes = pd.concat(all_changes, ignore_index=True)
+            changes = changes.drop_duplicates(subset=['id'], keep='last')
+            closed = changes['is_closed'].fillna(False).astype(bool)
+            new_ids = ~changes['id'].isin(store['id'])
+            logger.info(f"Changements: {new_ids.sum()} nouveaux, {(~new_ids).sum()} mis à jour, "
+                        f"{closed.sum()} fermés")
+            
+            store = upsert_store(store, changes, drop_closed)
+            
+            # Le stock est écrit avant l'état pour qu'une interruption refasse la synchro
+            tmp_path = write_table(store, DATA_DIR, f"{STORE_NAME}_tmp", RAW_SCHEMA)
+            tmp_path.replace(store_path)
+            save_sync_state(state, store_path)
+        elif not store_path.exists():
+            write_table(store, DATA_DIR, STORE_NAME, RAW_SCHEMA)
+            save_sync_state(state, store_path)
+        
+        logger.info(f"Stock brut synchronisé: {store_path} ({len(store)} établissements)")
+        
+        return store_path
+        
+    except Exception as e:
+        logger.error(f"Erreur lors de la synchronisation: {str(e)}")
+        raise
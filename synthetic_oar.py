@@ -0,0 +1,219 @@
+"""
+Générateur de données OAR synthétiques pour les benchmarks hors ligne
+
+Produit un fichier brut aux colonnes de `download_oar_data` (RAW_SCHEMA), en
+reproduisant les répétitions observées dans les données réelles: une même
+entreprise déclarée avec plusieurs suffixes légaux et casses, des variantes
+de pays ('MAR', 'Moroccan'...), des établissements déclarés par plusieurs
+contributeurs, des coordonnées manquantes. La génération est déterministe
+pour une graine et une taille de bloc données, et se fait par blocs pour
+tenir en mémoire jusqu'à 10M d'établissements.
+"""
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional
+
+from artifact_store import read_table
+from clean_companies import COUNTRY_VARIANTS
+from scrape_oar import COUNTRIES, RAW_SCHEMA, RawFileWriter
+
+CHUNK_SIZE = 500000
+FACILITIES_PER_COMPANY = 8  # moyenne, distribution très asymétrique
+MISSING_COORDINATES_RATE = 0.05
+CLOSED_RATE = 0.03
+FOREIGN_COUNTRY_RATE = 0.02
+DUPLICATE_FACILITY_RATE = 0.10  # même établissement déclaré par un autre contributeur
+
+NAME_WORDS = [
+    'Atlas', 'Medina', 'Iberia', 'Lisboa', 'Tessuti', 'Hellas', 'Maltese', 'Riviera',
+    'Sahara', 'Andalus', 'Porto', 'Milano', 'Aegean', 'Provence', 'Rif', 'Douro',
+    'Green', 'Eco', 'Blue', 'Royal', 'Global', 'Nova', 'Sun', 'Star'
+]
+NAME_ACTIVITIES = [
+    'Textiles', 'Garments', 'Apparel', 'Knit', 'Denim', 'Fabrics', 'Confection',
+    'Cotton', 'Fashion', 'Tricot', 'Clothing', 'Wear'
+]
+LEGAL_FORMS = ['', '', '', ' SA', ' S.A.', ' Inc.', ' Ltd', ' LLC', ' & Co.', ' Co', ' S.A.R.L.', ' SARL', ' GmbH']
+FACILITY_KINDS = ['Factory', 'Plant', 'Unit', 'Workshop', 'Mill', 'Site']
+FOREIGN_COUNTRIES = ['Tunisia', 'Turkey', 'Egypt', None]
+CONTRIBUTORS = ['Brand A', 'Brand B', 'Brand C', 'Retailer D', 'MSI Audit', 'Civil Society Org']
+SECTORS = ['Apparel', 'Textiles', 'Footwear', 'Accessories', None]
+PROCESSING_ACTIVITIES = ['Sewing', 'Cutting', 'Dyeing', 'Knitting', 'Weaving', 'Finishing', 'Recycling', None]
+
+# Emprise approximative (lat min, lat max, lon min, lon max) de chaque pays
+COUNTRY_BOUNDS = {
+    'Morocco': (28.0, 35.9, -13.2, -1.0),
+    'Spain': (36.0, 43.8, -9.3, 3.3),
+    'Portugal': (37.0, 42.1, -9.5, -6.2),
+    'Italy': (37.0, 46.5, 7.0, 18.5),
+    'France': (42.5, 51.0, -4.8, 8.2),
+    'Greece': (35.0, 41.7, 20.0, 26.6),
+    'Malta': (35.8, 36.1, 14.2, 14.6)
+}
+
+def setup_module_logging():
+    return logging.getLogger(__name__)
+
+def _country_variants(country: str) -> np.ndarray:
+    # Forme standard surreprésentée, variantes en casse d'origine, minuscules ou majuscules
+    variants = COUNTRY_VARIANTS[country]
+    return np.array([country, country] + variants + [variants[-1].lower(), variants[1].upper()], dtype=object)
+
+def generate_companies(n_companies: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Table des entreprises synthétiques
+    
+    Returns:
+        pd.DataFrame: company_id, base_name (nom sans forme légale), country
+    """
+    rng = np.random.default_rng([seed, 0])
+    first = np.array(NAME_WORDS, dtype=object)[rng.integers(0, len(NAME_WORDS), n_companies)]
+    second = np.array(NAME_ACTIVITIES, dtype=object)[rng.integers(0, len(NAME_ACTIVITIES), n_companies)]
+    
+    # Peu de combinaisons de mots: les homonymes sont distingués par un numéro,
+    # sauf une partie qui garde exactement le même nom (entreprises homonymes)
+    numbers = pd.Series(rng.integers(1, max(n_companies // 20, 2), n_companies)).astype(str)
+    numbers[rng.random(n_companies) < 0.2] = ''
+    base_names = (pd.Series(first) + ' ' + pd.Series(second) + ' ' + numbers).str.strip()
+    
+    return pd.DataFrame({
+        'company_id': pd.Series(np.arange(1, n_companies + 1)).astype(str),
+        'base_name': base_names,
+        'country': np.array(COUNTRIES, dtype=object)[rng.integers(0, len(COUNTRIES), n_companies)]
+    })
+
+def generate_chunk(companies: pd.DataFrame, start: int, n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Bloc d'établissements synthétiques aux colonnes de RAW_SCHEMA
+    
+    Args:
+        companies: Table de `generate_companies`
+        start: Position du premier établissement (identifiants OS...)
+        n_rows: Nombre d'établissements du bloc
+        seed: Graine de génération
+    """
+    rng = np.random.default_rng([seed, 1, start])
+    n_companies = len(companies)
+    
+    # Distribution asymétrique: quelques grandes entreprises, beaucoup de petites
+    company_index = np.minimum((rng.random(n_rows) ** 3 * n_companies).astype(np.int64), n_companies - 1)
+    
+    # Une partie des lignes redéclare un établissement précédent du bloc (même entreprise)
+    duplicate = np.flatnonzero(rng.random(n_rows) < DUPLICATE_FACILITY_RATE)
+    duplicate = duplicate[duplicate > 0]
+    origin = np.arange(n_rows)
+    origin[duplicate] = (rng.random(len(duplicate)) * duplicate).astype(np.int64)
+    # Une redéclaration d'une redéclaration remonte à l'original
+    while (origin[origin] != origin).any():
+        origin = origin[origin]
+    company_index = company_index[origin]
+    company = companies.iloc[company_index].reset_index(drop=True)
+    
+    # Noms d'entreprise déclarés: forme légale et casse variables
+    legal_forms = np.array(LEGAL_FORMS, dtype=object)[rng.integers(0, len(LEGAL_FORMS), n_rows)]
+    company_names = company['base_name'] + legal_forms
+    case = rng.random(n_rows)
+    company_names = company_names.where(case >= 0.1, company_names.str.upper())
+    company_names = company_names.where((case < 0.1) | (case >= 0.15), company_names.str.lower())
+    
+    # Pays: variante du pays de l'entreprise, parfois hors zone ou manquant
+    countries = pd.Series(np.empty(n_rows, dtype=object))
+    lat = np.full(n_rows, np.nan)
+    lon = np.full(n_rows, np.nan)
+    for country, (lat_min, lat_max, lon_min, lon_max) in COUNTRY_BOUNDS.items():
+        mask = (company['country'] == country).to_numpy()
+        n_country = int(mask.sum())
+        variants = _country_variants(country)
+        countries[mask] = variants[rng.integers(0, len(variants), n_country)]
+        lat[mask] = rng.uniform(lat_min, lat_max, n_country).round(6)
+        lon[mask] = rng.uniform(lon_min, lon_max, n_country).round(6)
+    foreign = rng.random(n_rows) < FOREIGN_COUNTRY_RATE
+    countries[foreign] = np.array(FOREIGN_COUNTRIES, dtype=object)[
+        rng.integers(0, len(FOREIGN_COUNTRIES), int(foreign.sum()))]
+    
+    missing = rng.random(n_rows) < MISSING_COORDINATES_RATE
+    lat[missing] = np.nan
+    lon[missing] = np.nan
+    
+    # Noms d'établissements; les redéclarations reprennent nom et coordonnées de l'original
+    kinds = np.array(FACILITY_KINDS, dtype=object)[rng.integers(0, len(FACILITY_KINDS), n_rows)]
+    facility_names = company['base_name'] + ' ' + kinds + ' ' + pd.Series(rng.integers(1, 20, n_rows)).astype(str)
+    facility_names = pd.Series(facility_names.to_numpy()[origin])
+    lat = lat[origin]
+    lon = lon[origin]
+    
+    created = np.datetime64('2016-01-01') + rng.integers(0, 3000, n_rows).astype('timedelta64[D]')
+    updated = created + rng.integers(0, 1000, n_rows).astype('timedelta64[D]')
+    
+    return pd.DataFrame({
+        'id': 'OS' + pd.Series(np.arange(start, start + n_rows)).astype(str).str.zfill(9),
+        'name': facility_names,
+        'address': pd.Series(rng.integers(1, 300, n_rows)).astype(str) + ' Zone Industrielle',
+        'country': countries,
+        'lat': lat,
+        'lon': lon,
+        'is_closed': rng.random(n_rows) < CLOSED_RATE,
+        'created_at': created.astype(str),
+        'updated_at': updated.astype(str),
+        'contributor': np.array(CONTRIBUTORS, dtype=object)[rng.integers(0, len(CONTRIBUTORS), n_rows)],
+        'sector': np.array(SECTORS, dtype=object)[rng.integers(0, len(SECTORS), n_rows)],
+        'processing_activity': np.array(PROCESSING_ACTIVITIES, dtype=object)[
+            rng.integers(0, len(PROCESSING_ACTIVITIES), n_rows)],
+        'company_name': company_names,
+        'company_id': company['company_id']
+    })
+
+def generate_synthetic_oar(n_facilities: int, seed: int = 0, chunk_size: int = CHUNK_SIZE,
+                           name: Optional[str] = None) -> Path:
+    """
+    Écrit un fichier brut synthétique dans data/raw, comme `download_oar_data`
+    
+    Args:
+        n_facilities: Nombre d'établissements
+        seed: Graine de génération
+        chunk_size: Nombre d'établissements générés et écrits par bloc
+        name: Nom de l'artefact (oar_synthetic_<n> par défaut)
+    
+    Returns:
+        Path: Chemin du fichier brut
+    """
+    logger = setup_module_logging()
+    logger.info(f"Génération de {n_facilities} établissements synthétiques (graine {seed})")
+    
+    companies = generate_companies(max(n_facilities // FACILITIES_PER_COMPANY, 1), seed)
+    with RawFileWriter(name or f"oar_synthetic_{n_facilities}") as writer:
+        for start in range(0, n_facilities, chunk_size):
+            writer.write_frame(generate_chunk(companies, start, min(chunk_size, n_facilities - start), seed))
+    
+    writer.log_summary()
+    return writer.output_path
+
+def describe(path: Path) -> Dict[str, float]:
+    """Indicateurs de répétition d'un fichier brut (contrôle du réalisme)"""
+    df = read_table(path, columns=['name', 'country', 'lat', 'company_name', 'company_id'], schema=RAW_SCHEMA)
+    return {
+        'rows': len(df),
+        'companies': df['company_id'].nunique(),
+        'distinct_company_names': df['company_name'].nunique(),
+        'distinct_facility_names': df['name'].nunique(),
+        'distinct_countries': df['country'].nunique(),
+        'missing_coordinates_rate': float(df['lat'].isna().mean())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un fichier brut OAR synthétique")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    path = generate_synthetic_oar(args.rows, args.seed, args.chunk_size)
+    for key, value in describe(path).items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()